@@ -4,6 +4,7 @@ import numpy as np
 import random as rand
 import pylab as plt
 from neuron import *
+from monitor import *
 
 
 # Function to plot: 
@@ -48,18 +49,21 @@ pInh = fInh*deltaT
 pExc = fExc*deltaT
 gg = 0.015
 
-listInh = [Axon(p_spike=pInh, E=-70, g_boost=0.05) for ii in range(nInh)]
+# Inhibitory synapses are not plastic, so they are pooled into a
+# single input whose cost does not depend on nInh:
+inh = PooledAxons(nInh, p_spike=pInh, E=-70, g_boost=0.05)
 	# Eiji listsExc = [[Axon(p, E=0, g_boost=gg, g_max=gg) for ii in range(nExc)] for p in pExc]
 listExc = [Axon(p_spike=pExc, E=0, g_boost=gg, g_max=gg) for ii in range(nExc)]
-dendrite = Dendrite(listInh+listExc)	# Eiji [Dendrite(listInh+axonList) for axonList in listsExc]
+clock = Clock(deltaT)
+dendrite = Dendrite([inh]+listExc, clock=clock)	# Eiji [Dendrite(listInh+axonList) for axonList in listsExc]
 
 
 # Variables to plot: 
 t = 0
 n = 0
-time = []				# Eiji [[] for ii in range(len(dendrite))]
-V = []					# Eiji [[] for ii in range(len(dendrite))]
-bufferG = [10 for axon in listExc]						# Eiji bufferG = [[0 for axon in axonList] for axonList in listsExc]
+# The run lasts until convergence, so the voltage is streamed to disk:
+VMonitor = FileMonitor(dendrite, ['V'], 'recordings/_task-5')	# Eiji [[] for ii in range(len(dendrite))]
+convergence = ConvergenceMonitor(listExc, every=10000, driftTolerance=stopThres)	# Eiji bufferG = [[0 for axon in axonList] for axonList in listsExc]
 spikeCount = 0 			# Eiji [0 for dd in dendrite]
 
 # Run the loop: 
@@ -67,12 +71,10 @@ flagEnd = False
 while True: 
     t = t + 1
     n = n + 1
-    time = time + [t*deltaT] 
 						# Eiji    for ii in range(len(dendrite)):        
 						# Eiji        time[ii] = time[ii] + [t*deltaT]
 						
-    for axon in listInh:
-        axon.updateStatus(deltaT)
+    inh.updateStatus(t)
 						# Eiji    for jj in range(len(listsExc[ii])):
 						# Eiji            listsExc[ii][jj].updateStatus(t*deltaT)
     for axon in listExc: 
@@ -85,14 +87,13 @@ while True:
 						# Eiji            spikeCount[ii] = spikeCount[ii] + 1
     
     #Store Variables:
-    V = V + [dendrite.V]
+    VMonitor.record()
 						# Eiji        V[ii] = V[ii] + [dendrite[ii].V]
      
+    flagEnd = convergence.record()
     if n == 10000: 
         n=0
-        g = []
-        for axon in listExc:
-            g = g + [axon.g_boost/axon.g_max]
+        g = convergence.getWeights()
         
         title = 'Time = '+str(t*deltaT)+'ms'
         plt.figure()
@@ -101,14 +102,7 @@ while True:
         plt.ylabel('Number of connections')
         plt.hist(g,20)
         plt.show()
-        flagEnd = True
-        for ii in range(len(listExc)): 
-            if abs(bufferG[ii]-listExc[ii].g) > stopThres:
-                flagEnd = False
-                print ii, abs(bufferG[ii]-listExc[ii].g)
-                break
-        for ii in range(len(listExc)): 
-            bufferG[ii] = listExc[ii].g
+        print convergence.drift, convergence.histDistance, convergence.changeRate
     if flagEnd:
         break
 
@@ -116,6 +110,7 @@ while True:
 #        break
 
 # Calculating 'a posteriori' variables to be plotted: 
+VMonitor.close()
 fr = spikeCount/(t*deltaT)
 print fr
 						# Eiji fr = [0 for den in dendrite]
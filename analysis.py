@@ -0,0 +1,104 @@
+"""Analysis of the results of simulations:
+
+Headless functions computing the usual curves of the project out of
+the arrays of a simulation: weights as a function of the latency of
+the inputs (Song et al., 2000, Figure 4), histograms of g_boost/g_max
+and firing rates as a function of the input rate. Every curve is
+computed in one pass with bincount-style aggregation, whatever the
+number of synapses. Plotting is left to the plots module.
+
+Targets might be a list of objects of the class Axon, an object of
+the class AxonPopulation or BatchPopulation, or an object of the
+class Network.
+"""
+
+import numpy as np
+
+################################################################################
+##
+##                 getSynapses function.
+##
+def getSynapses(target):
+    """getSynapses function:
+
+    Returns (g_boost, g_max): float64 arrays with the g_boost and the
+    g_max of each synapse of 'target'.
+    """
+    if isinstance(target, (list, tuple)):
+        return (np.array([axon.g_boost for axon in target], dtype=float),
+                np.array([axon.g_max for axon in target], dtype=float))
+    g_boost = np.asarray(target.g_boost, dtype=float)
+    g_max = np.asarray(target.g_max, dtype=float)
+    if hasattr(target, 'pre'):
+        # Network: g_max is given per presynaptic source.
+        g_max = g_max[target.pre]
+    return g_boost.ravel(), np.broadcast_to(g_max, g_boost.shape).ravel()
+
+################################################################################
+##
+##                 getWeights function.
+##
+def getWeights(target):
+    """getWeights function:
+
+    Returns the array with g_boost/g_max of each synapse of 'target'.
+    """
+    g_boost, g_max = getSynapses(target)
+    return g_boost/g_max
+
+################################################################################
+##
+##                 latencyCurve function.
+##
+def latencyCurve(target, latencies):
+    """latencyCurve function:
+
+    Returns (r, v): the different integer latencies 'r' of the
+    synapses of 'target' and, for each of them, the mean g_boost over
+    the mean g_max of the synapses with that latency. 'latencies'
+    holds the latency of each synapse.
+    """
+    latencies = np.asarray(latencies, dtype=np.int64).ravel()
+    g_boost, g_max = getSynapses(target)
+    first = latencies.min()
+    counts = np.bincount(latencies - first)
+    r = np.flatnonzero(counts)
+    g_boost_sum = np.bincount(latencies - first, weights=g_boost)[r]
+    g_max_sum = np.bincount(latencies - first, weights=g_max)[r]
+    return r + first, g_boost_sum/g_max_sum
+
+################################################################################
+##
+##                 weightHistogram function.
+##
+def weightHistogram(target, bins=20):
+    """weightHistogram function:
+
+    Returns (counts, edges): the histogram of g_boost/g_max over the
+    synapses of 'target' with 'bins' bins between 0 and 1.
+    """
+    weights = getWeights(target)
+    index = np.minimum((weights*bins).astype(np.int64), bins - 1)
+    return np.bincount(index, minlength=bins), np.linspace(0, 1, bins + 1)
+
+################################################################################
+##
+##                 firingCurve function.
+##
+def firingCurve(inputRates, spikeCounts, duration):
+    """firingCurve function:
+
+    Returns (rates, mean, std): the different input rates of
+    'inputRates' and the mean and standard deviation of the output
+    firing rate of the runs with each of them. Run 'k' had input rate
+    inputRates[k] and its dendrite spiked spikeCounts[k] times in
+    'duration' (output rates are given in spikes per unit of
+    'duration').
+    """
+    rates, index = np.unique(np.asarray(inputRates, dtype=float), return_inverse=True)
+    index = index.ravel()
+    output = np.asarray(spikeCounts, dtype=float).ravel()/duration
+    runs = np.bincount(index)
+    mean = np.bincount(index, weights=output)/runs
+    std = np.sqrt(np.maximum(np.bincount(index, weights=output**2)/runs - mean**2, 0))
+    return rates, mean, std
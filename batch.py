@@ -0,0 +1,304 @@
+"""Batched version of the vectorized neuron model:
+
+The classes in this module advance a batch of independent dendrites,
+each one with its own presynaptic axons and parameters, as a single
+(nDendrites x nSynapses) array computation. The update rules are
+those of the classes 'Axon' and 'Dendrite' of the neuron module, so
+that a parameter sweep (e.g. over the excitatory rate in task-5.py)
+costs about the same as a single neuron. Since every dendrite owns
+its row of synapses, no axon can be shared between dendrites by
+mistake.
+"""
+
+import numpy as np
+import numpy.random as rand
+from population import *
+
+################################################################################
+##
+##                 toMatrix function.
+##
+def toMatrix(value, shape, dtype=float):
+    """toMatrix function:
+
+    Returns a new numpy array of shape 'shape' filled with 'value',
+    which might be a scalar, a row with one entry per synapse, a
+    column (shape (nDendrites, 1)) with one entry per dendrite, or a
+    full matrix.
+    """
+    array = np.empty(shape, dtype=dtype)
+    array[...] = value
+    return array
+
+###############################################################################
+##
+##                 BatchDendrite class.
+##
+class BatchDendrite:
+    """Batch of independent dendrites:
+
+    Objects of this class hold the variables of 'nDendrites' objects
+    of the class Dendrite as arrays of length 'nDendrites' and update
+    all of them at once after the same rules. Parameters might be
+    given either as a scalar, shared by all the dendrites, or as a
+    sequence with one entry per dendrite.
+
+    Variables:
+    ==> nDendrites: number of dendrites of the batch.
+    ==> inAxons: array of objects of the class BatchPopulation attached to 'self'.
+    ==> V, spike, M, resting_value: arrays with the variables of the same name of each dendrite.
+    ==> V_rest, tau, V_thr, V_peak, V_reset, A_minus, tauMinus: arrays with the parameters of the same name of each dendrite.
+    ==> clock: object of the class Clock giving the time step of the simulation.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class BatchDendrite.
+    ==> updateStatus: updates all the variables of the dendrites.
+    ==> updateV: updates the voltage of the dendrites and rewards the synapses of those which fired.
+    ==> updateResting_value: updates the value to which the voltage of each dendrite tends.
+    ==> updateM: updates the potential penalization of each dendrite.
+    """
+
+    #########################################################
+    ##
+    ## __init__:
+    def __init__(self, arrayPopulations, V_rest=-70, tau=20, V_thr=-54, V_peak=0, V_reset=-60,
+                 A_minus=0.00525, tauMinus=20, clock=defaultClock):
+        """__init__ function for the class BatchDendrite:
+
+        Arguments:
+        ==> arrayPopulations: array of objects of the class BatchPopulation attached to 'self'. All of them must have the same number of dendrites.
+        ==> The rest of arguments are those of the class Dendrite.
+        """
+        self.inAxons = arrayPopulations
+        self.nDendrites = arrayPopulations[0].nDendrites
+        for population in arrayPopulations:
+            if population.nDendrites != self.nDendrites:
+                raise ValueError('All the populations of a batch must have the same number of dendrites.')
+        self.V_rest = toArray(V_rest, self.nDendrites)
+        self.tau = toArray(tau, self.nDendrites)
+        self.V_thr = toArray(V_thr, self.nDendrites)
+        self.V_peak = toArray(V_peak, self.nDendrites)
+        self.V_reset = toArray(V_reset, self.nDendrites)
+        self.A_minus = toArray(A_minus, self.nDendrites)
+        self.tauMinus = toArray(tauMinus, self.nDendrites)
+        self.clock = clock
+
+        # Some aditional variables which are not explicitly given but
+        # set here:
+        self.V = self.V_rest.copy()
+        self.spike = np.zeros(self.nDendrites, dtype=bool)
+        self.M = np.zeros(self.nDendrites)
+        self.resting_value = self.V_rest.copy()
+
+        for population in self.inAxons:
+            population.outDendrite = self
+            population.clock = self.clock
+
+    #########################################################
+    ## updateStatus:
+    def updateStatus(self):
+        """updateStatus function:
+
+          Same as 'Dendrite.updateStatus' for every dendrite.
+        """
+        self.updateResting_value()
+        self.updateV()
+        self.updateM()
+
+    #########################################################
+    ## updateV:
+    def updateV(self):
+        """updateV function:
+
+            Same as 'Dendrite.updateV' for every dendrite: dendrites
+            which fired in the previous step are reset and their
+            excitatory synapses rewarded; those under threshold decay
+            towards their resting value; the rest fire.
+        """
+        fired = self.spike
+        if fired.any():
+            for population in self.inAxons:
+                population.getReward(fired)
+
+        below = ~fired & (self.V < self.V_thr)
+        decayed = self.resting_value + (self.V-self.resting_value)*decayArray(self.tau, self.clock.DeltaT)
+        self.V = np.where(fired, self.V_reset, np.where(below, decayed, self.V_peak))
+        self.spike = ~fired & ~below
+
+    #########################################################
+    ## updateResting_value:
+    def updateResting_value(self):
+        """updateResting_value function:
+
+            Same as 'Dendrite.updateResting_value' for every dendrite,
+            summing up each row of synapses at once.
+        """
+        sum = 0
+        for population in self.inAxons:
+            sum = sum + population.getCurrent(self.V)
+
+        self.resting_value = self.V_rest + sum
+
+    #########################################################
+    ## updateM:
+    def updateM(self):
+        """updateM function:
+
+          Same as 'Dendrite.updateM' for every dendrite.
+        """
+        decayed = self.M*decayArray(self.tauMinus, self.clock.DeltaT)
+        self.M = np.where(self.spike, self.M - self.A_minus, decayed)
+
+###############################################################################
+##
+##                 BatchPopulation class.
+##
+class BatchPopulation:
+    """Batch of independent populations of presynaptic axons:
+
+        Objects of the class BatchPopulation hold one row of 'n'
+        synapses for each of the 'nDendrites' dendrites of a
+        BatchDendrite, stored as (nDendrites x n) arrays, and update
+        them after the rules of the class Axon. Parameters might be a
+        scalar, a row with one entry per synapse, a column (shape
+        (nDendrites, 1)) with one entry per dendrite, or a full
+        matrix. Input spikes are Poisson with probability 'p_spike'
+        per step, generated in blocks by a PoissonSource.
+
+    Variables:
+      ==> nDendrites: number of rows (dendrites) of the batch.
+      ==> n: number of synapses per row.
+      ==> outDendrite: object of the class BatchDendrite to which 'self' is attached.
+      ==> g, spike, p_spike, E, g_boost, g_max, g_min, tau, P, A_plus, tauPlus: (nDendrites x n) arrays with the variables of the same name of the class Axon.
+      ==> excitatory: boolean array: True ==> excitatory synapse (E=0).
+      ==> source: object of the class PoissonSource generating the spikes of all the synapses.
+      ==> clock: object of the class Clock giving the time step of the simulation.
+
+    Methods:
+      ==> __init__: __init__ function for objects of class BatchPopulation.
+      ==> updateStatus: updates all the variables of the batch.
+      ==> updateG: updates the conductivity of the synapses.
+      ==> updateP: updates the potential reward of the synapses.
+      ==> getReward: rewards the excitatory synapses of the given dendrites.
+      ==> getCurrent: sum of g*(E-V) over each row.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, nDendrites, n, p_spike=0, E=0, g_boost=0.015, g_max=0.015, g_min=0, tau=5,
+                 A_plus=0.005, tauPlus=20, rng=rand, clock=defaultClock):
+        """__init__ function of the BatchPopulation class:
+
+           Arguments:
+           ==> nDendrites: number of rows (dendrites) of the batch.
+           ==> n: number of synapses per row.
+           ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+           ==> The rest of arguments are those of the class Axon.
+        """
+        shape = (nDendrites, n)
+        self.nDendrites = nDendrites
+        self.n = n
+        self.p_spike = toMatrix(p_spike, shape)
+        self.E = toMatrix(E, shape)
+        self.g = np.zeros(shape)
+        self.g_max = toMatrix(g_max, shape)
+        self.g_min = toMatrix(g_min, shape)
+        self.g_boost = toMatrix(g_boost, shape)
+        self.tau = toMatrix(tau, shape)
+        self.A_plus = toMatrix(A_plus, shape)
+        self.tauPlus = toMatrix(tauPlus, shape)
+        self.outDendrite = None
+        self.clock = clock
+
+        # Some aditional variables which are not explicitly given but
+        # set here:
+        self.excitatory = self.E == 0
+        self.spike = np.zeros(shape, dtype=bool)
+        self.P = np.zeros(shape)
+        self.source = PoissonSource(self.p_spike.ravel(), rng=rng)
+        self.DeltaT = None
+
+    #########################################################
+    ## updateStatus:
+    def updateStatus(self, t):
+        """updateStatus function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        This function updates the status of the whole batch.
+        """
+        self.updateG(t)
+        self.updateP()
+
+    #########################################################
+    ## updateDecayFactors:
+    def updateDecayFactors(self):
+        """updateDecayFactors function:
+
+        Same as 'AxonPopulation.updateDecayFactors'.
+        """
+        if self.DeltaT != self.clock.DeltaT:
+            self.DeltaT = self.clock.DeltaT
+            self.decayG = decayArray(self.tau, self.DeltaT).reshape(self.tau.shape)
+            self.decayP = decayArray(self.tauPlus, self.DeltaT).reshape(self.tauPlus.shape)
+
+    #########################################################
+    ## updateG:
+    def updateG(self, t):
+        """UpdateG function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        Same as 'Axon.updateG' for every synapse of the batch. Each
+        spiking excitatory synapse is penalized with the 'M' of its
+        own dendrite.
+        """
+        spike = np.zeros(self.nDendrites*self.n, dtype=bool)
+        spike[self.source.getSpikes(t)] = True
+        spike = spike.reshape(self.nDendrites, self.n)
+        self.spike = spike
+
+        self.g[spike] += self.g_boost[spike]
+        penalized = spike & self.excitatory
+        if penalized.any():
+            rows = np.nonzero(penalized)[0]
+            g_boost = self.g_boost[penalized] + self.outDendrite.M[rows]*self.g_max[penalized]
+            self.g_boost[penalized] = np.maximum(g_boost, self.g_min[penalized])
+
+        self.updateDecayFactors()
+        self.g *= self.decayG
+
+    #########################################################
+    ## updateP:
+    def updateP(self):
+        """updateP function:
+
+          Same as 'Axon.updateP' for every synapse of the batch.
+        """
+        self.updateDecayFactors()
+        self.P = np.where(self.spike, self.P + self.A_plus, self.P*self.decayP)
+
+    #########################################################
+    ## getReward:
+    def getReward(self, fired):
+        """getReward function:
+
+          Same as 'Axon.getReward' for the excitatory synapses of the
+          dendrites selected by the boolean array 'fired'.
+        """
+        rewarded = self.excitatory & fired[:,np.newaxis]
+        g_boost = self.g_boost[rewarded] + self.P[rewarded]*self.g_max[rewarded]
+        self.g_boost[rewarded] = np.minimum(g_boost, self.g_max[rewarded])
+
+    #########################################################
+    ## getCurrent:
+    def getCurrent(self, V):
+        """getCurrent function:
+
+          Returns, for each dendrite, the sum of g*(E-V) over its row
+          of synapses, given the array 'V' with the voltage of each
+          dendrite.
+        """
+        return np.einsum('ij,ij->i', self.g, self.E - V[:,np.newaxis])
@@ -0,0 +1,254 @@
+"""Benchmarks of the neuron model:
+
+Headless versions of the configurations of demo.py, task-5.py and
+task-6.py, run with the different engines of the project for a range
+of numbers of synapses. For each run, the benchmark reports:
+
+    ==> stepsPerSecond: simulated time steps per second of wall time.
+    ==> synapseUpdatesPerSecond: steps per second times the number of synapses.
+    ==> postSpikesPerSecond: spikes of the dendrite per second of wall time.
+    ==> peakMemoryMB: peak resident memory of the process running the benchmark.
+
+Every run is done in a fresh process, so that the peak memory is that
+of the run alone, and results are written as JSON so that runs can be
+compared over time. From the command line:
+
+    $ python benchmark.py --configs demo task6 --sizes 1000 100000 --output results.json
+
+Weights are scaled by the number of synapses of the original scripts
+over the number of synapses of the run, so that the total input, and
+therefore the firing regime, is the same for every size.
+"""
+
+import sys
+import time
+import json
+import platform
+import argparse
+import multiprocessing
+import numpy as np
+from event import *
+from kernel import *
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Configurations of the scripts (probabilities per step, times in ms).
+# 'steps' is the length of the simulation of each script:
+configurations = {
+    'demo': {'steps': 1000, 'deltaT': 0.1, 'pExc': 0.01, 'pInh': 0.01,
+             'exc': {'g_boost': 0.015, 'g_max': 0.015}, 'inh': {'g_boost': 0.015, 'g_max': 0.015},
+             'bursts': False},
+    'task5': {'steps': 1000, 'deltaT': 0.1, 'pExc': 0.025*0.1, 'pInh': 0.1*0.1,
+              'exc': {'g_boost': 0.015, 'g_max': 0.015}, 'inh': {'g_boost': 0.05},
+              'bursts': False},
+    'task6': {'steps': 8000, 'deltaT': 0.01, 'pExc': 0, 'pInh': 0.01*0.01,
+              'exc': {'g_boost': 0.004, 'g_max': 0.02}, 'inh': {'g_boost': 0.05},
+              'bursts': True},
+}
+
+# Shape of the original scripts:
+REFERENCE_SYNAPSES = 1200
+EXC_FRACTION = 1000/1200.
+
+engines = ['object', 'population', 'event', 'fused']
+
+################################################################################
+##
+##                 buildBenchmark function.
+##
+def buildBenchmark(name, nSynapses, engine, steps, rng=rand):
+    """buildBenchmark function:
+
+    Builds the configuration 'name' with 'nSynapses' synapses for
+    'engine' and returns a function which simulates 'steps' steps and
+    returns the number of spikes of the dendrite.
+    """
+    config = configurations[name]
+    nExc = int(round(nSynapses*EXC_FRACTION))
+    nInh = nSynapses - nExc
+    scale = REFERENCE_SYNAPSES/float(nSynapses)
+    exc = dict((key, value*scale) for key, value in config['exc'].items())
+    inh = dict((key, value*scale) for key, value in config['inh'].items())
+    spike_map = burstSpikeMap(nExc, steps, config['deltaT'], rng=rng)[0] if config['bursts'] else None
+    clock = Clock(config['deltaT'])
+
+    if engine == 'object':
+        if spike_map is None:
+            spike_map = [None]*nExc
+        axons = ([Axon(config['pExc'], 0, spike_map=spike_map[ii], **exc) for ii in range(nExc)] +
+                 [Axon(config['pInh'], -70, **inh) for ii in range(nInh)])
+        dendrite = Dendrite(axons, clock=clock)
+
+        def simulate():
+            spikes = 0
+            for t in range(steps):
+                for axon in axons:
+                    axon.updateStatus(t)
+                dendrite.updateStatus()
+                if dendrite.spike:
+                    spikes = spikes + 1
+            return spikes
+        return simulate
+
+    populations = [AxonPopulation(nExc, p_spike=config['pExc'], E=0, spike_map=spike_map, rng=rng, **exc),
+                   AxonPopulation(nInh, p_spike=config['pInh'], E=-70, rng=rng, **inh)]
+    dendrite = PopulationDendrite(populations, clock=clock)
+
+    if engine == 'fused':
+        simulation = FusedSimulation(dendrite)
+        if simulation.useJit:
+            compileKernel()
+
+        def simulate():
+            return int(simulation.run(steps).sum())
+        return simulate
+
+    if engine == 'event':
+        simulation = EventSimulation(dendrite)
+
+        def simulate():
+            simulation.run(steps)
+            return simulation.postSpikes
+        return simulate
+
+    def simulate():
+        spikes = 0
+        for t in range(steps):
+            for population in populations:
+                population.updateStatus(t)
+            dendrite.updateStatus()
+            if dendrite.spike:
+                spikes = spikes + 1
+        return spikes
+    return simulate
+
+################################################################################
+##
+##                 getPeakMemory function.
+##
+def getPeakMemory():
+    """getPeakMemory function:
+
+    Returns the peak resident memory of the current process in MB, or
+    None if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak/2.0**20
+    return peak/2.0**10
+
+################################################################################
+##
+##                 runBenchmark function.
+##
+def runBenchmark(name, nSynapses, engine, steps, seed=0):
+    """runBenchmark function:
+
+    Runs one benchmark in the current process and returns a dictionary
+    with its description and measures (see the module docstring).
+    Building the network is not timed.
+    """
+    rng = np.random.RandomState(seed)
+    rand.seed(seed)
+    simulate = buildBenchmark(name, nSynapses, engine, steps, rng)
+    start = time.time()
+    spikes = simulate()
+    elapsed = time.time() - start
+    return {'config': name,
+            'engine': engine,
+            'synapses': nSynapses,
+            'steps': steps,
+            'seconds': elapsed,
+            'postSpikes': spikes,
+            'stepsPerSecond': steps/elapsed,
+            'synapseUpdatesPerSecond': steps*float(nSynapses)/elapsed,
+            'postSpikesPerSecond': spikes/elapsed,
+            'peakMemoryMB': getPeakMemory()}
+
+################################################################################
+##
+##                 runTask function.
+##
+def runTask(task):
+    """runTask function:
+
+    Unpacks the arguments of 'runBenchmark', so that it can be given
+    to a pool of processes.
+    """
+    return runBenchmark(*task)
+
+################################################################################
+##
+##                 runSuite function.
+##
+def runSuite(names=None, engineNames=None, sizes=(1000, 10000, 100000, 1000000), steps=None,
+             seed=0, objectLimit=20000, verbose=True):
+    """runSuite function:
+
+    Runs every configuration in 'names' with every engine in
+    'engineNames' (all of them if None) and every number of synapses
+    in 'sizes', one after the other and each one in a fresh process,
+    for 'steps' steps (the length of the script if None). The object
+    engine is skipped for more than 'objectLimit' synapses.
+    Returns the list of results of 'runBenchmark'.
+    """
+    if names is None:
+        names = sorted(configurations.keys())
+    if engineNames is None:
+        engineNames = engines
+    tasks = [(name, n, engine, steps or configurations[name]['steps'], seed)
+             for name in names for engine in engineNames for n in sizes
+             if engine != 'object' or n <= objectLimit]
+
+    results = []
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        for task in tasks:
+            result = pool.apply(runTask, (task,))
+            if verbose:
+                print('%-6s %-10s %8d synapses: %10.1f steps/s %12.4g synapse updates/s %8.1f MB' %
+                      (result['config'], result['engine'], result['synapses'], result['stepsPerSecond'],
+                       result['synapseUpdatesPerSecond'], result['peakMemoryMB'] or 0))
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+################################################################################
+##
+##                 saveResults function.
+##
+def saveResults(results, path):
+    """saveResults function:
+
+    Writes 'results' to the JSON file 'path', together with a
+    description of the machine and the versions used.
+    """
+    report = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'machine': platform.platform(),
+              'processor': platform.processor(),
+              'results': results}
+    with open(path, 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the neuron model.')
+    parser.add_argument('--configs', nargs='+', choices=sorted(configurations.keys()), default=None)
+    parser.add_argument('--engines', nargs='+', choices=engines, default=None)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--steps', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--object-limit', type=int, default=20000)
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args()
+
+    results = runSuite(args.configs, args.engines, args.sizes, args.steps, args.seed, args.object_limit)
+    saveResults(results, args.output)
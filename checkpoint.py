@@ -0,0 +1,316 @@
+"""Checkpoints of running simulations:
+
+A checkpoint is a compact binary snapshot (a .npz file) of the whole
+state of a dendrite and its inputs: voltages, conductances, potential
+rewards and penalizations, weights, the position of the spike sources
+and the state of the random number generators, together with the
+current step. Checkpoints are written atomically (to a temporary file
+which then replaces the old one), so that a job dying while writing
+never leaves a broken snapshot behind.
+
+Loading a checkpoint into a dendrite built in the same way (same
+classes, same number of synapses, same parameters) continues the run
+bit for bit. Loading it without the random state allows forking many
+experiments from one pre-converged state.
+
+Checkpoints must be taken between steps, i.e. after the dendrite and
+all its inputs have been updated.
+"""
+
+import os
+import numpy as np
+import numpy.random as rand
+from batch import *
+
+################################################################################
+##
+##                 getRandomState function.
+##
+def getRandomState(rng, prefix, state):
+    """getRandomState function:
+
+    Stores in 'state', under keys starting with 'prefix', the state of
+    'rng' (numpy.random or a numpy.random.RandomState).
+    """
+    name, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+    state[prefix + 'keys'] = keys
+    state[prefix + 'pos'] = np.array(pos)
+    state[prefix + 'has_gauss'] = np.array(has_gauss)
+    state[prefix + 'cached_gaussian'] = np.array(cached_gaussian)
+
+################################################################################
+##
+##                 setRandomState function.
+##
+def setRandomState(rng, prefix, state):
+    """setRandomState function:
+
+    Restores the state of 'rng' stored by 'getRandomState'.
+    """
+    rng.set_state(('MT19937', state[prefix + 'keys'], int(state[prefix + 'pos']),
+                   int(state[prefix + 'has_gauss']), float(state[prefix + 'cached_gaussian'])))
+
+################################################################################
+##
+##                 getSourceState function.
+##
+def getSourceState(source, prefix, state):
+    """getSourceState function:
+
+    Stores in 'state' the state of a SpikeRaster or a PoissonSource,
+    including the current block and the random state of the latter.
+    """
+    if isinstance(source, SpikeRaster):
+        state[prefix + 'cursor'] = np.array(source.cursor)
+        return
+    state[prefix + 'started'] = np.array(source.blockStart is not None)
+    if source.blockStart is None:
+        return
+    state[prefix + 'blockStart'] = np.array(source.blockStart)
+    state[prefix + 'blockEnd'] = np.array(source.blockEnd)
+    if source.nextSpike is not None:
+        state[prefix + 'nextSpike'] = source.nextSpike
+    state[prefix + 'raster.steps'] = source.raster.steps
+    state[prefix + 'raster.offsets'] = source.raster.offsets
+    state[prefix + 'raster.indices'] = source.raster.indices
+    state[prefix + 'raster.cursor'] = np.array(source.raster.cursor)
+    getRandomState(source.rng, prefix + 'rng.', state)
+
+################################################################################
+##
+##                 setSourceState function.
+##
+def setSourceState(source, prefix, state, restoreRandom=True):
+    """setSourceState function:
+
+    Restores the state of a SpikeRaster or a PoissonSource stored by
+    'getSourceState'. Without 'restoreRandom', a PoissonSource is
+    just restarted at the next step, drawing new spikes.
+    """
+    if isinstance(source, SpikeRaster):
+        source.cursor = int(state[prefix + 'cursor'])
+        return
+    source.blockStart = None
+    if not restoreRandom or not state[prefix + 'started']:
+        return
+    source.blockStart = int(state[prefix + 'blockStart'])
+    source.blockEnd = int(state[prefix + 'blockEnd'])
+    if prefix + 'nextSpike' in state:
+        source.nextSpike = np.array(state[prefix + 'nextSpike'])
+    source.raster = SpikeRaster(source.n, np.array(state[prefix + 'raster.steps']),
+                                np.array(state[prefix + 'raster.offsets']),
+                                np.array(state[prefix + 'raster.indices']))
+    source.raster.cursor = int(state[prefix + 'raster.cursor'])
+    setRandomState(source.rng, prefix + 'rng.', state)
+
+################################################################################
+##
+##                 getState function.
+##
+def getState(dendrite, step=0, rng=rand):
+    """getState function:
+
+    Returns a dictionary of numpy arrays with the state of 'dendrite'
+    (a Dendrite, a PopulationDendrite or a BatchDendrite) and its
+    inputs at step 'step'. 'rng' is the random number generator used
+    by the objects of class Axon (numpy.random by default).
+    """
+    state = {'step': np.array(step)}
+    for name in ('V', 'M', 'spike', 'resting_value', 'step'):
+        if hasattr(dendrite, name):
+            state['dendrite.' + name] = np.array(getattr(dendrite, name))
+
+    if getattr(dendrite, 'aggregate', False):
+        keys = list(dendrite.conductances.keys())
+        state['dendrite.conductanceKeys'] = np.array(keys, dtype=float).reshape(len(keys), 2)
+        state['dendrite.conductances'] = np.array([dendrite.conductances[key] for key in keys])
+
+    axons = [axon for axon in dendrite.inAxons if isinstance(axon, Axon)]
+    if axons:
+        for name in ('g', 'P', 'g_boost', 'spike', 'cursor'):
+            state['axons.' + name] = np.array([getattr(axon, name) for axon in axons])
+        if getattr(dendrite, 'rewardEpsilon', None) is not None:
+            position = dict((id(axon), ii) for ii, axon in enumerate(dendrite.inAxons))
+            active = list(dendrite.activeAxons.items())
+            state['dendrite.activeIndex'] = np.array([position[id(axon)] for axon, s in active], dtype=np.int64)
+            state['dendrite.activeStep'] = np.array([s for axon, s in active], dtype=np.int64)
+        getRandomState(rng, 'rng.', state)
+
+    for ii in range(len(dendrite.inAxons)):
+        population = dendrite.inAxons[ii]
+        if isinstance(population, Axon):
+            continue
+        prefix = 'inputs.%d.' % ii
+        if isinstance(population, PooledAxons):
+            state[prefix + 'g'] = np.array(population.g)
+            state[prefix + 'spikes'] = np.array(population.spikes)
+            getRandomState(population.rng, prefix + 'rng.', state)
+            continue
+        for name in ('g', 'P', 'g_boost', 'spike'):
+            state[prefix + name] = getattr(population, name)
+        if getattr(population, 'activeBuckets', None):
+            state[prefix + 'active'] = np.concatenate(population.activeBuckets)
+        sources = getattr(population, 'sources', [getattr(population, 'source', None)])
+        for ss in range(len(sources)):
+            if sources[ss] is not None:
+                getSourceState(sources[ss], prefix + 'sources.%d.' % ss, state)
+    return state
+
+################################################################################
+##
+##                 setState function.
+##
+def setState(dendrite, state, rng=rand, restoreRandom=True):
+    """setState function:
+
+    Restores into 'dendrite', which must have been built in the same
+    way as the one the state was taken from, a state returned by
+    'getState', and returns its step. If 'restoreRandom' is False,
+    random number generators are left as they are, so that the run
+    forks from the stored state.
+    """
+    for name in ('V', 'M', 'spike', 'resting_value', 'step'):
+        key = 'dendrite.' + name
+        if key in state:
+            value = np.array(state[key])
+            setattr(dendrite, name, value.item() if value.ndim == 0 else value)
+
+    if 'dendrite.conductances' in state:
+        dendrite.arrivals = {}
+        dendrite.conductances = {}
+        for key, g in zip(state['dendrite.conductanceKeys'], state['dendrite.conductances']):
+            dendrite.conductances[(key[0].item(), key[1].item())] = g.item()
+
+    axons = [axon for axon in dendrite.inAxons if isinstance(axon, Axon)]
+    if axons:
+        for name in ('g', 'P', 'g_boost', 'spike', 'cursor'):
+            values = state['axons.' + name]
+            for jj in range(len(axons)):
+                setattr(axons[jj], name, values[jj].item())
+        if 'dendrite.activeIndex' in state:
+            dendrite.activeBuckets = {}
+            dendrite.activeExpiry = {}
+            dendrite.activeAxons = {}
+            for ii, s in zip(state['dendrite.activeIndex'], state['dendrite.activeStep']):
+                axon = dendrite.inAxons[ii]
+                dendrite.activeBuckets.setdefault(int(s), set()).add(axon)
+                dendrite.activeAxons[axon] = int(s)
+                # From the current P, which bounds the expiry of the bucket:
+                expiry = max(dendrite.activeExpiry.get(int(s), int(s)), dendrite.getExpiry(axon))
+                dendrite.activeExpiry[int(s)] = expiry
+        if restoreRandom:
+            setRandomState(rng, 'rng.', state)
+
+    for ii in range(len(dendrite.inAxons)):
+        population = dendrite.inAxons[ii]
+        if isinstance(population, Axon):
+            continue
+        prefix = 'inputs.%d.' % ii
+        if isinstance(population, PooledAxons):
+            population.g = state[prefix + 'g'].item()
+            population.spikes = int(state[prefix + 'spikes'])
+            population.spike = population.spikes > 0
+            if restoreRandom:
+                setRandomState(population.rng, prefix + 'rng.', state)
+            continue
+        for name in ('g', 'P', 'g_boost', 'spike'):
+            getattr(population, name)[...] = state[prefix + name]
+        if hasattr(population, 'activeBuckets'):
+            active = state.get(prefix + 'active')
+            population.activeBuckets = [] if active is None else [np.array(active)]
+            population.activeCount = 0 if active is None else len(active)
+        sources = getattr(population, 'sources', [getattr(population, 'source', None)])
+        for ss in range(len(sources)):
+            if sources[ss] is not None:
+                setSourceState(sources[ss], prefix + 'sources.%d.' % ss, state, restoreRandom)
+    return int(state['step'])
+
+################################################################################
+##
+##                 saveCheckpoint function.
+##
+def saveCheckpoint(path, dendrite, step=0, rng=rand):
+    """saveCheckpoint function:
+
+    Writes the state of 'dendrite' at step 'step' to the file 'path'
+    atomically: the snapshot is written to a temporary file, synced
+    to disk and then renamed over 'path'.
+    """
+    state = getState(dendrite, step, rng)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as fp:
+        np.savez(fp, **state)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.rename(temporary, path)
+
+################################################################################
+##
+##                 loadCheckpoint function.
+##
+def loadCheckpoint(path, dendrite, rng=rand, restoreRandom=True):
+    """loadCheckpoint function:
+
+    Restores into 'dendrite' the state written by 'saveCheckpoint' to
+    'path' and returns the step at which it was taken (see setState).
+    """
+    data = np.load(path)
+    try:
+        state = dict((key, data[key]) for key in data.files)
+    finally:
+        data.close()
+    return setState(dendrite, state, rng, restoreRandom)
+
+###############################################################################
+##
+##                 Checkpointer class.
+##
+class Checkpointer:
+    """Periodic checkpoints:
+
+    Each call to 'record' counts a step and, one out of 'every'
+    steps, saves a checkpoint of 'dendrite' to 'path' (see
+    saveCheckpoint), so that a job can be resumed from its last
+    checkpoint with 'loadCheckpoint'.
+
+    Variables:
+    ==> path: file where checkpoints are written.
+    ==> dendrite: dendrite whose state is saved.
+    ==> every: one call out of 'every' saves a checkpoint.
+    ==> step: number of steps counted so far.
+    ==> rng: random number generator of the objects of class Axon.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class Checkpointer.
+    ==> record: counts a step and saves a checkpoint every 'every' steps.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, path, dendrite, every=100000, step=0, rng=rand):
+        """__init__ function for the class Checkpointer:
+
+        Arguments:
+        ==> path: file where checkpoints are written.
+        ==> dendrite: dendrite whose state is saved.
+        ==> every: one call out of 'every' saves a checkpoint.
+        ==> step: number of steps already simulated (e.g. when resuming).
+        ==> rng: random number generator of the objects of class Axon.
+        """
+        self.path = path
+        self.dendrite = dendrite
+        self.every = every
+        self.step = step
+        self.rng = rng
+
+    #########################################################
+    ## record:
+    def record(self):
+        """record function:
+
+        Counts a step, which must have been fully simulated, and saves
+        a checkpoint if the number of steps is a multiple of 'every'.
+        """
+        self.step = self.step + 1
+        if self.step % self.every == 0:
+            saveCheckpoint(self.path, self.dendrite, self.step, self.rng)
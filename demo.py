@@ -1,7 +1,9 @@
 """Script to show the neuron module's functionality."""
 
+import numpy as np
 import pylab as plt
 from neuron import *
+from monitor import *
 
 # Creating an array of Axon ready to be attached to an object of class
 # Dendrite:
@@ -9,33 +11,36 @@ a = [Axon(0.01, 0) for i in range(1000)]    # Excitatory.
 b = [Axon(0.01, -70) for i in range(200)]  # Inhibitory. 
 a = a+b
 
-# Creating a Dendrite to which the Axons before are attached.
-dendrite1 = Dendrite(a)
-
-# Creating variables to run a loop and store info to be plotted later.
+# Creating a Dendrite to which the Axons before are attached. All of
+# them take their time step from the same clock.
 DeltaT = 0.1
-t = []
-V = []
-M = []
-P0 = []
-g_boost0 = []
-g = [[] for axon in a]
+clock = Clock(DeltaT)
+dendrite1 = Dendrite(a, clock=clock)
+
+# Creating monitors to store info to be plotted later.
+steps = 1000
+axonsMonitor = Monitor(a, ['g'], steps)
+dendriteMonitor = Monitor(dendrite1, ['V', 'M'], steps)
+axon0Monitor = Monitor(a[0], ['P', 'g_boost'], steps)
 
 # Run the loop: 
-for tt in range(1000):
-    t = t + [tt*DeltaT]
-    
+for tt in range(steps):
     # Update status: 
     for ii in range(len(a)):
         a[ii].updateStatus(tt)
-        g[ii] = g[ii] + [a[ii].g]
     dendrite1.updateStatus()
     
     #Storing variables to be plotted: 
-    V = V + [dendrite1.V]
-    M = M + [dendrite1.M]
-    P0 = P0 + [a[0].P]
-    g_boost0 = g_boost0 + [a[0].g_boost]
+    axonsMonitor.record()
+    dendriteMonitor.record()
+    axon0Monitor.record()
+
+t = np.arange(steps)*DeltaT
+g = axonsMonitor.get('g').T
+V = dendriteMonitor.get('V')
+M = dendriteMonitor.get('M')
+P0 = axon0Monitor.get('P')
+g_boost0 = axon0Monitor.get('g_boost')
 
 # Figure 1: spikes of all presynaptic axons:
 plt.figure()
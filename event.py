@@ -0,0 +1,390 @@
+"""Event-driven simulation of the vectorized neuron model:
+
+Instead of stepping every synapse at every time step, the classes in
+this module keep a priority queue with the next presynaptic spike of
+each spike source. Each synapse remembers the last step up to which its
+conductance and potential reward are up to date, and is only brought
+up to date, in closed form, when it spikes or when it is read to be
+rewarded; a step with spikes then costs time in proportion to the
+number of spikes rather than to the number of synapses. The dendrite is
+advanced from the running totals of its aggregate mode (see
+Dendrite.updateResting_value) and, whenever the largest voltage
+reachable under its decaying conductances stays under the threshold,
+the interval up to the next presynaptic spike is skipped in closed
+form.
+"""
+
+import heapq
+import numpy as np
+from population import *
+
+###############################################################################
+##
+##                 SpikeQueue class.
+##
+class SpikeQueue:
+    """Priority queue of presynaptic spikes:
+
+    Holds the step of the next spike of each spike source (see the
+    spikes module) of a list of objects of the class AxonPopulation.
+    Spike maps are followed through the raster of the population and
+    Poisson synapses through its PoissonSource, which jumps from one
+    spike to the next by drawing inter-spike intervals. Each source
+    takes a single entry of the queue.
+
+    Variables:
+    ==> populations: list of objects of the class AxonPopulation.
+    ==> heap: heap of (step, population, source) tuples.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class SpikeQueue.
+    ==> schedule: pushes the next spike of a source.
+    ==> nextStep: step of the next spike in the queue.
+    ==> popSpikes: indices of the synapses spiking at a given step.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, populations, start=0):
+        """__init__ function for the class SpikeQueue:
+
+        Arguments:
+        ==> populations: list of objects of the class AxonPopulation.
+        ==> start: first step to be simulated.
+        """
+        self.populations = populations
+        self.heap = []
+        for pp in range(len(populations)):
+            for ss in range(len(populations[pp].sources)):
+                self.schedule(pp, ss, start)
+
+    #########################################################
+    ## schedule:
+    def schedule(self, pp, ss, start):
+        """schedule function:
+
+        Pushes the first spike at a step >= 'start' of source 'ss' of
+        population 'pp', if there is one.
+        """
+        step = self.populations[pp].sources[ss].nextStep(start)
+        if step is not None:
+            heapq.heappush(self.heap, (step, pp, ss))
+
+    #########################################################
+    ## nextStep:
+    def nextStep(self):
+        """nextStep function:
+
+        Returns the step of the next spike in the queue, or None if
+        no synapse will spike anymore.
+        """
+        if self.heap:
+            return self.heap[0][0]
+        return None
+
+    #########################################################
+    ## popSpikes:
+    def popSpikes(self, t):
+        """popSpikes function:
+
+        Removes from the queue the spikes happening at step 't',
+        schedules the next spike of their sources, and returns a list
+        with one array of indices of spiking synapses per population
+        (None for populations without spikes). Each source gives every
+        synapse once, so indices are only made unique when several
+        sources of a population spike at the same step.
+        """
+        spikes = [None]*len(self.populations)
+        merged = False
+        while self.heap and self.heap[0][0] == t:
+            step, pp, ss = heapq.heappop(self.heap)
+            index = self.populations[pp].sources[ss].getSpikes(t)
+            if spikes[pp] is None:
+                spikes[pp] = index
+            else:
+                spikes[pp] = np.concatenate((spikes[pp], index))
+                merged = True
+            self.schedule(pp, ss, t + 1)
+        if merged:
+            spikes = [None if index is None else np.unique(index) for index in spikes]
+        return spikes
+
+###############################################################################
+##
+##                 EventSimulation class.
+##
+class EventSimulation:
+    """Event-driven simulation of a PopulationDendrite:
+
+    Advances an object of the class PopulationDendrite and its
+    populations as if 'updateStatus' were called on every population
+    and then on the dendrite at every step, but:
+
+    - each synapse keeps in 'lastUpdate' the step up to which its 'g'
+      and 'P' are up to date. At a step with spikes, only the spiking
+      synapses are decayed in closed form over the steps since then
+      and updated as in AxonPopulation.updateG and updateP; after a
+      spike of the dendrite, only the synapses to be rewarded are
+      decayed before their 'P' is read;
+    - the dendrite runs in aggregate mode, so that the steps between
+      spikes cost a few scalar operations;
+    - when the dendrite is not spiking and the largest voltage it can
+      reach under its decaying conductances (see canFire) is under
+      the threshold, V, M and the conductance totals are advanced in
+      closed form up to the next presynaptic spike (see skip).
+
+    Results are those of the step-by-step simulation within float
+    tolerance. The variables of the populations (including 'spike',
+    the spikes of the last step) are only up to date at the end of
+    'run'. Inputs must be objects of the class AxonPopulation:
+    PooledAxons, which have no spike trains, are refused.
+
+    Variables:
+    ==> dendrite: object of the class PopulationDendrite being simulated.
+    ==> queue: object of the class SpikeQueue with the next presynaptic spikes.
+    ==> t: next step to be simulated.
+    ==> lastUpdate: list with the array of the last step up to which each synapse of each population is up to date.
+    ==> lastSpikes: list with the (step, indices) of the last spikes of each population.
+    ==> excitatory: list with the indices of the excitatory synapses of each population.
+    ==> skipBlock: largest number of steps advanced at once by 'skip'.
+    ==> eventSteps: number of steps in which some synapse spiked.
+    ==> quietSteps: number of steps in which only the dendrite was updated.
+    ==> skippedSteps: number of steps skipped analytically.
+    ==> postSpikes: number of spikes of the dendrite.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class EventSimulation.
+    ==> run: simulates a number of steps.
+    ==> updateSpikes: updates the synapses spiking at a given step.
+    ==> reward: brings the synapses to be rewarded up to date.
+    ==> sync: brings every synapse up to date.
+    ==> decay: decays some synapses of a population up to a given step.
+    ==> skip: advances the dendrite in closed form over a quiet interval.
+    ==> canFire: tells whether the dendrite may reach the threshold before the next presynaptic spike.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, dendrite, start=0, skipBlock=4096):
+        """__init__ function for the class EventSimulation:
+
+        Arguments:
+        ==> dendrite: object of the class PopulationDendrite to be simulated. It is switched to aggregate mode.
+        ==> start: first step to be simulated.
+        ==> skipBlock: largest number of steps advanced at once by 'skip'.
+        """
+        if any(isinstance(population, PooledAxons) for population in dendrite.inAxons):
+            raise ValueError('EventSimulation does not support PooledAxons inputs.')
+        self.dendrite = dendrite
+        self.t = start
+        self.skipBlock = skipBlock
+        self.lastUpdate = [np.full(population.n, start - 1, dtype=np.int64) for population in dendrite.inAxons]
+        self.lastSpikes = [(None, None)]*len(dendrite.inAxons)
+        self.excitatory = [np.flatnonzero(population.excitatory) for population in dendrite.inAxons]
+        self.eventSteps = 0
+        self.quietSteps = 0
+        self.skippedSteps = 0
+        self.postSpikes = 0
+
+        if not dendrite.aggregate:
+            dendrite.aggregate = True
+            dendrite.resetConductances()
+        self.queue = SpikeQueue(dendrite.inAxons, start)
+
+    #########################################################
+    ## run:
+    def run(self, steps):
+        """run function:
+
+        Simulates 'steps' steps. At the end, the variables of the
+        populations are up to date.
+        """
+        end = self.t + steps
+        dendrite = self.dendrite
+        for population in dendrite.inAxons:
+            population.updateDecayFactors()
+        while self.t < end:
+            nextStep = self.queue.nextStep()
+            if nextStep is None or nextStep > end:
+                nextStep = end
+
+            if nextStep > self.t and not self.canFire():
+                self.skip(nextStep - self.t)
+                self.t = nextStep
+                continue
+
+            if nextStep == self.t:
+                self.updateSpikes(self.t, self.queue.popSpikes(self.t))
+                self.eventSteps = self.eventSteps + 1
+            else:
+                self.quietSteps = self.quietSteps + 1
+            # A spike of the dendrite at the previous step means that
+            # the populations are rewarded at this one:
+            if dendrite.spike:
+                self.reward(self.t)
+            dendrite.updateStatus()
+            if dendrite.spike:
+                self.postSpikes = self.postSpikes + 1
+            self.t = self.t + 1
+
+        self.sync(self.t - 1)
+
+    #########################################################
+    ## updateSpikes:
+    def updateSpikes(self, t, spikes):
+        """updateSpikes function:
+
+        Arguments:
+        ==> t: the current time step.
+        ==> spikes: list with the indices of the spiking synapses of each population (or None), as given by SpikeQueue.popSpikes.
+
+        Same as 'AxonPopulation.updateG' and 'updateP' for the
+        synapses in 'spikes' only, after decaying them up to step
+        't-1'. The rest of synapses are left behind.
+        """
+        dendrite = self.dendrite
+        for pp in range(len(spikes)):
+            index = spikes[pp]
+            if index is None or not index.size:
+                continue
+            population = dendrite.inAxons[pp]
+            k = t - 1 - self.lastUpdate[pp][index]
+            decayG = select(population.decayG, index)
+
+            g_boost = population.g_boost[index]
+            population.g[index] = (population.g[index]*decayG**k + g_boost)*decayG
+            if len(population.classKeys) == 1:
+                key = population.classKeys[0]
+                dendrite.addConductance(key[0], key[1], g_boost.sum(dtype=np.float64))
+            else:
+                sums = np.bincount(population.classIndex[index], weights=g_boost,
+                                   minlength=len(population.classKeys))
+                for key, g in zip(population.classKeys, sums):
+                    if g:
+                        dendrite.addConductance(key[0], key[1], g)
+            penalized = index[population.excitatory[index]]
+            if penalized.size:
+                population.getPenalization(penalized)
+            population.P[index] = (population.P[index]*select(population.decayP, index)**k +
+                                   select(population.A_plus, index))
+            self.lastUpdate[pp][index] = t
+            self.lastSpikes[pp] = (t, index)
+
+            if dendrite.rewardEpsilon is not None and penalized.size:
+                population.activeBuckets.append(penalized)
+                population.activeCount = population.activeCount + penalized.size
+                if population.activeCount > population.n:
+                    self.decay(pp, np.concatenate(population.activeBuckets), t)
+                    population.getActive()
+
+    #########################################################
+    ## reward:
+    def reward(self, t):
+        """reward function:
+
+        Decays up to step 't' the synapses whose 'P' is read by
+        'PopulationDendrite.rewardAxons': the excitatory ones or, if
+        the dendrite has a 'rewardEpsilon', those in 'activeBuckets'.
+        """
+        for pp in range(len(self.dendrite.inAxons)):
+            if self.dendrite.rewardEpsilon is None:
+                index = self.excitatory[pp]
+            else:
+                buckets = self.dendrite.inAxons[pp].activeBuckets
+                index = np.concatenate(buckets) if buckets else self.excitatory[pp][:0]
+            self.decay(pp, index, t)
+
+    #########################################################
+    ## sync:
+    def sync(self, t):
+        """sync function:
+
+        Decays every synapse up to step 't' and sets the 'spike' of
+        each population to the spikes of that step.
+        """
+        for pp in range(len(self.dendrite.inAxons)):
+            population = self.dendrite.inAxons[pp]
+            self.decay(pp, slice(None), t)
+            population.spike = np.zeros(population.n, dtype=bool)
+            step, index = self.lastSpikes[pp]
+            if step == t:
+                population.spike[index] = True
+
+    #########################################################
+    ## decay:
+    def decay(self, pp, index, t):
+        """decay function:
+
+        Decays 'g' and 'P' of the synapses 'index' (an array of
+        indices or a slice) of population 'pp' over the steps without
+        spikes from their 'lastUpdate' to 't'.
+        """
+        population = self.dendrite.inAxons[pp]
+        k = t - self.lastUpdate[pp][index]
+        population.g[index] *= select(population.decayG, index)**k
+        population.P[index] *= select(population.decayP, index)**k
+        self.lastUpdate[pp][index] = t
+
+    #########################################################
+    ## skip:
+    def skip(self, k):
+        """skip function:
+
+        Advances V, M and the conductance totals of the dendrite over
+        'k' steps without presynaptic spikes, in which it does not
+        fire (see canFire). At each step V goes to c*V + d, where c
+        and d only depend on the decaying conductances, so that the
+        first 'k-1' steps are done in closed form with cumulative
+        products, 'skipBlock' steps at a time, and the last one with
+        'updateStatus', which also leaves 'resting_value' as a step
+        by step simulation would.
+        """
+        dendrite = self.dendrite
+        clock = dendrite.clock
+        a = clock.decayFactor(dendrite.tau)
+        left = k - 1
+        while left > 0:
+            m = min(left, self.skipBlock)
+            n = np.arange(1, m + 1)
+            G = np.zeros(m)
+            S = np.zeros(m)
+            for key in dendrite.conductances:
+                g = dendrite.conductances[key]*clock.decayFactor(key[1])**n
+                G += g
+                S += g*key[0]
+                dendrite.conductances[key] = g[-1]
+            c = a - (1-a)*G
+            d = (1-a)*(dendrite.V_rest + S)
+            products = np.cumprod(c[::-1])[::-1]
+            dendrite.V = dendrite.V*products[0] + np.dot(d[:-1], products[1:]) + d[-1]
+            left = left - m
+        dendrite.M = dendrite.M*clock.decayFactor(dendrite.tauMinus)**(k - 1)
+        dendrite.step = dendrite.step + k - 1
+        dendrite.updateStatus()
+        self.skippedSteps = self.skippedSteps + k
+
+    #########################################################
+    ## canFire:
+    def canFire(self):
+        """canFire function:
+
+        Returns False if the dendrite is not spiking and cannot reach
+        the threshold without new presynaptic spikes. Conductances
+        only decay, so, as long as V stays under V_thr, each class of
+        synapses moves the resting value by at least
+        g*min(E-V_thr, 0); V, which relaxes towards it, stays over the
+        lowest bound 'low', and then each class moves the resting
+        value by at most g*max(E-low, 0). If V and this largest
+        resting value are under V_thr, so is V until the next spike.
+        """
+        dendrite = self.dendrite
+        if dendrite.spike or dendrite.arrivals or dendrite.V >= dendrite.V_thr:
+            return True
+        low = dendrite.V_rest
+        for key, g in dendrite.conductances.items():
+            low = low + max(g, 0)*min(key[0] - dendrite.V_thr, 0)
+        low = min(low, dendrite.V)
+        high = dendrite.V_rest
+        for key, g in dendrite.conductances.items():
+            high = high + max(g, 0)*max(key[0] - low, 0)
+        return max(high, dendrite.V) >= dendrite.V_thr
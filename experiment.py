@@ -0,0 +1,284 @@
+"""Headless experiments from configuration files:
+
+One entry point for the experiments of the project. An experiment is
+described by a JSON file (see the experiments directory) which is
+merged over 'defaults', so that it only needs to give what differs:
+
+    {"name": "example", "deltaT": 0.1, "duration": 1000, "seed": 0, "engine": "population",
+     "inputs": [{"n": 1000, "rate": 0.025, "E": 0, "g_boost": 0.015, "g_max": 0.015},
+                {"n": 200, "rate": 0.1, "E": -70, "g_boost": 0.05, "pooled": true}],
+     "dendrite": {}, "record": {"variables": ["V"], "every": 10}}
+
+Each entry of 'inputs' is a group of synapses: 'rate' (kHz) gives
+their Poisson rate, 'bursts' (a dictionary of arguments of
+spikes.burstSpikeMap, possibly empty) the bursts of task-6.py instead,
+'spikes' the path of a spike file (see spikes.SpikeFile) to be replayed,
+'pooled' pools them into one PooledAxons (for non-plastic synapses;
+the event and fused engines take an AxonPopulation instead) and the
+rest of keys are arguments of the class Axon (only E, g_boost and
+tau when pooled). 'dendrite' holds arguments of the class Dendrite
+and 'record' the variables of the dendrite streamed to disk by a
+FileMonitor, and the number of steps between samples. 'engine' is 'object' (Axon/Dendrite), 'population'
+(AxonPopulation/PopulationDendrite), 'event' (EventSimulation) or
+'fused' (FusedSimulation); only the first two can record variables.
+'name' is copied to the results.
+
+From the command line, results are written to a directory:
+
+    $ python experiment.py experiments/task5.json --output runs/task5 --set inputs.0.rate=0.03
+
+Nothing but the standard library is imported until the experiment is
+built, and pylab is never imported, so that workers start quickly.
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+
+# Default experiment:
+defaults = {
+    'name': None,
+    'deltaT': 0.1,
+    'duration': 1000,
+    'seed': 0,
+    'engine': 'population',
+    'inputs': [],
+    'dendrite': {},
+    'record': {},
+}
+
+# Arguments of the classes Axon, AxonPopulation and PooledAxons which
+# input groups may give:
+axonKeys = ('E', 'g_boost', 'g_max', 'g_min', 'tau', 'A_plus', 'tauPlus')
+populationKeys = axonKeys + ('compact',)
+pooledKeys = ('E', 'g_boost', 'tau')
+
+################################################################################
+##
+##                 loadConfig function.
+##
+def loadConfig(path, overrides=()):
+    """loadConfig function:
+
+    Returns the configuration of the JSON file 'path' merged over
+    'defaults', with the overrides (see setValue) applied.
+    """
+    config = copy.deepcopy(defaults)
+    with open(path) as fp:
+        config.update(json.load(fp))
+    for override in overrides:
+        setValue(config, override)
+    return config
+
+################################################################################
+##
+##                 setValue function.
+##
+def setValue(config, override):
+    """setValue function:
+
+    Applies to 'config' an override 'path=value', where 'path' is a
+    dot-separated list of keys and list positions (e.g.
+    'inputs.0.rate') and 'value' is parsed as JSON, or taken as a
+    string if it is not valid JSON.
+    """
+    path, value = override.split('=', 1)
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    keys = path.split('.')
+    node = config
+    for key in keys[:-1]:
+        node = node[int(key)] if isinstance(node, list) else node.setdefault(key, {})
+    if isinstance(node, list):
+        node[int(keys[-1])] = value
+    else:
+        node[keys[-1]] = value
+
+################################################################################
+##
+##                 buildExperiment function.
+##
+def buildExperiment(config):
+    """buildExperiment function:
+
+    Returns (dendrite, inputs, latencies) for 'config': the dendrite,
+    the list of its inputs (objects of the class Axon, AxonPopulation
+    or PooledAxons) and a dictionary with the latencies (in ms) of the
+    synapses of each group with bursts, keyed by its position in
+    'inputs'. Groups with keys which are not arguments of the class
+    they are built with raise a ValueError.
+    """
+    import numpy as np
+    from population import AxonPopulation, PopulationDendrite, PooledAxons, Axon, Dendrite, Clock
+    from spikes import burstSpikeMap, SpikeFile
+
+    rng = np.random.RandomState(config['seed'])
+    clock = Clock(config['deltaT'])
+    steps = int(round(config['duration']/config['deltaT']))
+    objects = config['engine'] == 'object'
+    inputs = []
+    latencies = {}
+    for position in range(len(config['inputs'])):
+        group = dict(config['inputs'][position])
+        n = group.pop('n')
+        p_spike = group.pop('rate', 0)*config['deltaT']
+        bursts = group.pop('bursts', None)
+        pooled = group.pop('pooled', False)
+        path = group.pop('spikes', None)
+        if pooled and config['engine'] in ('object', 'population'):
+            kind, keys = 'PooledAxons', pooledKeys
+        elif objects:
+            kind, keys = 'Axon', axonKeys
+        else:
+            kind, keys = 'AxonPopulation', populationKeys
+        unknown = sorted(key for key in group if key not in keys)
+        if unknown:
+            raise ValueError('Input group %d: %s takes no %s.' % (position, kind, ', '.join(unknown)))
+        spike_map = None
+        if bursts is not None:
+            spike_map, latencies[position] = burstSpikeMap(n, steps, config['deltaT'], rng=rng, **bursts)
+        if path is not None:
+            spikes = SpikeFile(path)
+            if len(spikes) != n:
+                raise ValueError('%s holds %d spike trains instead of %d.' % (path, len(spikes), n))
+            spike_map = spikes.getSpikeMap() if objects else spikes.getRaster()
+        if pooled and config['engine'] in ('object', 'population'):
+            inputs.append(PooledAxons(n, p_spike=p_spike, rng=rng, **group))
+        elif objects:
+            for ii in range(n):
+                inputs.append(Axon(p_spike, spike_map=None if spike_map is None else spike_map[ii], **group))
+        else:
+            inputs.append(AxonPopulation(n, p_spike=p_spike, spike_map=spike_map, rng=rng, **group))
+
+    if objects:
+        # Objects of the class Axon draw their spikes from numpy.random:
+        np.random.seed(config['seed'])
+        dendrite = Dendrite(inputs, clock=clock, **config['dendrite'])
+    else:
+        dendrite = PopulationDendrite(inputs, clock=clock, **config['dendrite'])
+    return dendrite, inputs, latencies
+
+################################################################################
+##
+##                 runExperiment function.
+##
+def runExperiment(config, output=None):
+    """runExperiment function:
+
+    Builds and runs the experiment 'config' and returns a dictionary
+    with its results: its name, number of steps, spikes of the
+    dendrite, firing rate (kHz), wall time and the mean and histogram
+    of g_boost/g_max of the plastic synapses. If 'output' is a directory, it gets
+    'results.json', 'config.json', 'spikes.npy' (steps at which the
+    dendrite fired; not available with the event engine),
+    'weights.npy', 'latency-<k>.npy' (weight-vs-latency curve of
+    input group k, if it has bursts) and the recordings of the
+    variables in 'record', which are only made if 'output' is given.
+    """
+    import numpy as np
+    from analysis import getWeights, latencyCurve
+
+    dendrite, inputs, latencies = buildExperiment(config)
+    steps = int(round(config['duration']/config['deltaT']))
+    engine = config['engine']
+    if config['record'] and engine not in ('object', 'population'):
+        raise ValueError('Variables can only be recorded with the object or population engines.')
+    if output is not None and not os.path.isdir(output):
+        os.makedirs(output)
+
+    monitors = []
+    if config['record'] and output is not None:
+        from monitor import FileMonitor
+        record = config['record']
+        monitors.append(FileMonitor(dendrite, record['variables'], output, every=record.get('every', 1)))
+
+    start = time.time()
+    if engine == 'event':
+        from event import EventSimulation
+        simulation = EventSimulation(dendrite)
+        simulation.run(steps)
+        spikes = None
+        spikeCount = simulation.postSpikes
+    elif engine == 'fused':
+        from kernel import FusedSimulation
+        spikes = np.flatnonzero(FusedSimulation(dendrite).run(steps))
+        spikeCount = len(spikes)
+    else:
+        spikes = []
+        for t in range(steps):
+            for axon in inputs:
+                axon.updateStatus(t)
+            dendrite.updateStatus()
+            if dendrite.spike:
+                spikes.append(t)
+            for monitor in monitors:
+                monitor.record()
+        spikes = np.array(spikes, dtype=np.int64)
+        spikeCount = len(spikes)
+    elapsed = time.time() - start
+    for monitor in monitors:
+        monitor.close()
+
+    # Plastic synapses, group by group:
+    groups = []
+    position = 0
+    for ii in range(len(config['inputs'])):
+        group = config['inputs'][ii]
+        n = 1 if group.get('pooled') or engine != 'object' else group['n']
+        groups.append(inputs[position:position+n] if engine == 'object' else inputs[position])
+        position = position + n
+    plastic = [ii for ii in range(len(groups))
+               if config['inputs'][ii].get('E', 0) == 0 and not config['inputs'][ii].get('pooled')]
+    weights = [getWeights(groups[ii]) for ii in plastic]
+    weights = np.concatenate(weights) if weights else np.zeros(0)
+
+    results = {'name': config['name'],
+               'steps': steps,
+               'spikes': spikeCount,
+               'rate': spikeCount/float(config['duration']),
+               'seconds': elapsed,
+               'meanWeight': float(weights.mean()) if weights.size else None,
+               'weightHistogram': np.bincount(np.minimum((weights*20).astype(np.int64), 19),
+                                              minlength=20).tolist()}
+
+    if output is not None:
+        with open(os.path.join(output, 'config.json'), 'w') as fp:
+            json.dump(config, fp, indent=2, sort_keys=True)
+        with open(os.path.join(output, 'results.json'), 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        if spikes is not None:
+            np.save(os.path.join(output, 'spikes.npy'), spikes)
+        np.save(os.path.join(output, 'weights.npy'), weights.astype(np.float32))
+        for ii in sorted(latencies):
+            r, v = latencyCurve(groups[ii], np.round(latencies[ii]))
+            np.save(os.path.join(output, 'latency-%d.npy' % ii), np.vstack((r, v)))
+    return results
+
+################################################################################
+##
+##                 main function.
+##
+def main(argv=None):
+    """main function:
+
+    Command line entry point (see the module docstring).
+    """
+    parser = argparse.ArgumentParser(description='Runs an experiment described by a JSON file.')
+    parser.add_argument('config', help='JSON file describing the experiment.')
+    parser.add_argument('--output', default=None, help='directory where results are written.')
+    parser.add_argument('--set', action='append', default=[], metavar='PATH=VALUE',
+                        help='overrides a value of the configuration, e.g. inputs.0.rate=0.03.')
+    args = parser.parse_args(argv)
+
+    config = loadConfig(args.config, args.set)
+    results = runExperiment(config, args.output)
+    json.dump(results, sys.stdout, sort_keys=True)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
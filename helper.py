@@ -1,5 +1,7 @@
 """This module provides some helper functions."""
 
+import math
+
 ################################################################################
 ##
 ##                 Euler function.
@@ -36,3 +38,91 @@ def exponentialDecay(x,param):
     tau = param[0]
     resting_value = param[1]
     return -(x-resting_value)/tau
+
+################################################################################
+##
+##                 Decay factor function.
+##
+decayFactors = {}
+
+def decayFactor(tau, DeltaT):
+    """Decay factor of an exponential decay:
+
+    Returns exp(-DeltaT/tau), the factor by which a variable decaying
+    exponentially with eigentime 'tau' is multiplied in a time step
+    'DeltaT'. Factors are computed once per (tau, DeltaT) pair and
+    cached in 'decayFactors'.
+
+        Arguments:
+            ==> tau: eigentime of the decay.
+            ==> DeltaT: time step.
+    """
+    key = (tau, DeltaT)
+    if key not in decayFactors:
+        decayFactors[key] = math.exp(-float(DeltaT)/tau)
+    return decayFactors[key]
+
+################################################################################
+##
+##                 Exact exponential step function.
+##
+def exponentialStep(x0, tau, resting_value=0, DeltaT=0.001):
+    """Exact exponential decay:
+
+    Integrates dx/dt = -(x-resting_value)/tau over a time step
+    'DeltaT' in closed form. Unlike 'euler' with 'exponentialDecay',
+    it is exact and stable for any time step.
+
+        Arguments:
+            ==> x0: initial value of the integrand.
+            ==> tau: eigentime of the decay.
+            ==> resting_value: value to which the variable tends.
+            ==> DeltaT: time step.
+    """
+    return resting_value + (x0-resting_value)*decayFactor(tau, DeltaT)
+
+################################################################################
+##
+##                 Spike map compilation function.
+##
+def compileSpikeMap(spike_map):
+    """compileSpikeMap function:
+
+    Returns the steps of 'spike_map' as a sorted list of unique
+    integers. Entries are rounded to the nearest step, so that spike
+    maps built from float expressions (e.g. 30/0.01 = 2999.99...)
+    match the integer steps of the simulation.
+    """
+    return sorted(set(int(round(step)) for step in spike_map))
+
+################################################################################
+##
+##                 Clock class.
+##
+class Clock:
+    """Simulation clock:
+
+    Holds the time step shared by all the objects of a simulation, so
+    that every integration step takes its time step from one place.
+
+    Variables:
+    ==> DeltaT: time step.
+
+    Methods:
+    ==> decayFactor: decay factor for a given eigentime.
+    ==> decay: exact exponential decay of a variable over one time step.
+    """
+    def __init__(self, DeltaT=0.001):
+        self.DeltaT = DeltaT
+
+    def decayFactor(self, tau):
+        """Returns exp(-DeltaT/tau) for the time step of 'self'."""
+        return decayFactor(tau, self.DeltaT)
+
+    def decay(self, x0, tau, resting_value=0):
+        """Returns 'x0' decayed towards 'resting_value' over one time step."""
+        return exponentialStep(x0, tau, resting_value, self.DeltaT)
+
+# Clock used by objects which are not given one explicitly. Its time
+# step is the one 'euler' uses by default.
+defaultClock = Clock()
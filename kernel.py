@@ -0,0 +1,395 @@
+"""Fused step kernel of the vectorized neuron model:
+
+The methods of the classes PopulationDendrite and AxonPopulation go
+over the synapses several times per step (spikes, decay of 'g',
+'P', rewards, the sum of the currents) and allocate temporary arrays
+on each pass. When numba is installed, the class FusedSimulation of
+this module runs instead a compiled kernel which advances the
+dendrite and all its synapses over a block of steps with a single
+pass over the synapses per step and no allocation at all. Without
+numba, it falls back to the usual numpy methods, so that scripts run
+either way.
+
+The kernel follows the update rules of the classes Axon and Dendrite
+exactly, with the same spikes (taken from the sources of the
+populations); the only difference with the numpy path is the order in
+which the currents of the synapses are summed up, which changes the
+voltage in the last bits.
+"""
+
+import numpy as np
+from population import *
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+################################################################################
+##
+##                 stepBlock function.
+##
+def stepBlock(offsets, indices, bounds, starts, shared, g, P, g_boost, excitatory, E, g_max, g_min, A_plus,
+              decayG, decayP, spiking, state, parameters, VTrace, spikeTrace):
+    """stepBlock function:
+
+    Advances a dendrite and its synapses over len(offsets)-1 steps.
+    The synapses spiking at step 's' of the block are
+    indices[offsets[s]:offsets[s+1]]; those of population 'pp' are
+    bounds[pp] to bounds[pp+1] (excluded). 'g', 'P', 'g_boost' and
+    'excitatory' hold one entry per synapse. The parameters in
+    KERNEL_PARAMETERS of population 'pp' start at starts[pp] and
+    hold one entry per synapse or, if shared[pp] (compact mode), a
+    single entry for all of them. 'state' holds [V, M,
+    resting_value, spike] of the dendrite and 'parameters' [V_rest,
+    V_thr, V_peak, V_reset, A_minus, decay factor of V, decay factor
+    of M]. The voltage and the spike of the dendrite at each step are
+    written to 'VTrace' and 'spikeTrace'. 'spiking' is a boolean
+    scratch array of the length of 'g', all False.
+
+    Everything is updated in place, so that this function can be
+    compiled by numba.
+    """
+    V = state[0]
+    M = state[1]
+    resting_value = state[2]
+    spike = state[3] != 0
+    V_rest = parameters[0]
+    V_thr = parameters[1]
+    V_peak = parameters[2]
+    V_reset = parameters[3]
+    A_minus = parameters[4]
+    decayV = parameters[5]
+    decayM = parameters[6]
+
+    for s in range(offsets.shape[0] - 1):
+        # Presynaptic spikes (Axon.updateG before the decay):
+        for k in range(offsets[s], offsets[s+1]):
+            ii = indices[k]
+            if spiking[ii]:
+                continue
+            spiking[ii] = True
+            g[ii] += g_boost[ii]
+            if excitatory[ii]:
+                pp = 0
+                while ii >= bounds[pp+1]:
+                    pp += 1
+                jj = starts[pp] if shared[pp] else starts[pp] + ii - bounds[pp]
+                boost = g_boost[ii] + M*g_max[jj]
+                g_boost[ii] = boost if boost > g_min[jj] else g_min[jj]
+
+        # Decay of g, update of P, rewards if the dendrite fired at
+        # the previous step and sum of the currents, population by
+        # population over slices, so that indices start at 0:
+        current = 0.
+        for pp in range(bounds.shape[0] - 1):
+            first = bounds[pp]
+            last = bounds[pp+1]
+            gs = g[first:last]
+            Ps = P[first:last]
+            boosts = g_boost[first:last]
+            kinds = excitatory[first:last]
+            spikings = spiking[first:last]
+            if shared[pp]:
+                e = E[starts[pp]]
+                maximum = g_max[starts[pp]]
+                plus = A_plus[starts[pp]]
+                factorG = decayG[starts[pp]]
+                factorP = decayP[starts[pp]]
+                for ii in range(last - first):
+                    gs[ii] *= factorG
+                    current += gs[ii]*(e - V)
+                    if spikings[ii]:
+                        Ps[ii] += plus
+                        spikings[ii] = False
+                    else:
+                        Ps[ii] *= factorP
+                    if spike and kinds[ii]:
+                        boost = boosts[ii] + Ps[ii]*maximum
+                        boosts[ii] = boost if boost < maximum else maximum
+            else:
+                first = starts[pp]
+                last = starts[pp] + gs.shape[0]
+                Es = E[first:last]
+                maxima = g_max[first:last]
+                pluses = A_plus[first:last]
+                factorsG = decayG[first:last]
+                factorsP = decayP[first:last]
+                for ii in range(gs.shape[0]):
+                    gs[ii] *= factorsG[ii]
+                    current += gs[ii]*(Es[ii] - V)
+                    if spikings[ii]:
+                        Ps[ii] += pluses[ii]
+                        spikings[ii] = False
+                    else:
+                        Ps[ii] *= factorsP[ii]
+                    if spike and kinds[ii]:
+                        boost = boosts[ii] + Ps[ii]*maxima[ii]
+                        boosts[ii] = boost if boost < maxima[ii] else maxima[ii]
+
+        # Dendrite.updateResting_value, updateV and updateM:
+        resting_value = V_rest + current
+        if spike:
+            V = V_reset
+            spike = False
+        elif V < V_thr:
+            V = resting_value + (V - resting_value)*decayV
+        else:
+            V = V_peak
+            spike = True
+        if spike:
+            M = M - A_minus
+        else:
+            M = M*decayM
+        VTrace[s] = V
+        spikeTrace[s] = spike
+
+    state[0] = V
+    state[1] = M
+    state[2] = resting_value
+    state[3] = 1. if spike else 0.
+
+if numba is not None:
+    stepKernel = numba.njit(nogil=True)(stepBlock)
+else:
+    stepKernel = None
+
+################################################################################
+##
+##                 compileKernel function.
+##
+def compileKernel():
+    """compileKernel function:
+
+    Compiles 'stepKernel' by running it over zero steps, so that the
+    first block of a simulation does not pay for the compilation.
+    """
+    empty = np.zeros(0)
+    stepKernel(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64),
+               np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), empty, empty, empty,
+               np.zeros(0, dtype=bool), empty, empty, empty, empty, empty, empty, np.zeros(0, dtype=bool),
+               np.zeros(4), np.zeros(7), empty, np.zeros(0, dtype=bool))
+
+# Variables of the populations held by the kernel, with one entry per
+# synapse:
+KERNEL_VARIABLES = ['g', 'P', 'g_boost', 'excitatory']
+
+# Parameters of the populations held by the kernel, with one entry per
+# synapse or, if the population shares them (compact mode), a single one:
+KERNEL_PARAMETERS = ['E', 'g_max', 'g_min', 'A_plus', 'decayG', 'decayP']
+
+###############################################################################
+##
+##                 FusedSimulation class.
+##
+class FusedSimulation:
+    """Fused simulation of a PopulationDendrite:
+
+    Advances an object of the class PopulationDendrite and its
+    populations as if 'updateStatus' were called on every population
+    and then on the dendrite at every step. With numba, steps are run
+    in blocks of 'blockSize' by the compiled kernel 'stepKernel';
+    the variables of the populations are then views of arrays holding
+    all the synapses together, so that the kernel works on them in
+    place. Parameters shared by a compact population keep a single
+    entry there, so that the kernel adds no memory per synapse.
+    Without numba (or with useJit=False), the methods of the
+    populations and the dendrite are called as usual.
+
+    The kernel does not implement the aggregate mode nor the
+    'rewardEpsilon' of the dendrite; it refuses dendrites using them,
+    dendrites with PooledAxons inputs (they have no spike trains) and
+    dendrites mixing compact (float32) and non-compact populations,
+    which would have to share float64 arrays.
+
+    Variables:
+    ==> dendrite: object of the class PopulationDendrite being simulated.
+    ==> t: next step to be simulated.
+    ==> blockSize: number of steps run by each call to the kernel.
+    ==> useJit: True ==> the compiled kernel is used.
+    ==> bounds: array with the position of the first synapse of each population in the arrays of the kernel.
+    ==> arrays: dictionary with the arrays of the kernel, one per name in KERNEL_VARIABLES and KERNEL_PARAMETERS.
+    ==> starts: array with the position of the first parameter of each population in the arrays of parameters.
+    ==> shared: boolean array: True ==> the population shares all its parameters, which take a single entry.
+    ==> spiking: scratch array of the kernel.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class FusedSimulation.
+    ==> attach: makes the variables of the populations views of the arrays of the kernel.
+    ==> gatherSpikes: spikes of all the synapses over a block of steps.
+    ==> run: simulates a number of steps.
+    ==> runBlock: simulates a block of steps with the kernel.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, dendrite, start=0, blockSize=1000, useJit=None):
+        """__init__ function for the class FusedSimulation:
+
+        Arguments:
+        ==> dendrite: object of the class PopulationDendrite to be simulated.
+        ==> start: first step to be simulated.
+        ==> blockSize: number of steps run by each call to the kernel.
+        ==> useJit: None ==> use the kernel if numba is installed; True ==> require it; False ==> numpy methods.
+        """
+        if useJit is None:
+            useJit = stepKernel is not None
+        if useJit and stepKernel is None:
+            raise ImportError('numba is required to use the fused kernel.')
+        if useJit and (dendrite.aggregate or dendrite.rewardEpsilon is not None):
+            raise ValueError('The fused kernel supports neither aggregate mode nor rewardEpsilon.')
+        if useJit and any(isinstance(population, PooledAxons) for population in dendrite.inAxons):
+            raise ValueError('The fused kernel does not support PooledAxons inputs.')
+        if useJit and len(set(np.dtype(population.dtype) for population in dendrite.inAxons)) > 1:
+            # Shared arrays would be promoted to float64, losing compact storage:
+            raise ValueError('The fused kernel cannot mix compact and non-compact populations.')
+        self.dendrite = dendrite
+        self.t = start
+        self.blockSize = blockSize
+        self.useJit = useJit
+        self.bounds = np.cumsum([0] + [population.n for population in dendrite.inAxons])
+        self.arrays = None
+        self.starts = None
+        self.shared = None
+        if useJit:
+            self.spiking = np.zeros(self.bounds[-1], dtype=bool)
+            self.attach()
+
+    #########################################################
+    ## attach:
+    def attach(self):
+        """attach function:
+
+        Makes the variables in KERNEL_VARIABLES and the parameters in
+        KERNEL_PARAMETERS of every population views of the arrays of
+        the kernel. Variables which are not views anymore (e.g.
+        because a method of the population replaced them) are copied
+        back into the arrays first. Populations sharing all their
+        parameters (compact mode) take a single entry of the arrays of
+        parameters, refreshed at each call; in the rest, shared
+        parameters take one entry per synapse.
+        """
+        populations = self.dendrite.inAxons
+        for population in populations:
+            population.updateDecayFactors()
+        if self.arrays is None:
+            self.arrays = {}
+            for name in KERNEL_VARIABLES:
+                self.arrays[name] = np.concatenate([np.broadcast_to(getattr(population, name), (population.n,))
+                                                    for population in populations])
+        shared = np.array([all(getattr(population, name).ndim == 0 for name in KERNEL_PARAMETERS)
+                           for population in populations], dtype=bool)
+        if self.shared is None or (self.shared != shared).any():
+            sizes = np.where(shared, 1, [population.n for population in populations])
+            self.shared = shared
+            self.starts = np.cumsum(sizes) - sizes
+            for name in KERNEL_PARAMETERS:
+                self.arrays[name] = np.concatenate([np.broadcast_to(getattr(populations[pp], name), (sizes[pp],))
+                                                    for pp in range(len(populations))])
+
+        for name in KERNEL_VARIABLES + KERNEL_PARAMETERS:
+            array = self.arrays[name]
+            parameter = name in KERNEL_PARAMETERS
+            for pp in range(len(populations)):
+                value = getattr(populations[pp], name)
+                first = self.starts[pp] if parameter else self.bounds[pp]
+                if parameter and shared[pp]:
+                    array[first] = value
+                elif value.ndim == 0:
+                    array[first:first+populations[pp].n] = value
+                elif value.base is not array:
+                    view = array[first:first+populations[pp].n]
+                    view[...] = value
+                    setattr(populations[pp], name, view)
+
+    #########################################################
+    ## gatherSpikes:
+    def gatherSpikes(self, start, stop):
+        """gatherSpikes function:
+
+        Returns (offsets, indices): the indices, in the arrays of the
+        kernel, of the synapses spiking at each step from 'start' to
+        'stop' (excluded), in compressed sparse row format.
+        """
+        offsets = np.zeros(stop - start + 1, dtype=np.int64)
+        chunks = []
+        total = 0
+        for t in range(start, stop):
+            for pp in range(len(self.dendrite.inAxons)):
+                for source in self.dendrite.inAxons[pp].sources:
+                    index = source.getSpikes(t)
+                    if len(index):
+                        chunks.append(index + self.bounds[pp])
+                        total = total + len(index)
+            offsets[t - start + 1] = total
+        if chunks:
+            indices = np.concatenate(chunks).astype(np.int64)
+        else:
+            indices = np.zeros(0, dtype=np.int64)
+        return offsets, indices
+
+    #########################################################
+    ## run:
+    def run(self, steps):
+        """run function:
+
+        Simulates 'steps' steps and returns the boolean array with the
+        spikes of the dendrite at each of them.
+        """
+        spikes = np.zeros(steps, dtype=bool)
+        dendrite = self.dendrite
+        if not self.useJit:
+            for s in range(steps):
+                for population in dendrite.inAxons:
+                    population.updateStatus(self.t)
+                dendrite.updateStatus()
+                spikes[s] = dendrite.spike
+                self.t = self.t + 1
+            return spikes
+
+        self.attach()
+        done = 0
+        while done < steps:
+            size = min(self.blockSize, steps - done)
+            spikes[done:done+size] = self.runBlock(size)
+            done = done + size
+        return spikes
+
+    #########################################################
+    ## runBlock:
+    def runBlock(self, steps):
+        """runBlock function:
+
+        Simulates 'steps' steps with the kernel and returns the spikes
+        of the dendrite at each of them. Afterwards, the variables of
+        the dendrite and the spikes of the populations are those of
+        the last step.
+        """
+        dendrite = self.dendrite
+        clock = dendrite.clock
+        offsets, indices = self.gatherSpikes(self.t, self.t + steps)
+        state = np.array([dendrite.V, dendrite.M, getattr(dendrite, 'resting_value', dendrite.V_rest),
+                          float(dendrite.spike)])
+        parameters = np.array([dendrite.V_rest, dendrite.V_thr, dendrite.V_peak, dendrite.V_reset,
+                               dendrite.A_minus, clock.decayFactor(dendrite.tau),
+                               clock.decayFactor(dendrite.tauMinus)], dtype=float)
+        VTrace = np.zeros(steps)
+        spikeTrace = np.zeros(steps, dtype=bool)
+        arrays = self.arrays
+        stepKernel(offsets, indices, self.bounds, self.starts, self.shared, arrays['g'], arrays['P'],
+                   arrays['g_boost'], arrays['excitatory'], arrays['E'], arrays['g_max'], arrays['g_min'], arrays['A_plus'],
+                   arrays['decayG'], arrays['decayP'], self.spiking, state, parameters, VTrace, spikeTrace)
+
+        dendrite.V = float(state[0])
+        dendrite.M = float(state[1])
+        dendrite.resting_value = float(state[2])
+        dendrite.spike = bool(state[3])
+        dendrite.step = dendrite.step + steps
+        last = indices[offsets[-2]:offsets[-1]]
+        for pp in range(len(dendrite.inAxons)):
+            population = dendrite.inAxons[pp]
+            population.spike = np.zeros(population.n, dtype=bool)
+            inside = last[(last >= self.bounds[pp]) & (last < self.bounds[pp+1])]
+            population.spike[inside - self.bounds[pp]] = True
+        self.t = self.t + steps
+        return spikeTrace
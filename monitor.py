@@ -0,0 +1,541 @@
+"""Recording of simulation variables:
+
+Monitors attach to an object of the simulation (a Dendrite, an Axon,
+a list of Axons or any of the vectorized populations) and record some
+of its variables at each call to 'record' into preallocated numpy
+buffers, so that recording costs O(1) per sample instead of copying
+the whole history as 'x = x + [value]' does. Spike recorders store
+spikes as bit-packed masks, one bit per synapse and step. Convergence
+monitors follow the distribution of synaptic weights and tell when it
+has settled. For long runs, file monitors stream the samples to .npy
+files in fixed-size chunks, so that memory stays bounded and the
+files can be read back with numpy.memmap without copies.
+"""
+
+import os
+import numpy as np
+
+# Number of bits set in each possible byte, to count packed spikes.
+POPCOUNT = np.array([bin(ii).count('1') for ii in range(256)], dtype=np.uint8)
+
+# Size in bytes of the header of the .npy files written by FileMonitor.
+# It is fixed, so that the header can be rewritten in place as rows
+# are appended.
+NPY_HEADER_SIZE = 256
+
+################################################################################
+##
+##                 writeNpyHeader function.
+##
+def writeNpyHeader(fp, dtype, shape):
+    """writeNpyHeader function:
+
+    Writes, at the beginning of the open file 'fp', a .npy header
+    (format version 1.0) of exactly NPY_HEADER_SIZE bytes for an
+    array of type 'dtype' and shape 'shape'.
+    """
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+        np.lib.format.dtype_to_descr(np.dtype(dtype)), tuple(shape))
+    header = header.ljust(NPY_HEADER_SIZE - 11) + '\n'
+    fp.seek(0)
+    fp.write(b'\x93NUMPY\x01\x00')
+    fp.write(np.array(len(header), dtype='<u2').tobytes())
+    fp.write(header.encode('latin1'))
+
+################################################################################
+##
+##                 loadRecording function.
+##
+def loadRecording(directory, name):
+    """loadRecording function:
+
+    Returns the samples of variable 'name' (or 'steps') written by a
+    FileMonitor to 'directory', memory-mapped read-only.
+    """
+    return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+###############################################################################
+##
+##                 Monitor class.
+##
+class Monitor:
+    """Monitor of the variables of an object:
+
+    Each call to 'record' stores the current value of the monitored
+    variables of 'target', one row per sample. If 'every' is larger
+    than 1, only one call out of 'every' is stored. If 'indices' is
+    given, only those entries of array variables (or those objects of
+    a list of objects) are stored.
+
+    Buffers are allocated for 'steps' calls; if more calls come, their
+    capacity is doubled, so that recording stays O(1) amortized.
+
+    Variables:
+    ==> target: object (or list of objects) whose variables are recorded.
+    ==> variables: list with the names of the recorded variables.
+    ==> every: one call out of 'every' is stored.
+    ==> indices: None, or indices of the recorded entries of array variables.
+    ==> buffers: dictionary with the buffer of each variable.
+    ==> steps: array with the number of the call of each sample.
+    ==> count: number of stored samples.
+    ==> calls: number of calls to 'record'.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class Monitor.
+    ==> getValue: current value of a variable of the target.
+    ==> record: stores the current value of the variables.
+    ==> grow: doubles the capacity of the buffers.
+    ==> get: recorded samples of a variable.
+    ==> getSteps: calls at which samples were stored.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, target, variables, steps=1000, every=1, indices=None, dtype=float):
+        """__init__ function for the class Monitor:
+
+        Arguments:
+        ==> target: object (or list of objects) whose variables are recorded.
+        ==> variables: list with the names of the recorded variables.
+        ==> steps: number of calls to 'record' buffers are allocated for.
+        ==> every: one call out of 'every' is stored.
+        ==> indices: None, or indices of the recorded entries of array variables.
+        ==> dtype: type of the buffers.
+        """
+        self.target = target
+        self.variables = list(variables)
+        self.every = every
+        self.indices = indices
+        self.count = 0
+        self.calls = 0
+
+        capacity = max(1, (steps + every - 1)//every)
+        self.buffers = {}
+        for name in self.variables:
+            shape = np.shape(self.getValue(name))
+            self.buffers[name] = np.empty((capacity,) + shape, dtype=dtype)
+        self.steps = np.empty(capacity, dtype=np.int64)
+
+    #########################################################
+    ## getValue:
+    def getValue(self, name):
+        """getValue function:
+
+        Returns the current value of variable 'name' of the target,
+        restricted to 'indices' if given.
+        """
+        if isinstance(self.target, (list, tuple)):
+            objects = self.target
+            if self.indices is not None:
+                objects = [objects[ii] for ii in self.indices]
+            return [getattr(obj, name) for obj in objects]
+        value = getattr(self.target, name)
+        if self.indices is not None and np.ndim(value) > 0:
+            value = np.asarray(value)[..., self.indices]
+        return value
+
+    #########################################################
+    ## record:
+    def record(self):
+        """record function:
+
+        Stores the current value of the monitored variables, if this
+        call is one out of 'every'.
+        """
+        calls = self.calls
+        self.calls = calls + 1
+        if calls % self.every:
+            return
+        if self.count == len(self.steps):
+            self.grow()
+        for name in self.variables:
+            self.buffers[name][self.count] = self.getValue(name)
+        self.steps[self.count] = calls
+        self.count = self.count + 1
+
+    #########################################################
+    ## grow:
+    def grow(self):
+        """grow function:
+
+        Doubles the capacity of the buffers.
+        """
+        for name in self.variables:
+            buffer = self.buffers[name]
+            self.buffers[name] = np.empty((2*len(buffer),) + buffer.shape[1:], dtype=buffer.dtype)
+            self.buffers[name][:len(buffer)] = buffer
+        steps = self.steps
+        self.steps = np.empty(2*len(steps), dtype=steps.dtype)
+        self.steps[:len(steps)] = steps
+
+    #########################################################
+    ## get:
+    def get(self, name):
+        """get function:
+
+        Returns the samples of variable 'name' recorded so far, one
+        row per sample (a view, not a copy).
+        """
+        return self.buffers[name][:self.count]
+
+    #########################################################
+    ## getSteps:
+    def getSteps(self):
+        """getSteps function:
+
+        Returns the number of the call to 'record' at which each
+        sample was stored.
+        """
+        return self.steps[:self.count]
+
+###############################################################################
+##
+##                 FileMonitor class.
+##
+class FileMonitor(Monitor):
+    """Monitor streaming to disk:
+
+    Same as Monitor, but samples are kept in buffers of 'chunkSize'
+    rows which are appended to one .npy file per variable (plus
+    'steps.npy') in 'directory' whenever they are full. Headers are
+    updated after each chunk, so that the files are valid .npy files
+    during the whole run. Memory use is independent of the length of
+    the run.
+
+    Variables:
+    ==> directory: directory where the files are written.
+    ==> files: dictionary with the open file of each variable and of 'steps'.
+    ==> written: number of samples already written to the files.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class FileMonitor.
+    ==> grow: writes the buffers to the files (instead of growing them).
+    ==> flush: writes the buffers to the files.
+    ==> close: writes the remaining samples and closes the files.
+    ==> get: recorded samples of a variable, memory-mapped from its file.
+    ==> getSteps: calls at which samples were stored, memory-mapped from its file.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, target, variables, directory, chunkSize=10000, every=1, indices=None, dtype=float):
+        """__init__ function for the class FileMonitor:
+
+        Arguments:
+        ==> directory: directory where the files are written. It is created if it does not exist.
+        ==> chunkSize: number of samples kept in memory before being written.
+        ==> The rest of arguments are those of the class Monitor.
+        """
+        Monitor.__init__(self, target, variables, chunkSize*every, every, indices, dtype)
+        self.directory = directory
+        self.written = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.files = {}
+        for name in self.variables + ['steps']:
+            self.files[name] = open(os.path.join(directory, name + '.npy'), 'w+b')
+        self.writeHeaders()
+
+    #########################################################
+    ## writeHeaders:
+    def writeHeaders(self):
+        """writeHeaders function:
+
+        Rewrites the header of every file with the number of samples
+        written so far.
+        """
+        for name in self.variables:
+            buffer = self.buffers[name]
+            writeNpyHeader(self.files[name], buffer.dtype, (self.written,) + buffer.shape[1:])
+        writeNpyHeader(self.files['steps'], self.steps.dtype, (self.written,))
+
+    #########################################################
+    ## grow:
+    def grow(self):
+        """grow function:
+
+        Buffers of a FileMonitor do not grow: when full, they are
+        written to the files.
+        """
+        self.flush()
+
+    #########################################################
+    ## flush:
+    def flush(self):
+        """flush function:
+
+        Appends the samples in the buffers to the files and empties
+        the buffers.
+        """
+        if self.count:
+            for name in self.variables:
+                buffer = self.buffers[name]
+                fp = self.files[name]
+                fp.seek(NPY_HEADER_SIZE + self.written*buffer[0].nbytes)
+                fp.write(buffer[:self.count].tobytes())
+            fp = self.files['steps']
+            fp.seek(NPY_HEADER_SIZE + self.written*self.steps.itemsize)
+            fp.write(self.steps[:self.count].tobytes())
+            self.written = self.written + self.count
+            self.count = 0
+            self.writeHeaders()
+        for fp in self.files.values():
+            fp.flush()
+
+    #########################################################
+    ## close:
+    def close(self):
+        """close function:
+
+        Writes the remaining samples and closes the files.
+        """
+        self.flush()
+        for fp in self.files.values():
+            fp.close()
+
+    #########################################################
+    ## get:
+    def get(self, name):
+        """get function:
+
+        Writes the buffers and returns all the samples of variable
+        'name', memory-mapped from its file.
+        """
+        if not self.files[name].closed:
+            self.flush()
+        return loadRecording(self.directory, name)
+
+    #########################################################
+    ## getSteps:
+    def getSteps(self):
+        """getSteps function:
+
+        Same as 'get' for the number of the call to 'record' at which
+        each sample was stored.
+        """
+        return self.get('steps')
+
+###############################################################################
+##
+##                 SpikeRecorder class.
+##
+class SpikeRecorder(Monitor):
+    """Recorder of spikes:
+
+    Monitor of the 'spike' variable of an object (a Dendrite, an
+    Axon, a list of Axons or a population), which stores each sample
+    bit-packed along the synapses, i.e. about 1 bit per synapse and
+    step, and answers queries on time windows. Windows are given in
+    samples, from 'start' (included) to 'stop' (excluded).
+
+    Variables:
+    ==> shape: shape of the unpacked spike mask of one sample.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class SpikeRecorder.
+    ==> getValue: packed spike mask of the target.
+    ==> getRaster: unpacked spike masks of a window.
+    ==> getEvents: (sample, synapse) pairs of the spikes of a window.
+    ==> getCounts: number of spikes of each synapse in a window.
+    ==> getTotals: number of spikes of all the synapses in each sample of a window.
+    ==> getRates: firing rate of each synapse in a window.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, target, steps=1000, every=1, indices=None):
+        """__init__ function for the class SpikeRecorder:
+
+        Arguments are those of the class Monitor.
+        """
+        self.shape = None
+        Monitor.__init__(self, target, ['spike'], steps, every, indices, np.uint8)
+        self.shape = np.shape(np.atleast_1d(Monitor.getValue(self, 'spike')))
+
+    #########################################################
+    ## getValue:
+    def getValue(self, name):
+        """getValue function:
+
+        Returns the spike mask of the target packed into bytes along
+        its last axis.
+        """
+        spike = np.atleast_1d(np.asarray(Monitor.getValue(self, name), dtype=bool))
+        return np.packbits(spike, axis=-1)
+
+    #########################################################
+    ## getRaster:
+    def getRaster(self, start=0, stop=None):
+        """getRaster function:
+
+        Returns the boolean spike masks of the samples of the window,
+        one row per sample.
+        """
+        packed = self.get('spike')[start:stop]
+        return np.unpackbits(packed, axis=-1)[..., :self.shape[-1]].astype(bool)
+
+    #########################################################
+    ## getEvents:
+    def getEvents(self, start=0, stop=None):
+        """getEvents function:
+
+        Returns the arrays (samples, synapses) of the spikes of the
+        window, sorted by sample. For targets with more than one
+        dimension (e.g. batches), one more array is returned per
+        dimension.
+        """
+        events = np.nonzero(self.getRaster(start, stop))
+        return (events[0] + (start if start >= 0 else self.count + start),) + events[1:]
+
+    #########################################################
+    ## getCounts:
+    def getCounts(self, start=0, stop=None):
+        """getCounts function:
+
+        Returns the number of spikes of each synapse in the window.
+        """
+        return self.getRaster(start, stop).sum(axis=0)
+
+    #########################################################
+    ## getTotals:
+    def getTotals(self, start=0, stop=None):
+        """getTotals function:
+
+        Returns the number of spikes of all the synapses in each
+        sample of the window, counted on the packed bytes.
+        """
+        packed = self.get('spike')[start:stop]
+        return POPCOUNT[packed].reshape(len(packed), -1).sum(axis=1, dtype=np.int64)
+
+    #########################################################
+    ## getRates:
+    def getRates(self, DeltaT, start=0, stop=None):
+        """getRates function:
+
+        Returns the firing rate of each synapse in the window (in
+        spikes per time unit), given the time step 'DeltaT' of the
+        simulation.
+        """
+        samples = len(self.get('spike')[start:stop])
+        return self.getCounts(start, stop)/(samples*self.every*float(DeltaT))
+
+###############################################################################
+##
+##                 ConvergenceMonitor class.
+##
+class ConvergenceMonitor:
+    """Detector of the steady state of synaptic weights:
+
+    Every 'every' calls to 'record', the weights g_boost/g_max of the
+    target (a population or a list of Axons) are compared with those
+    of the previous check, and the following statistics are updated:
+
+    - drift: largest change of a single weight;
+    - histDistance: total variation distance between the normalized
+      histograms ('bins' bins over [0, 1]) of the weights;
+    - changeRate: exponential moving average (with weight 'alpha' for
+      the newest value) of the mean absolute change per step.
+
+    Weights are taken to have converged when the drift is at most
+    'driftTolerance', the histogram distance at most 'histTolerance'
+    and, if 'rateTolerance' is given, the change rate at most
+    'rateTolerance'.
+
+    Variables:
+    ==> target: population or list of Axons whose weights are followed.
+    ==> every: one call to 'record' out of 'every' checks the weights.
+    ==> weights, histogram: weights and histogram at the last check.
+    ==> drift, histDistance, changeRate: statistics at the last check (None before the second check).
+    ==> checks: number of checks done.
+    ==> converged: boolean: True ==> the weights have converged.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class ConvergenceMonitor.
+    ==> getWeights: current weights of the target.
+    ==> record: counts a step and checks the weights every 'every' steps.
+    ==> check: updates the statistics and the 'converged' flag.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, target, every=10000, bins=20, driftTolerance=0.01, histTolerance=0.05,
+                 rateTolerance=None, alpha=0.5):
+        """__init__ function for the class ConvergenceMonitor:
+
+        Arguments:
+        ==> target: population or list of Axons whose weights are followed.
+        ==> every: one call to 'record' out of 'every' checks the weights.
+        ==> bins: number of bins of the histograms.
+        ==> driftTolerance, histTolerance, rateTolerance: tolerances of the statistics (see class docstring).
+        ==> alpha: weight of the newest value in the moving average of the change rate.
+        """
+        self.target = target
+        self.every = every
+        self.bins = bins
+        self.driftTolerance = driftTolerance
+        self.histTolerance = histTolerance
+        self.rateTolerance = rateTolerance
+        self.alpha = alpha
+
+        self.calls = 0
+        self.checks = 0
+        self.weights = None
+        self.histogram = None
+        self.drift = None
+        self.histDistance = None
+        self.changeRate = None
+        self.converged = False
+
+    #########################################################
+    ## getWeights:
+    def getWeights(self):
+        """getWeights function:
+
+        Returns an array with the current g_boost/g_max of each
+        synapse of the target.
+        """
+        if isinstance(self.target, (list, tuple)):
+            return np.array([axon.g_boost/float(axon.g_max) for axon in self.target])
+        return np.asarray(self.target.g_boost/self.target.g_max, dtype=float).ravel()
+
+    #########################################################
+    ## record:
+    def record(self):
+        """record function:
+
+        Counts a step and, one out of 'every' steps, checks the
+        weights. Returns the 'converged' flag.
+        """
+        calls = self.calls
+        self.calls = calls + 1
+        if calls % self.every == 0:
+            self.check()
+        return self.converged
+
+    #########################################################
+    ## check:
+    def check(self):
+        """check function:
+
+        Compares the current weights with those of the previous check,
+        updates the statistics and the 'converged' flag and returns
+        the latter.
+        """
+        weights = self.getWeights()
+        histogram = np.histogram(weights, self.bins, (0, 1))[0]/float(max(len(weights), 1))
+        if self.weights is not None:
+            change = np.abs(weights - self.weights)
+            self.drift = change.max() if len(change) else 0.
+            self.histDistance = 0.5*np.abs(histogram - self.histogram).sum()
+            rate = change.mean()/self.every if len(change) else 0.
+            if self.changeRate is None:
+                self.changeRate = rate
+            else:
+                self.changeRate = self.alpha*rate + (1-self.alpha)*self.changeRate
+            self.converged = (self.drift <= self.driftTolerance and
+                              self.histDistance <= self.histTolerance and
+                              (self.rateTolerance is None or self.changeRate <= self.rateTolerance))
+        self.weights = weights
+        self.histogram = histogram
+        self.checks = self.checks + 1
+        return self.converged
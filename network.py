@@ -0,0 +1,366 @@
+"""Networks of neurons sharing presynaptic axons:
+
+An object of the class Axon can only be attached to one dendrite. The
+class Network of this module connects instead 'nPre' presynaptic
+sources to 'nPost' postsynaptic dendrites through a sparse
+connectivity matrix in compressed sparse row (CSR) format: the
+synapses of source 'j' go to the dendrites indices[indptr[j]:indptr[j+1]].
+Each synapse has its own g_boost, rewarded and penalized after the
+rules of the class Axon, so that thousands of neurons can learn with
+the same STDP rule at once.
+
+Two properties of the model keep the state small:
+
+- 'P' only depends on the spikes of the presynaptic source and 'M'
+  only on those of the postsynaptic dendrite, so they are stored once
+  per source and once per dendrite.
+- The dendrites only see the sum of the conductances of their
+  synapses with the same (E, tau), so these sums are kept per
+  dendrite as in the aggregate mode of the class Dendrite, instead of
+  one conductance per synapse.
+
+Spike propagation, penalizations and rewards are then operations on
+the rows (sources) and columns (dendrites) of the sparse matrix.
+"""
+
+import numpy as np
+import numpy.random as rand
+from population import *
+
+################################################################################
+##
+##                 expandRanges function.
+##
+def expandRanges(indptr, rows):
+    """expandRanges function:
+
+    Returns the concatenation of the ranges indptr[r]:indptr[r+1] for
+    each 'r' in 'rows', i.e. the positions of the entries of those
+    rows of a sparse matrix with row pointers 'indptr'.
+    """
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    shift = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return shift + np.arange(total)
+
+################################################################################
+##
+##                 randomConnectivity function.
+##
+def randomConnectivity(nPre, nPost, p_connect, rng=rand):
+    """randomConnectivity function:
+
+    Returns (indptr, indices), the CSR connectivity matrix of 'nPre'
+    sources to 'nPost' dendrites in which each pair is connected with
+    probability 'p_connect'. Only the connections are drawn, so that
+    the cost is proportional to their number.
+    """
+    counts = rng.binomial(nPost, p_connect, nPre)
+    indptr = np.zeros(nPre + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(counts)
+    indices = np.empty(indptr[-1], dtype=np.int64)
+    for jj in range(nPre):
+        indices[indptr[jj]:indptr[jj+1]] = np.sort(rng.choice(nPost, counts[jj], replace=False))
+    return indptr, indices
+
+################################################################################
+##
+##                 denseConnectivity function.
+##
+def denseConnectivity(mask):
+    """denseConnectivity function:
+
+    Returns (indptr, indices), the CSR connectivity matrix of the
+    boolean (nPre x nPost) matrix 'mask'.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    indptr = np.zeros(mask.shape[0] + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(mask.sum(axis=1))
+    return indptr, np.nonzero(mask)[1].astype(np.int64)
+
+###############################################################################
+##
+##                 Network class.
+##
+class Network:
+    """Sparse network of presynaptic sources and dendrites:
+
+    Holds 'nPre' presynaptic sources, 'nPost' dendrites and the
+    synapses between them, and updates all of them at each step after
+    the rules of the classes Axon and Dendrite. Parameters of the
+    sources (p_spike, E, tau, A_plus, tauPlus, g_max, g_min) take a
+    scalar or one value per source, parameters of the dendrites a
+    scalar or one value per dendrite, and g_boost a scalar or one
+    value per synapse. A source is excitatory (E=0) for all its
+    synapses, which are then plastic.
+
+    Variables:
+    ==> nPre, nPost, nSynapses: number of sources, dendrites and synapses.
+    ==> indptr, indices: CSR connectivity matrix (source-major).
+    ==> pre: array with the source of each synapse.
+    ==> postptr, postOrder: CSC view of the connectivity: the synapses of dendrite 'i' are postOrder[postptr[i]:postptr[i+1]].
+    ==> g_boost: array with the g_boost of each synapse.
+    ==> p_spike, E, tau, A_plus, tauPlus, g_max, g_min: arrays with the parameters of each source.
+    ==> P, spike: arrays with the potential reward and the spike of each source.
+    ==> excitatory: boolean array: True ==> excitatory source (E=0).
+    ==> raster, source, sources: spike sources, as in the class AxonPopulation.
+    ==> classKeys: list with the different (E, tau) pairs of the sources.
+    ==> classIndex: array with the position in 'classKeys' of the pair of each source.
+    ==> G: (number of classes x nPost) array with the total conductance of each class of synapses of each dendrite.
+    ==> V, spike_post, M, resting_value: arrays with the variables of the same name of each dendrite.
+    ==> V_rest, tau_post, V_thr, V_peak, V_reset, A_minus, tauMinus: arrays with the parameters of each dendrite.
+    ==> clock: object of the class Clock giving the time step of the simulation.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class Network.
+    ==> updateStatus: updates the whole network.
+    ==> updateDecayFactors: recomputes the decay factors if the time step changed.
+    ==> getSpikes: indices of the sources which spike at a given step.
+    ==> updateG: propagates the spikes of the sources and decays the conductances.
+    ==> updateP: updates the potential reward of the sources.
+    ==> updateResting_value: updates the value to which the voltage of each dendrite tends.
+    ==> updateV: updates the voltage of the dendrites and rewards the synapses of those which fired.
+    ==> updateM: updates the potential penalization of each dendrite.
+    ==> getReward: rewards the excitatory synapses of the given dendrites.
+    ==> getPenalization: penalizes the given synapses.
+    ==> getWeights: g_boost/g_max of each synapse.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, indptr, indices, nPost, p_spike=0, E=0, spike_map=None, g_boost=0.015, g_max=0.015,
+                 g_min=0, tau=5, A_plus=0.005, tauPlus=20, V_rest=-70, tau_post=20, V_thr=-54, V_peak=0,
+                 V_reset=-60, A_minus=0.00525, tauMinus=20, rng=rand, clock=defaultClock):
+        """__init__ function for the class Network:
+
+        Arguments:
+        ==> indptr, indices: CSR connectivity matrix, e.g. from randomConnectivity.
+        ==> nPost: number of dendrites.
+        ==> spike_map: None, a list with the spike map (or None) of each source, or an object of the class SpikeRaster.
+        ==> tau_post: eigentime of the decay of V (the 'tau' of the class Dendrite).
+        ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+        ==> The rest of arguments are those of the classes Axon and Dendrite.
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.nPre = len(self.indptr) - 1
+        self.nPost = nPost
+        self.nSynapses = len(self.indices)
+        self.clock = clock
+
+        # Sources:
+        self.p_spike = toArray(p_spike, self.nPre)
+        self.E = toArray(E, self.nPre)
+        self.tau = toArray(tau, self.nPre)
+        self.A_plus = toArray(A_plus, self.nPre)
+        self.tauPlus = toArray(tauPlus, self.nPre)
+        self.g_max = toArray(g_max, self.nPre)
+        self.g_min = toArray(g_min, self.nPre)
+        self.excitatory = self.E == 0
+        self.P = np.zeros(self.nPre)
+        self.spike = np.zeros(self.nPre, dtype=bool)
+        self.raster = None
+        self.source = None
+        poisson = self.p_spike > 0
+        if isinstance(spike_map, SpikeRaster):
+            self.raster = spike_map
+            poisson[:] = False
+        elif spike_map is not None:
+            self.raster = SpikeRaster.fromSpikeMap(spike_map, self.nPre)
+            for jj in range(self.nPre):
+                if spike_map[jj] is not None:
+                    poisson[jj] = False
+        if poisson.any():
+            self.source = PoissonSource(np.where(poisson, self.p_spike, 0), rng=rng)
+        self.sources = [source for source in (self.raster, self.source) if source is not None]
+        keys, index = np.unique(np.column_stack((self.E, self.tau)), axis=0, return_inverse=True)
+        self.classKeys = [(float(E), float(tau)) for E, tau in keys]
+        self.classIndex = index.ravel()
+
+        # Synapses:
+        self.g_boost = toArray(g_boost, self.nSynapses)
+        self.pre = np.repeat(np.arange(self.nPre), np.diff(self.indptr))
+        self.postOrder = np.argsort(self.indices, kind='mergesort')
+        self.postptr = np.zeros(nPost + 1, dtype=np.int64)
+        self.postptr[1:] = np.cumsum(np.bincount(self.indices, minlength=nPost))
+
+        # Dendrites:
+        self.V_rest = toArray(V_rest, nPost)
+        self.tau_post = toArray(tau_post, nPost)
+        self.V_thr = toArray(V_thr, nPost)
+        self.V_peak = toArray(V_peak, nPost)
+        self.V_reset = toArray(V_reset, nPost)
+        self.A_minus = toArray(A_minus, nPost)
+        self.tauMinus = toArray(tauMinus, nPost)
+        self.V = self.V_rest.copy()
+        self.spike_post = np.zeros(nPost, dtype=bool)
+        self.M = np.zeros(nPost)
+        self.resting_value = self.V_rest.copy()
+        self.G = np.zeros((len(self.classKeys), nPost))
+        self.DeltaT = None
+
+    #########################################################
+    ## updateStatus:
+    def updateStatus(self, t):
+        """updateStatus function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        Updates the sources and their synapses and then the
+        dendrites, as updating every Axon and then every Dendrite.
+        """
+        self.updateG(t)
+        self.updateP()
+        self.updateResting_value()
+        self.updateV()
+        self.updateM()
+
+    #########################################################
+    ## updateDecayFactors:
+    def updateDecayFactors(self):
+        """updateDecayFactors function:
+
+        Recomputes the decay factors of G, P, V and M whenever the
+        time step of the clock differs from the one they were
+        computed for.
+        """
+        if self.DeltaT != self.clock.DeltaT:
+            self.DeltaT = self.clock.DeltaT
+            self.decayG = np.array([decayFactor(key[1], self.DeltaT) for key in self.classKeys])[:,np.newaxis]
+            self.decayP = decayArray(self.tauPlus, self.DeltaT)
+            self.decayV = decayArray(self.tau_post, self.DeltaT)
+            self.decayM = decayArray(self.tauMinus, self.DeltaT)
+
+    #########################################################
+    ## getSpikes:
+    def getSpikes(self, t):
+        """getSpikes function:
+
+        Returns the sorted indices of the sources which spike at step
+        't' (after their spike maps or with probability p_spike).
+        """
+        spikes = [source.getSpikes(t) for source in self.sources]
+        if len(spikes) == 1:
+            # Sources give the spikes of a step in the order they were drawn:
+            return np.sort(spikes[0])
+        return np.unique(np.concatenate(spikes))
+
+    #########################################################
+    ## updateG:
+    def updateG(self, t):
+        """UpdateG function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        Same as 'Axon.updateG' for every synapse: the synapses of the
+        spiking sources add their g_boost to the conductance of their
+        class in their dendrite, and the excitatory ones get
+        penalized with the M of their dendrite. Then the conductances
+        decay.
+        """
+        firing = self.getSpikes(t)
+        self.spike[:] = False
+        self.spike[firing] = True
+
+        synapses = expandRanges(self.indptr, firing)
+        if synapses.size:
+            post = self.indices[synapses]
+            classes = self.classIndex[self.pre[synapses]]
+            self.G += np.bincount(classes*self.nPost + post, weights=self.g_boost[synapses],
+                                  minlength=self.G.size).reshape(self.G.shape)
+            self.getPenalization(synapses[self.excitatory[self.pre[synapses]]])
+
+        self.updateDecayFactors()
+        self.G *= self.decayG
+
+    #########################################################
+    ## updateP:
+    def updateP(self):
+        """updateP function:
+
+          Same as 'Axon.updateP' for every source.
+        """
+        self.updateDecayFactors()
+        self.P = np.where(self.spike, self.P + self.A_plus, self.P*self.decayP)
+
+    #########################################################
+    ## updateResting_value:
+    def updateResting_value(self):
+        """updateResting_value function:
+
+          Same as 'Dendrite.updateResting_value' for every dendrite,
+          from the conductance of each class of synapses.
+        """
+        E = np.array([key[0] for key in self.classKeys])[:,np.newaxis]
+        self.resting_value = self.V_rest + (self.G*(E - self.V)).sum(axis=0)
+
+    #########################################################
+    ## updateV:
+    def updateV(self):
+        """updateV function:
+
+            Same as 'Dendrite.updateV' for every dendrite: dendrites
+            which fired in the previous step are reset and their
+            excitatory synapses rewarded; those under threshold decay
+            towards their resting value; the rest fire.
+        """
+        fired = self.spike_post
+        if fired.any():
+            self.getReward(np.flatnonzero(fired))
+
+        below = ~fired & (self.V < self.V_thr)
+        decayed = self.resting_value + (self.V - self.resting_value)*self.decayV
+        self.V = np.where(fired, self.V_reset, np.where(below, decayed, self.V_peak))
+        self.spike_post = ~fired & ~below
+
+    #########################################################
+    ## updateM:
+    def updateM(self):
+        """updateM function:
+
+          Same as 'Dendrite.updateM' for every dendrite.
+        """
+        self.M = np.where(self.spike_post, self.M - self.A_minus, self.M*self.decayM)
+
+    #########################################################
+    ## getReward:
+    def getReward(self, dendrites):
+        """getReward function:
+
+          Same as 'Axon.getReward' for the excitatory synapses of the
+          dendrites with indices 'dendrites', each one with the P of
+          its source.
+        """
+        synapses = self.postOrder[expandRanges(self.postptr, dendrites)]
+        pre = self.pre[synapses]
+        keep = self.excitatory[pre]
+        synapses = synapses[keep]
+        pre = pre[keep]
+        g_boost = self.g_boost[synapses] + self.P[pre]*self.g_max[pre]
+        self.g_boost[synapses] = np.minimum(g_boost, self.g_max[pre])
+
+    #########################################################
+    ## getPenalization:
+    def getPenalization(self, synapses):
+        """getPenalization function:
+
+          Same as 'Axon.getPenalization' for the synapses with indices
+          'synapses', each one with the M of its dendrite.
+        """
+        pre = self.pre[synapses]
+        g_boost = self.g_boost[synapses] + self.M[self.indices[synapses]]*self.g_max[pre]
+        self.g_boost[synapses] = np.maximum(g_boost, self.g_min[pre])
+
+    #########################################################
+    ## getWeights:
+    def getWeights(self):
+        """getWeights function:
+
+          Returns the array with g_boost/g_max of each synapse.
+        """
+        return self.g_boost/self.g_max[self.pre]
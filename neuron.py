@@ -4,6 +4,9 @@ synaptic plasticity; Song, Miller, Abbott, Nature Neuroscience
 2000).
 """
 
+import math
+import bisect
+import numpy as np
 import numpy.random as rand
 from helper import *
 
@@ -31,20 +34,35 @@ class Dendrite:
     ==> M: potential penalization that presynaptic axons spiking out of time might get.
     ==> A_minus: increase of 'M' each time 'self' fires.
     ==> tau_minus: eigentime of the decay of the penalization.
+    ==> clock: object of the class Clock giving the time step of the simulation.
+    ==> aggregate: boolean: True ==> the conductances of 'inAxons' are summed up incrementally (see updateResting_value).
+    ==> conductances: dictionary with the total conductance of the axons sharing inversion potential and eigentime, keyed by (E, tau). Only used when 'aggregate' is True.
+    ==> arrivals: dictionary with the conductance brought by the action potentials of the current time step, keyed by (E, tau).
+    ==> rewardEpsilon: None, or threshold of 'P' under which excitatory axons are not rewarded (see rewardAxons).
+    ==> step: number of time steps 'self' has been updated.
+    ==> activeBuckets: dictionary with the set of active excitatory axons keyed by the step of their last spike. Only used when 'rewardEpsilon' is given.
+    ==> activeExpiry: dictionary with the last step at which some axon of each bucket of 'activeBuckets' might still have P >= rewardEpsilon.
+    ==> activeAxons: dictionary with the step of the last spike of each active excitatory axon (possibly of a bucket already dropped).
 
     Methods:
     ==> __init__: __init__ function for objects of class Dendrite.
     ==> updateStatus: updates all the variables enclosed in objects of class Dendrite using the corresponding methods.
     ==> updateV: updates the voltage of objects of the class Dendrite afther the corresponding model and elicits any further action if necessary.
+    ==> rewardAxons: rewards the excitatory axons attached to 'self' after a spike.
     ==> updateResting_value: updates the value to which the voltage tends at each time.
     ==> updateM: updates the function which controls the penalizations.
+    ==> addConductance: registers the conductance brought by an action potential (aggregate mode).
+    ==> resetConductances: recomputes the total conductances from the attached axons (aggregate mode).
+    ==> markActive: registers an excitatory axon which just spiked as a candidate for rewards.
+    ==> getExpiry: last step at which an active axon might still be rewarded.
+    ==> resetActiveAxons: rebuilds the set of active axons from the attached axons.
     """
 
     #########################################################
     ##
     ## __init__:
     def __init__(self, arrayAxons, V_rest=-70, tau=20, V_thr=-54, V_peak=0, V_reset=-60,
-                 A_minus=0.00525, tauMinus=20):
+                 A_minus=0.00525, tauMinus=20, aggregate=False, rewardEpsilon=None, clock=defaultClock):
         """__init__ function for the class Dendrite:
 
         This function initializes the objects of class Dendrite.
@@ -59,6 +77,9 @@ class Dendrite:
         ==> V_reset: potential to which the voltage is set after spiking.
         ==> A_minus: increase of 'M' each time 'self' fires.
         ==> tau_minus: eigentime of the decay of the penalization.
+        ==> aggregate: if True, the resting value is computed from running totals of the conductances (see updateResting_value).
+        ==> rewardEpsilon: if given, only excitatory axons whose 'P' is at least 'rewardEpsilon' are rewarded (see rewardAxons).
+        ==> clock: object of the class Clock giving the time step. It is also given to the axons in 'inAxons'.
         """
         self.inAxons = arrayAxons
         self.V_rest = V_rest
@@ -68,17 +89,36 @@ class Dendrite:
         self.V_reset = V_reset
         self.A_minus = A_minus
         self.tauMinus = tauMinus
+        self.aggregate = aggregate
+        self.rewardEpsilon = rewardEpsilon
+        self.clock = clock
 
         # Some aditional parameters of objects of class Axon which are
         # not explicitly given but set here:
         self.V = V_rest
         self.spike = False
         self.M = 0
+        self.step = 0
+        self.activeBuckets = {}
+        self.activeExpiry = {}
+        self.activeAxons = {}
        
         # When initialized, info is given to the presynaptic axons of
-        # which dendrite they are being attached to:
+        # which dendrite they are being attached to and of the clock
+        # they share with it. An axon drives a single dendrite (see
+        # the network module to share presynaptic axons):
         for axon in self.inAxons:
+            if axon.outDendrite is not None and axon.outDendrite is not self:
+                raise ValueError('Axon already attached to another dendrite; use network.Network to share presynaptic axons.')
             axon.outDendrite = self
+            axon.clock = self.clock
+
+        self.arrivals = {}
+        if self.aggregate:
+            self.resetConductances()
+
+        if self.rewardEpsilon is not None:
+            self.resetActiveAxons()
 
     #########################################################
     ## updateStatus:
@@ -91,6 +131,7 @@ class Dendrite:
         self.updateResting_value()
         self.updateV()
         self.updateM()
+        self.step = self.step + 1
 
     #########################################################
     ## updateV:
@@ -106,22 +147,56 @@ class Dendrite:
             elicits those actions which are explicitly triggered by
             action potentials happening in postsynaptic
             dendrites. Thus, if a spike happens, this function calls
-            the 'getReward()' function for each excitatory axon
+            'rewardAxons()', which rewards each excitatory axon
             attached to 'self'.
         """
         if self.spike:
             self.V = self.V_reset
-            for axon in self.inAxons:
-                if axon.E == 0:
-                    axon.getReward()
+            self.rewardAxons()
             self.spike = False
         else:
             if self.V < self.V_thr:
-                self.V = euler(exponentialDecay, self.V, [self.tau,self.resting_value])
+                self.V = self.clock.decay(self.V, self.tau, self.resting_value)
             else:
                 self.V = self.V_peak
                 self.spike = True
 
+    #########################################################
+    ## rewardAxons:
+    def rewardAxons(self):
+        """rewardAxons function:
+
+            This function calls the 'getReward()' function for each
+            excitatory axon attached to 'self'. It is called by
+            'updateV' right after 'self' has fired.
+
+            If 'self.rewardEpsilon' is given, only the active axons
+            are visited. Axons register themselves through
+            'markActive' each time they spike, and are kept in
+            buckets keyed by the step of their last spike. Since 'P'
+            only decays between spikes, the P of every axon of a
+            bucket is under 'rewardEpsilon' after a number of steps
+            known when they spiked (see getExpiry); buckets older than
+            that are dropped as a whole, without visiting their axons.
+            The cost is then proportional to the number of axons which
+            fired within the last few 'tauPlus', instead of to the
+            number of attached axons.
+        """
+        if self.rewardEpsilon is None:
+            for axon in self.inAxons:
+                if axon.E == 0:
+                    axon.getReward()
+            return
+
+        for step in list(self.activeBuckets.keys()):
+            if self.step > self.activeExpiry[step]:
+                del self.activeBuckets[step]
+                del self.activeExpiry[step]
+                continue
+            for axon in self.activeBuckets[step]:
+                if axon.P >= self.rewardEpsilon:
+                    axon.getReward()
+
     #########################################################
     ## updateResting_value:
     def updateResting_value(self):
@@ -136,13 +211,119 @@ class Dendrite:
             decaying. This value towards the voltage decays is stored
             in the variable 'resting_value' of an object of class
             Dendrite.
+
+            If 'self.aggregate' is True, the axons are not visited at
+            all. All axons with the same inversion potential and the
+            same eigentime decay by the same factor, so the sum of
+            their conductances is kept as a running total which is
+            decayed once per step and increased only by the
+            conductance of the axons which spiked (see
+            addConductance). The cost is then independent of the
+            number of axons and the result is the same within float
+            tolerance.
         """
         sum = 0
-        for axon in self.inAxons:
-            sum = sum + axon.g*(axon.E-self.V)
+        if self.aggregate:
+            for key in self.conductances:
+                E, tau = key
+                g = self.conductances[key] + self.arrivals.get(key, 0)
+                g = self.clock.decay(g, tau)
+                self.conductances[key] = g
+                sum = sum + g*(E-self.V)
+            self.arrivals = {}
+        else:
+            for axon in self.inAxons:
+                sum = sum + axon.g*(axon.E-self.V)
 
         self.resting_value = self.V_rest + sum
 
+    #########################################################
+    ## addConductance:
+    def addConductance(self, E, tau, g):
+        """addConductance function:
+
+            Registers an increase 'g' of the conductance of the axons
+            with inversion potential 'E' and eigentime 'tau' during
+            the current time step. Axons call it when an action
+            potential arrives and 'self.aggregate' is True.
+        """
+        key = (E, tau)
+        if key not in self.conductances:
+            self.conductances[key] = 0
+        self.arrivals[key] = self.arrivals.get(key, 0) + g
+
+    #########################################################
+    ## markActive:
+    def markActive(self, axon):
+        """markActive function:
+
+            Moves 'axon' to the bucket of the current step, so that it
+            is rewarded if 'self' fires while its 'P' is still larger
+            than 'rewardEpsilon'. Excitatory axons call it when they
+            spike and 'self.rewardEpsilon' is given.
+        """
+        previous = self.activeAxons.get(axon)
+        if previous in self.activeBuckets:
+            bucket = self.activeBuckets[previous]
+            bucket.discard(axon)
+            if not bucket:
+                del self.activeBuckets[previous]
+                del self.activeExpiry[previous]
+        if self.step not in self.activeBuckets:
+            self.activeBuckets[self.step] = set()
+            self.activeExpiry[self.step] = self.step
+        self.activeBuckets[self.step].add(axon)
+        self.activeExpiry[self.step] = max(self.activeExpiry[self.step], self.getExpiry(axon))
+        self.activeAxons[axon] = self.step
+
+    #########################################################
+    ## getExpiry:
+    def getExpiry(self, axon):
+        """getExpiry function:
+
+            Returns the last step at which the 'P' of 'axon' might
+            still be at least 'rewardEpsilon' if it does not spike
+            again: 'P' decays by exp(-DeltaT/tauPlus) per step, so it
+            falls under 'rewardEpsilon' after tauPlus*ln(P/rewardEpsilon)/DeltaT
+            steps (one more step is kept as a margin).
+        """
+        if axon.P < self.rewardEpsilon:
+            return self.step
+        steps = axon.tauPlus*math.log(axon.P/self.rewardEpsilon)/self.clock.DeltaT
+        return self.step + int(steps) + 1
+
+    #########################################################
+    ## resetActiveAxons:
+    def resetActiveAxons(self):
+        """resetActiveAxons function:
+
+            Rebuilds the buckets of active axons used when
+            'rewardEpsilon' is given from the current 'P' of the
+            attached excitatory axons.
+        """
+        self.activeBuckets = {}
+        self.activeExpiry = {}
+        self.activeAxons = {}
+        for axon in self.inAxons:
+            if axon.E == 0 and axon.P >= self.rewardEpsilon:
+                self.markActive(axon)
+
+    #########################################################
+    ## resetConductances:
+    def resetConductances(self):
+        """resetConductances function:
+
+            Recomputes the running totals used in aggregate mode from
+            the current conductances of the attached axons. It must be
+            called whenever the conductances of the axons are modified
+            from outside (e.g. set to zero between trials).
+        """
+        self.conductances = {}
+        self.arrivals = {}
+        for axon in self.inAxons:
+            key = (axon.E, axon.tau)
+            self.conductances[key] = self.conductances.get(key, 0) + axon.g
+
     #########################################################
     ## updateM:
     def updateM(self):
@@ -157,7 +338,7 @@ class Dendrite:
         if self.spike:
             self.M = self.M - self.A_minus
         else:
-            self.M = euler(exponentialDecay, self.M, [self.tauMinus,0])
+            self.M = self.clock.decay(self.M, self.tauMinus)
 
 ###############################################################################
 ##
@@ -185,7 +366,9 @@ class Axon:
 
         Spikes occur depending with the probability p_spike. However
         when a spike_map is provided it will be used to determine if a
-        spike occurs in the given time step.
+        spike occurs in the given time step. The spike map is stored
+        sorted and read through a cursor, so that checking it costs
+        O(1) amortized per step.
 
     Variables:
       ==> self: object of the class Axon.
@@ -201,11 +384,15 @@ class Axon:
       ==> P: potential reward that 'self' might get spiking at the proper time.
       ==> A_plus: increase of 'P' each time 'self' fires.
       ==> tau_plus: eigentime of the decay of the reward.
+      ==> spike_map: None or sorted list of the integer time steps at which 'self' spikes.
+      ==> cursor: position in 'spike_map' of the first step not before the last one checked.
+      ==> clock: object of the class Clock giving the time step of the simulation.
 
     Methods:
       ==> __init__: __init__ function for objects of class Axon.
       ==> updateStatus: updates all the variables enclosed in objects of class Axon using the corresponding methods.
       ==> updateG: updates the conductivity of the synapse.
+      ==> checkSpikeMap: tells whether the spike map has a spike at a given time step.
       ==> updateP: updates the potential reward the synapse might get if the firing of the presynaptic axon is synchronized to that of the postsynaptic dendrite.
       ==> getReward: gets the current reward for the synapse.
       ==> gegPenalization: gets the current penalization for the synapse.
@@ -214,7 +401,7 @@ class Axon:
     #########################################################
     ## __init__:
     def __init__(self, p_spike=0, E=0, spike_map=None, g_boost=0.015, g_max=0.015, g_min=0, tau=5, A_plus=0.005,
-                 tauPlus=20, outDendrite=None):
+                 tauPlus=20, outDendrite=None, clock=defaultClock):
         """__init__ function of the Axon class:
 
            Sets many initial values for the axon, which determine its
@@ -222,11 +409,19 @@ class Axon:
 
            Arguments:
            ==> E: resting potential for this axon. Together with 'g_boost' determines whether the axon is excitatory or inhibitory.
-           ==> spike_map: an array of integers indicating at what timesteps the axon spikes
+           ==> spike_map: an array of integers indicating at what timesteps the axon spikes. Entries are rounded to the nearest step.
+               Sorted integer numpy arrays are not copied.
            ==> g_boost: boost to the connectivity 'g' when an action potential arrives the axon.
+           ==> clock: object of the class Clock giving the time step. Replaced by the one of the dendrite 'self' gets attached to.
         """
         self.p_spike = p_spike
         self.spike_map = spike_map
+        if isinstance(spike_map, np.ndarray) and spike_map.dtype.kind in 'iu' and np.all(np.diff(spike_map) >= 0):
+            # Sorted integer steps (e.g. from SpikeFile.getTrain): used as is.
+            self.spike_map = spike_map
+        elif spike_map is not None:
+            self.spike_map = compileSpikeMap(spike_map)
+        self.cursor = 0
         self.E = E
         self.g = 0
         self.g_max = g_max
@@ -236,6 +431,7 @@ class Axon:
         self.A_plus = A_plus
         self.tauPlus = tauPlus
         self.outDendrite = outDendrite
+        self.clock = clock
 
         # Some aditional parameters of objects of class Axon which are
         # not explicitly given but set here:
@@ -270,19 +466,40 @@ class Axon:
         exponentially otherwise.
         """
         self.spike = False
-        if self.spike_map != None:
-            if t in self.spike_map:
-                self.spike = True
+        if self.spike_map is not None:
+            self.spike = self.checkSpikeMap(t)
         else:
             if rand.random() < self.p_spike:
                 self.spike = True
 
         if self.spike:
             self.g = self.g + self.g_boost
+            if self.outDendrite is not None and self.outDendrite.aggregate:
+                self.outDendrite.addConductance(self.E, self.tau, self.g_boost)
             if self.E == 0:
                 self.getPenalization()
 
-        self.g = euler(exponentialDecay, self.g, [self.tau,0])
+        self.g = self.clock.decay(self.g, self.tau)
+
+    #########################################################
+    ## checkSpikeMap:
+    def checkSpikeMap(self, t):
+        """checkSpikeMap function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        Returns True if 't' is in the spike map. The cursor moves
+        forward one entry at a time as the simulation advances, and
+        is moved back by bisection if an earlier step is asked for
+        (e.g. when a trial is repeated).
+        """
+        spike_map = self.spike_map
+        if self.cursor > 0 and spike_map[self.cursor-1] >= t:
+            self.cursor = bisect.bisect_left(spike_map, t)
+        while self.cursor < len(spike_map) and spike_map[self.cursor] < t:
+            self.cursor = self.cursor + 1
+        return self.cursor < len(spike_map) and spike_map[self.cursor] == t
 
     #########################################################
     ## updateP:
@@ -298,8 +515,10 @@ class Axon:
         """
         if self.spike:
             self.P = self.P + self.A_plus
+            if self.E == 0 and self.outDendrite is not None and self.outDendrite.rewardEpsilon is not None:
+                self.outDendrite.markActive(self)
         else:
-            self.P = euler(exponentialDecay, self.P, [self.tauPlus,0])
+            self.P = self.clock.decay(self.P, self.tauPlus)
 
     #########################################################
     ## getReward:
@@ -326,3 +545,161 @@ class Axon:
         self.g_boost = self.g_boost + self.outDendrite.M*self.g_max
         if self.g_boost < self.g_min:
             self.g_boost = self.g_min
+
+###############################################################################
+##
+##                 PooledAxons class.
+##
+class PooledAxons:
+    """Pool of non-plastic presynaptic axons:
+
+        Axons which are never rewarded nor penalized (e.g. the
+        inhibitory ones, E=-70) and share p_spike, E, g_boost and tau
+        only matter to the dendrite through the sum of their
+        conductances. Objects of this class keep that sum as a single
+        conductance 'g': at each step the number of spiking axons is
+        drawn from a binomial distribution B(n, p_spike), 'g'
+        increases by g_boost for each of them and then decays like
+        the conductance of an Axon. The result has the same
+        distribution as 'n' separate objects of the class Axon, but
+        costs the same whatever 'n'.
+
+        Objects of this class can be attached both to a Dendrite and
+        to a PopulationDendrite as a single input. Since they have no
+        spike trains, the event-driven (EventSimulation) and fused
+        (FusedSimulation) engines do not support them and refuse
+        dendrites they are attached to.
+
+    Variables:
+      ==> n: number of pooled axons.
+      ==> outDendrite: object of the class Dendrite to which 'self' is attached.
+      ==> g: total conductivity of the pooled synapses.
+      ==> spikes: number of pooled axons which spiked in the current time step.
+      ==> spike: boolean: True ==> some pooled axon spiked.
+      ==> p_spike, E, g_boost, tau: parameters of each pooled axon (see the class Axon).
+      ==> P: always 0, since pooled axons are not rewarded.
+      ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+      ==> clock: object of the class Clock giving the time step of the simulation.
+      ==> classKeys, classIndex, excitatory, activeBuckets, activeCount: same as for the class AxonPopulation, for a single class of non-plastic synapses.
+
+    Methods:
+      ==> __init__: __init__ function for objects of class PooledAxons.
+      ==> updateStatus: updates the conductivity of the pool.
+      ==> updateG: draws the number of spikes and updates the conductivity.
+      ==> updateP: does nothing (pooled axons are not plastic).
+      ==> getReward: does nothing (pooled axons are not plastic).
+      ==> getPenalization: does nothing (pooled axons are not plastic).
+      ==> getActive: returns no synapse (pooled axons are not plastic).
+      ==> getCurrent: g*(E-V).
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, n, p_spike=0, E=-70, g_boost=0.015, tau=5, outDendrite=None, rng=rand, clock=defaultClock):
+        """__init__ function of the PooledAxons class:
+
+           Arguments:
+           ==> n: number of pooled axons.
+           ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+           ==> The rest of arguments are those of the class Axon.
+        """
+        self.n = n
+        self.p_spike = p_spike
+        self.E = E
+        self.g_boost = g_boost
+        self.tau = tau
+        self.outDendrite = outDendrite
+        self.rng = rng
+        self.clock = clock
+
+        # Some aditional variables which are not explicitly given but
+        # set here:
+        self.g = 0
+        self.P = 0
+        self.spikes = 0
+        self.spike = False
+        self.classKeys = [(float(E), float(tau))]
+        self.classIndex = np.zeros(1, dtype=int)
+        self.excitatory = np.zeros(1, dtype=bool)
+        self.activeBuckets = []
+        self.activeCount = 0
+
+    #########################################################
+    ## updateStatus:
+    def updateStatus(self, t):
+        """updateStatus function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        This function updates the conductivity of the pool.
+        """
+        self.updateG(t)
+
+    #########################################################
+    ## updateG:
+    def updateG(self, t):
+        """UpdateG function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        Draws the number of pooled axons receiving an action potential
+        in this time step, increases 'g' by 'g_boost' for each of them
+        and lets 'g' decay exponentially.
+        """
+        self.spikes = self.rng.binomial(self.n, self.p_spike)
+        self.spike = self.spikes > 0
+        if self.spike:
+            boost = self.spikes*self.g_boost
+            self.g = self.g + boost
+            if self.outDendrite is not None and self.outDendrite.aggregate:
+                self.outDendrite.addConductance(self.E, self.tau, boost)
+
+        self.g = self.clock.decay(self.g, self.tau)
+
+    #########################################################
+    ## updateP:
+    def updateP(self):
+        """updateP function:
+
+          Pooled axons are not plastic: 'P' stays 0.
+        """
+        pass
+
+    #########################################################
+    ## getReward:
+    def getReward(self, index=None):
+        """getReward function:
+
+          Pooled axons are not plastic: nothing to be done.
+        """
+        pass
+
+    #########################################################
+    ## getPenalization:
+    def getPenalization(self, index=None):
+        """getPenalization function:
+
+          Pooled axons are not plastic: nothing to be done.
+        """
+        pass
+
+    #########################################################
+    ## getActive:
+    def getActive(self):
+        """getActive function:
+
+          Pooled axons are never rewarded: returns no synapse.
+        """
+        return np.zeros(0, dtype=int)
+
+    #########################################################
+    ## getCurrent:
+    def getCurrent(self, V):
+        """getCurrent function:
+
+          Returns g*(E-V), the contribution of 'self' to the resting
+          value of the postsynaptic dendrite at voltage 'V'.
+        """
+        return self.g*(self.E - V)
@@ -0,0 +1,396 @@
+"""Multi-process simulation of networks:
+
+The dendrites of an object of the class Network only interact through
+their common sources, whose spikes and potential rewards P do not
+depend on the dendrites. The class ParallelNetwork of this module
+splits the dendrites into contiguous slices with about the same
+number of incoming synapses, and gives each slice, with its synapses,
+to a worker process. Each worker simulates its slice with a Network of
+its own; the main process draws the spikes of the sources and writes
+them, one block of steps at a time, to a shared buffer.
+
+All the arrays the processes share live in multiprocessing.shared_memory
+blocks: the g_boost of each synapse (ordered by worker, so that the
+synapses of each worker are contiguous), the variables of the
+dendrites and the spike buffers. Workers attach to them by name, so
+that neither the network nor its synapses are ever pickled. Two spike
+buffers are used in turns, so that the main process draws the spikes
+of the next block while the workers simulate the current one. Within
+a block the workers do not wait for each other, which gives a speedup
+close to the number of cores for large networks.
+
+Results are the same as those of Network.updateStatus, step by step:
+
+    simulation = ParallelNetwork(network, processes=4)
+    counts = simulation.run(10000)
+    simulation.close()
+"""
+
+import os
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from network import *
+
+################################################################################
+##
+##                 createShared function.
+##
+def createShared(shape, dtype, value=None):
+    """createShared function:
+
+    Returns (block, array, spec): a new shared memory block, the numpy
+    array of shape 'shape' and type 'dtype' over it (filled with
+    'value' if given) and the spec with which other processes attach
+    to it (see attachShared).
+    """
+    dtype = np.dtype(dtype)
+    size = max(1, int(np.prod(shape))*dtype.itemsize)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    if value is not None:
+        array[...] = value
+    return block, array, (block.name, tuple(shape), dtype.str)
+
+################################################################################
+##
+##                 attachShared function.
+##
+def attachShared(spec):
+    """attachShared function:
+
+    Returns (block, array): the shared memory block of 'spec' (as
+    returned by createShared) and the numpy array over it.
+    """
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+################################################################################
+##
+##                 partitionDendrites function.
+##
+def partitionDendrites(postptr, parts):
+    """partitionDendrites function:
+
+    Returns the array of 'parts' + 1 bounds of contiguous slices of
+    dendrites with about the same number of incoming synapses.
+    'postptr' gives the synapses of each dendrite, as in the class
+    Network.
+    """
+    nPost = len(postptr) - 1
+    targets = np.linspace(0, postptr[-1], parts + 1)
+    bounds = np.searchsorted(postptr, targets).clip(0, nPost)
+    bounds[0] = 0
+    bounds[-1] = nPost
+    return np.maximum.accumulate(bounds)
+
+###############################################################################
+##
+##                 BufferSource class.
+##
+class BufferSource:
+    """Source of spikes read from a shared spike buffer:
+
+    Gives to the Network of a worker the spikes drawn by the main
+    process.
+
+    Variables:
+    ==> buffers: list with the (blockSize x nPre) boolean spike buffers.
+    ==> buffer: buffer of the current block.
+    ==> start: first step of the current block.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class BufferSource.
+    ==> setBlock: sets the buffer and first step of the current block.
+    ==> getSpikes: indices of the sources spiking at a given step.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, buffers):
+        """__init__ function for the class BufferSource:
+
+        Arguments:
+        ==> buffers: list with the shared spike buffers.
+        """
+        self.buffers = buffers
+        self.buffer = buffers[0]
+        self.start = 0
+
+    #########################################################
+    ## setBlock:
+    def setBlock(self, which, start):
+        """setBlock function:
+
+        Arguments:
+        ==> which: position in 'buffers' of the buffer of the block.
+        ==> start: first step of the block.
+        """
+        self.buffer = self.buffers[which]
+        self.start = start
+
+    #########################################################
+    ## getSpikes:
+    def getSpikes(self, t):
+        """getSpikes function:
+
+        Returns the array of indices of the sources spiking at step
+        't'.
+        """
+        return np.flatnonzero(self.buffer[t - self.start])
+
+################################################################################
+##
+##                 simulateSlice function.
+##
+def simulateSlice(arrays, parameters, bounds, barrier):
+    """simulateSlice function:
+
+    Builds the Network of the dendrites bounds[0]:bounds[1] and their
+    synapses over the shared 'arrays', and simulates one block of
+    steps each time the main process crosses 'barrier', until it asks
+    it to stop. 'parameters' holds the arrays of parameters of the
+    sources and dendrites.
+    """
+    lo, hi = bounds
+    nPre = len(parameters['E'])
+    synapses = slice(parameters['synptr'][0], parameters['synptr'][1])
+    indptr = np.zeros(nPre + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(arrays['pre'][synapses], minlength=nPre))
+    kwargs = dict((key, parameters[key]) for key in ('E', 'tau', 'A_plus', 'tauPlus', 'g_max', 'g_min'))
+    for key in ('V_rest', 'tau_post', 'V_thr', 'V_peak', 'V_reset', 'A_minus', 'tauMinus'):
+        kwargs[key] = parameters[key][lo:hi]
+    network = Network(indptr, arrays['post'][synapses] - lo, hi - lo, clock=Clock(parameters['DeltaT']), **kwargs)
+    network.g_boost = arrays['g_boost'][synapses]
+    network.P = arrays['P'].copy()
+    network.V = arrays['V'][lo:hi].copy()
+    network.M = arrays['M'][lo:hi].copy()
+    network.spike_post = arrays['spike_post'][lo:hi].copy()
+    network.resting_value = arrays['resting_value'][lo:hi].copy()
+    network.G = arrays['G'][:, lo:hi].copy()
+    source = BufferSource([arrays['spikes0'], arrays['spikes1']])
+    network.sources = [source]
+    command = arrays['command']
+    counts = arrays['counts'][lo:hi]
+
+    while True:
+        barrier.wait()
+        start, steps, which, stop = command
+        if stop:
+            return
+        source.setBlock(which, start)
+        for t in range(start, start + steps):
+            network.updateStatus(t)
+            counts += network.spike_post
+        arrays['V'][lo:hi] = network.V
+        arrays['M'][lo:hi] = network.M
+        arrays['spike_post'][lo:hi] = network.spike_post
+        arrays['resting_value'][lo:hi] = network.resting_value
+        arrays['G'][:, lo:hi] = network.G
+        barrier.wait()
+
+################################################################################
+##
+##                 runWorker function.
+##
+def runWorker(specs, parameters, bounds, barrier):
+    """runWorker function:
+
+    Main function of a worker process: attaches to the shared arrays
+    of 'specs' and runs simulateSlice. If it fails, the barrier is
+    broken so that the main process does not wait forever.
+    """
+    blocks = []
+    arrays = {}
+    for name in specs:
+        block, arrays[name] = attachShared(specs[name])
+        blocks.append(block)
+    try:
+        simulateSlice(arrays, parameters, bounds, barrier)
+    except BaseException:
+        barrier.abort()
+        raise
+    arrays.clear()
+    for block in blocks:
+        block.close()
+
+###############################################################################
+##
+##                 ParallelNetwork class.
+##
+class ParallelNetwork:
+    """Simulation of a Network over several processes:
+
+    Variables:
+    ==> network: object of the class Network which is simulated. Its state is updated at the end of each run.
+    ==> processes: number of worker processes.
+    ==> blockSize: number of steps of the blocks of spikes handed to the workers.
+    ==> t: next step to be simulated.
+    ==> bounds: bounds of the slices of dendrites of the workers.
+    ==> order: position in network.g_boost of each synapse of the shared g_boost array.
+    ==> arrays: dictionary with the shared arrays.
+    ==> blocks: list with the shared memory blocks.
+    ==> workers: list with the worker processes.
+    ==> barrier: barrier the main process and the workers cross at the beginning and end of each block.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class ParallelNetwork.
+    ==> drawSpikes: draws the spikes of the sources for a block.
+    ==> run: simulates a number of steps.
+    ==> gather: copies the state of the shared arrays to the network.
+    ==> close: stops the workers and frees the shared memory.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, network, processes=None, blockSize=100, start=0):
+        """__init__ function for the class ParallelNetwork:
+
+        Arguments:
+        ==> network: object of the class Network.
+        ==> processes: number of worker processes (the number of cores if None).
+        ==> blockSize: number of steps of the blocks of spikes handed to the workers.
+        ==> start: first step to be simulated.
+
+        Changes made to the state of 'network' once the workers are
+        started are not seen by them.
+        """
+        self.network = network
+        self.processes = processes or os.cpu_count() or 1
+        self.blockSize = blockSize
+        self.t = start
+        self.bounds = partitionDendrites(network.postptr, self.processes)
+        network.updateDecayFactors()
+
+        # Synapses of each worker, contiguous and in the order of network.g_boost:
+        parts = [np.sort(network.postOrder[network.postptr[lo]:network.postptr[hi]])
+                 for lo, hi in zip(self.bounds[:-1], self.bounds[1:])]
+        self.order = np.concatenate(parts)
+        synptr = np.zeros(self.processes + 1, dtype=np.int64)
+        synptr[1:] = np.cumsum([len(part) for part in parts])
+
+        nPre = network.nPre
+        nPost = network.nPost
+        shared = [('g_boost', (network.nSynapses,), float, network.g_boost[self.order]),
+                  ('pre', (network.nSynapses,), np.int64, network.pre[self.order]),
+                  ('post', (network.nSynapses,), np.int64, network.indices[self.order]),
+                  ('P', (nPre,), float, network.P),
+                  ('V', (nPost,), float, network.V),
+                  ('M', (nPost,), float, network.M),
+                  ('spike_post', (nPost,), bool, network.spike_post),
+                  ('resting_value', (nPost,), float, network.resting_value),
+                  ('G', network.G.shape, float, network.G),
+                  ('counts', (nPost,), np.int64, 0),
+                  ('spikes0', (blockSize, nPre), bool, False),
+                  ('spikes1', (blockSize, nPre), bool, False),
+                  ('command', (4,), np.int64, 0)]
+        self.blocks = []
+        self.arrays = {}
+        specs = {}
+        for name, shape, dtype, value in shared:
+            block, self.arrays[name], specs[name] = createShared(shape, dtype, value)
+            self.blocks.append(block)
+
+        parameters = {'DeltaT': network.clock.DeltaT}
+        for key in ('E', 'tau', 'A_plus', 'tauPlus', 'g_max', 'g_min', 'V_rest', 'tau_post', 'V_thr',
+                    'V_peak', 'V_reset', 'A_minus', 'tauMinus'):
+            parameters[key] = getattr(network, key)
+        self.barrier = multiprocessing.Barrier(self.processes + 1)
+        self.workers = []
+        for ii in range(self.processes):
+            parameters['synptr'] = synptr[ii:ii+2]
+            worker = multiprocessing.Process(target=runWorker, args=(specs, dict(parameters),
+                                                                     self.bounds[ii:ii+2], self.barrier))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    #########################################################
+    ## drawSpikes:
+    def drawSpikes(self, which, start, steps):
+        """drawSpikes function:
+
+        Arguments:
+        ==> which: spike buffer (0 or 1) to be filled.
+        ==> start: first step of the block.
+        ==> steps: number of steps of the block.
+
+        Draws the spikes of the sources at steps start:start+steps
+        into a spike buffer, and updates the spikes and potential
+        rewards of the sources of the network.
+        """
+        network = self.network
+        buffer = self.arrays['spikes%d' % which]
+        for s in range(steps):
+            firing = network.getSpikes(start + s)
+            buffer[s] = False
+            buffer[s, firing] = True
+            network.spike[:] = buffer[s]
+            network.updateP()
+
+    #########################################################
+    ## run:
+    def run(self, steps):
+        """run function:
+
+        Simulates 'steps' steps and returns the array with the number
+        of spikes of each dendrite during them. At the end, the state
+        of the network is up to date.
+        """
+        counts = self.arrays['counts']
+        command = self.arrays['command']
+        counts[:] = 0
+        end = self.t + steps
+        size = min(self.blockSize, end - self.t)
+        which = 0
+        if size > 0:
+            self.drawSpikes(which, self.t, size)
+        while self.t < end:
+            command[:] = (self.t, size, which, 0)
+            self.barrier.wait()
+            # Next block, while the workers simulate this one:
+            self.t = self.t + size
+            size = min(self.blockSize, end - self.t)
+            which = 1 - which
+            if size > 0:
+                self.drawSpikes(which, self.t, size)
+            self.barrier.wait()
+        self.gather()
+        return counts.copy()
+
+    #########################################################
+    ## gather:
+    def gather(self):
+        """gather function:
+
+        Copies the state of the dendrites and synapses from the
+        shared arrays to the network.
+        """
+        network = self.network
+        network.g_boost[self.order] = self.arrays['g_boost']
+        for name in ('V', 'M', 'spike_post', 'resting_value', 'G'):
+            setattr(network, name, self.arrays[name].copy())
+
+    #########################################################
+    ## close:
+    def close(self):
+        """close function:
+
+        Stops the workers and frees the shared memory.
+        """
+        if self.workers:
+            self.arrays['command'][3] = 1
+            try:
+                self.barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+            for worker in self.workers:
+                worker.join()
+            self.workers = []
+        self.arrays = {}
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
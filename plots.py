@@ -0,0 +1,58 @@
+"""Plots of the curves of the analysis module:
+
+pylab is only imported when a figure is drawn, so that headless runs
+never pay for it.
+"""
+
+################################################################################
+##
+##                 plotLatencyCurve function.
+##
+def plotLatencyCurve(r, v):
+    """plotLatencyCurve function:
+
+    Plots g_peak/g_max over the latencies of the synapses, as
+    returned by analysis.latencyCurve.
+    """
+    import pylab as plt
+    plt.figure()
+    plt.xlabel('Relative latency [ms]')
+    plt.ylabel('g_peak/g_max')
+    plt.plot(r, v, '.')
+
+################################################################################
+##
+##                 plotWeightHistogram function.
+##
+def plotWeightHistogram(counts, edges, title=None):
+    """plotWeightHistogram function:
+
+    Plots a histogram of g_boost/g_max, as returned by
+    analysis.weightHistogram.
+    """
+    import pylab as plt
+    plt.figure()
+    if title is not None:
+        plt.title(title)
+    plt.xlabel('g/g_max')
+    plt.ylabel('Number of connections')
+    plt.bar(edges[:-1], counts, width=edges[1:] - edges[:-1], align='edge')
+
+################################################################################
+##
+##                 plotFiringCurve function.
+##
+def plotFiringCurve(rates, mean, std=None):
+    """plotFiringCurve function:
+
+    Plots the output firing rate over the input rate, as returned by
+    analysis.firingCurve.
+    """
+    import pylab as plt
+    plt.figure()
+    plt.xlabel('Input rate')
+    plt.ylabel('Firing rate')
+    if std is None:
+        plt.plot(rates, mean, '*-')
+    else:
+        plt.errorbar(rates, mean, yerr=std, fmt='*-')
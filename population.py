@@ -0,0 +1,519 @@
+"""Vectorized version of the neuron model:
+
+The classes in this module follow the same update rules as the
+classes 'Axon' and 'Dendrite' of the neuron module. However, instead
+of one object per synapse, a whole population of presynaptic axons
+is stored in contiguous numpy arrays, so that each time step costs a
+few array operations instead of one method call per synapse.
+"""
+
+import numpy as np
+import numpy.random as rand
+from neuron import *
+from spikes import *
+
+################################################################################
+##
+##                 toArray function.
+##
+def toArray(value, n, dtype=float):
+    """toArray function:
+
+    Returns a new numpy array of length 'n' filled with 'value'.
+
+        Arguments:
+            ==> value: either a scalar, shared by the whole population, or a sequence with one entry per synapse.
+            ==> n: number of synapses of the population.
+            ==> dtype: type of the entries of the returned array.
+    """
+    array = np.empty(n, dtype=dtype)
+    array[:] = value
+    return array
+
+################################################################################
+##
+##                 toParameter function.
+##
+def toParameter(value, n, dtype=float, shared=True):
+    """toParameter function:
+
+    Same as 'toArray', except that, if 'shared' is True and 'value' is
+    a scalar, it is stored once as a 0-d numpy array instead of once
+    per synapse. Numpy broadcasts such arrays against the arrays of
+    the population; use 'select' to index them.
+    """
+    if shared and np.ndim(value) == 0:
+        return np.array(value, dtype=dtype)
+    return toArray(value, n, dtype)
+
+################################################################################
+##
+##                 select function.
+##
+def select(parameter, index):
+    """select function:
+
+    Returns parameter[index], or 'parameter' itself if it is shared by
+    the whole population (a 0-d array, see toParameter).
+    """
+    if parameter.ndim == 0:
+        return parameter
+    return parameter[index]
+
+################################################################################
+##
+##                 decayArray function.
+##
+def decayArray(tau, DeltaT):
+    """decayArray function:
+
+    Returns an array with the decay factor exp(-DeltaT/tau) of each
+    entry of the array 'tau'. Since populations have few different
+    eigentimes, factors are taken from the cache of 'decayFactor'. A
+    0-d 'tau' (see toParameter) gives a 0-d array.
+    """
+    if np.ndim(tau) == 0:
+        return np.array(decayFactor(float(tau), DeltaT))
+    taus, index = np.unique(tau, return_inverse=True)
+    factors = np.array([decayFactor(float(t), DeltaT) for t in taus])
+    return factors[index.ravel()]
+
+###############################################################################
+##
+##                 PopulationDendrite class.
+##
+class PopulationDendrite(Dendrite):
+    """Dendrite attached to populations of axons:
+
+    Objects of this class behave as objects of the class Dendrite,
+    but their inputs are objects of the class AxonPopulation instead
+    of single objects of the class Axon. All the parameters and
+    variables are those of the class Dendrite.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class PopulationDendrite.
+    ==> rewardAxons: rewards the excitatory synapses of every population attached to 'self' after a spike.
+    ==> updateResting_value: updates the value to which the voltage tends at each time.
+    ==> resetConductances: recomputes the total conductances from the attached populations (aggregate mode).
+    ==> resetActiveAxons: rebuilds the active synapses of the attached populations.
+    """
+
+    #########################################################
+    ##
+    ## __init__:
+    def __init__(self, arrayPopulations, V_rest=-70, tau=20, V_thr=-54, V_peak=0, V_reset=-60,
+                 A_minus=0.00525, tauMinus=20, aggregate=False, rewardEpsilon=None, clock=defaultClock):
+        """__init__ function for the class PopulationDendrite:
+
+        Arguments:
+        ==> arrayPopulations: array of objects of the class AxonPopulation attached to 'self'.
+        ==> The rest of arguments are those of the class Dendrite.
+        """
+        Dendrite.__init__(self, arrayPopulations, V_rest=V_rest, tau=tau, V_thr=V_thr, V_peak=V_peak,
+                          V_reset=V_reset, A_minus=A_minus, tauMinus=tauMinus, aggregate=aggregate,
+                          rewardEpsilon=rewardEpsilon, clock=clock)
+
+    #########################################################
+    ## rewardAxons:
+    def rewardAxons(self):
+        """rewardAxons function:
+
+            This function rewards the excitatory synapses of each
+            population attached to 'self'.
+        """
+        for population in self.inAxons:
+            population.getReward()
+
+    #########################################################
+    ## updateResting_value:
+    def updateResting_value(self):
+        """updateResting_value function:
+
+            Same as 'Dendrite.updateResting_value', but the sum over
+            the synapses of each population is a dot product. In
+            aggregate mode the running totals of 'Dendrite' are used.
+        """
+        if self.aggregate:
+            Dendrite.updateResting_value(self)
+            return
+
+        sum = 0
+        for population in self.inAxons:
+            sum = sum + population.getCurrent(self.V)
+
+        self.resting_value = self.V_rest + sum
+
+    #########################################################
+    ## resetConductances:
+    def resetConductances(self):
+        """resetConductances function:
+
+            Same as 'Dendrite.resetConductances', summing up the
+            conductances of each class of synapses of each population.
+        """
+        self.conductances = {}
+        self.arrivals = {}
+        for population in self.inAxons:
+            sums = np.bincount(population.classIndex, weights=np.atleast_1d(population.g),
+                               minlength=len(population.classKeys))
+            for key, g in zip(population.classKeys, sums):
+                self.conductances[key] = self.conductances.get(key, 0) + g
+
+    #########################################################
+    ## resetActiveAxons:
+    def resetActiveAxons(self):
+        """resetActiveAxons function:
+
+            Same as 'Dendrite.resetActiveAxons' for each population
+            attached to 'self'.
+        """
+        for population in self.inAxons:
+            population.activeBuckets = [np.flatnonzero(population.excitatory)]
+            population.activeCount = population.activeBuckets[0].size
+            population.getActive()
+
+###############################################################################
+##
+##                 AxonPopulation class.
+##
+class AxonPopulation:
+    """Population of presynaptic axons:
+
+        Objects of the class AxonPopulation store the variables and
+        parameters of 'n' objects of the class Axon as numpy arrays
+        (struct of arrays). Every method updates the whole population
+        at once after the same rules as the method of the same name
+        of the class Axon.
+
+        Parameters might be given either as a scalar, shared by the
+        whole population, or as a sequence with one entry per
+        synapse. Excitatory synapses (E=0) are rewarded and penalized;
+        the others are not.
+
+        In compact mode (compact=True), meant for populations of
+        millions of synapses, 'g', 'P' and 'g_boost' are stored as
+        float32 and the parameters given as a scalar are stored once
+        (as 0-d arrays, see toParameter): the arrays of the
+        population take 16 bytes per synapse instead of about 107
+        (the PoissonSource generating the spikes adds some 24 bytes
+        per synapse, plus its current block, in both modes). Sums
+        over the synapses are still accumulated in float64. The fused
+        kernel (see kernel.FusedSimulation) also keeps the shared
+        parameters once, as long as all of them are shared.
+
+        Each float32 update has a relative rounding error of about
+        6e-8. Against a float64 run with the same spikes (task-5
+        configuration, 1200 synapses), the voltage stays within
+        2e-4 mV while both runs see the same postsynaptic spikes, but
+        after a few seconds of simulated time some threshold crossing
+        moves by one step and, from then on, the runs are only
+        statistically equivalent: after 10 s, firing rates differ by
+        0.3% and the mean g_boost/g_max by 0.1%, with the same
+        histogram of weights.
+
+    Variables:
+      ==> self: object of the class AxonPopulation.
+      ==> n: number of synapses of the population.
+      ==> outDendrite: object of the class PopulationDendrite to which 'self' is attached.
+      ==> g, spike, p_spike, E, g_boost, g_max, g_min, tau, P, A_plus, tauPlus: arrays with the variables of the same name of the class Axon.
+      ==> spike_map: None, a list with the spike map (or None) of each synapse, or an object of the class SpikeRaster.
+      ==> raster: None or object of the class SpikeRaster compiled from 'spike_map'.
+      ==> poisson: boolean array: True ==> the synapse spikes with probability 'p_spike' (it has no spike map).
+      ==> source: None or object of the class PoissonSource generating the spikes of the synapses in 'poisson'.
+      ==> sources: list with 'raster' and 'source', if they are not None.
+      ==> excitatory: boolean array: True ==> excitatory synapse (E=0).
+      ==> classKeys: list with the different (E, tau) pairs of the population.
+      ==> classIndex: array with the position in 'classKeys' of the (E, tau) pair of each synapse.
+      ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+      ==> clock: object of the class Clock giving the time step of the simulation.
+      ==> decayG, decayP: arrays with the decay factors of 'g' and 'P' for the time step 'DeltaT' of the clock.
+      ==> activeBuckets: list with the arrays of indices of the excitatory synapses which spiked since the last reward. Only used when the dendrite has a 'rewardEpsilon'.
+      ==> activeCount: total length of the arrays in 'activeBuckets'.
+      ==> compact: True ==> compact mode (see above).
+      ==> dtype: type of 'g', 'P', 'g_boost' and the parameters (float32 in compact mode, float64 otherwise).
+
+    Methods:
+      ==> __init__: __init__ function for objects of class AxonPopulation.
+      ==> fromAxons: builds a population out of a list of objects of class Axon.
+      ==> storeAxons: copies the state of the population back into a list of objects of class Axon.
+      ==> updateStatus: updates all the variables of the population.
+      ==> updateDecayFactors: recomputes 'decayG' and 'decayP' if the time step of the clock changed.
+      ==> getSpikes: decides which synapses receive an action potential.
+      ==> updateG: updates the conductivity of the synapses.
+      ==> updateP: updates the potential reward of the synapses.
+      ==> getActive: indices of the excitatory synapses whose 'P' is at least the 'rewardEpsilon' of the dendrite.
+      ==> getReward: rewards the excitatory synapses.
+      ==> getPenalization: penalizes the given synapses.
+      ==> getCurrent: sum of g*(E-V) over the population.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, n, p_spike=0, E=0, spike_map=None, g_boost=0.015, g_max=0.015, g_min=0, tau=5,
+                 A_plus=0.005, tauPlus=20, outDendrite=None, rng=rand, clock=defaultClock, compact=False):
+        """__init__ function of the AxonPopulation class:
+
+           Arguments:
+           ==> n: number of synapses of the population.
+           ==> spike_map: None, a list with the spike map (or None) of each synapse, or an object of the class SpikeRaster (e.g. from SpikeFile.getRaster).
+           ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+           ==> compact: if True, float32 state and shared parameters stored once (see above).
+           ==> The rest of arguments are those of the class Axon.
+        """
+        self.n = n
+        self.compact = compact
+        self.dtype = np.float32 if compact else np.float64
+        self.p_spike = toParameter(p_spike, n, self.dtype, compact)
+        self.spike_map = spike_map
+        self.E = toParameter(E, n, self.dtype, compact)
+        self.g = np.zeros(n, dtype=self.dtype)
+        self.g_max = toParameter(g_max, n, self.dtype, compact)
+        self.g_min = toParameter(g_min, n, self.dtype, compact)
+        self.g_boost = toArray(g_boost, n, self.dtype)
+        self.tau = toParameter(tau, n, self.dtype, compact)
+        self.A_plus = toParameter(A_plus, n, self.dtype, compact)
+        self.tauPlus = toParameter(tauPlus, n, self.dtype, compact)
+        self.outDendrite = outDendrite
+        self.rng = rng
+        self.clock = clock
+
+        # Some aditional variables which are not explicitly given but
+        # set here:
+        self.raster = None
+        self.source = None
+        self.poisson = np.broadcast_to(self.p_spike > 0, (n,)).copy()
+        if isinstance(spike_map, SpikeRaster):
+            # Already compiled (e.g. from a spike file): every synapse follows it.
+            self.raster = spike_map
+            self.poisson[:] = False
+        elif spike_map is not None:
+            self.raster = SpikeRaster.fromSpikeMap(spike_map, n)
+            for ii in range(n):
+                if spike_map[ii] is not None:
+                    self.poisson[ii] = False
+        if self.poisson.any():
+            self.source = PoissonSource(np.where(self.poisson, self.p_spike, 0), rng=rng)
+        self.sources = [source for source in (self.raster, self.source) if source is not None]
+        self.excitatory = np.broadcast_to(self.E == 0, (n,)).copy()
+        keys, index = np.unique(np.column_stack((np.broadcast_to(self.E, (n,)), np.broadcast_to(self.tau, (n,)))),
+                                axis=0, return_inverse=True)
+        self.classKeys = [(float(E), float(tau)) for E, tau in keys]
+        self.classIndex = index.ravel()
+        if compact:
+            self.classIndex = self.classIndex.astype(np.min_scalar_type(len(keys)))
+        self.spike = np.zeros(n, dtype=bool)
+        self.P = np.zeros(n, dtype=self.dtype)
+        self.activeBuckets = []
+        self.activeCount = 0
+        self.DeltaT = None
+
+    #########################################################
+    ## fromAxons:
+    @staticmethod
+    def fromAxons(axons, rng=rand):
+        """fromAxons function:
+
+        Returns an object of the class AxonPopulation with the
+        parameters and the current state of the objects of the class
+        Axon in 'axons'.
+        """
+        spike_map = [axon.spike_map for axon in axons]
+        if all(m is None for m in spike_map):
+            spike_map = None
+        population = AxonPopulation(len(axons),
+                                    p_spike=[axon.p_spike for axon in axons],
+                                    E=[axon.E for axon in axons],
+                                    spike_map=spike_map,
+                                    g_boost=[axon.g_boost for axon in axons],
+                                    g_max=[axon.g_max for axon in axons],
+                                    g_min=[axon.g_min for axon in axons],
+                                    tau=[axon.tau for axon in axons],
+                                    A_plus=[axon.A_plus for axon in axons],
+                                    tauPlus=[axon.tauPlus for axon in axons],
+                                    rng=rng)
+        population.g[:] = [axon.g for axon in axons]
+        population.P[:] = [axon.P for axon in axons]
+        population.spike[:] = [axon.spike for axon in axons]
+        return population
+
+    #########################################################
+    ## storeAxons:
+    def storeAxons(self, axons):
+        """storeAxons function:
+
+        Copies the variables of 'self' back into the objects of the
+        class Axon in 'axons', which must be as many as synapses in
+        'self'.
+        """
+        for ii in range(self.n):
+            axons[ii].g = float(self.g[ii])
+            axons[ii].P = float(self.P[ii])
+            axons[ii].g_boost = float(self.g_boost[ii])
+            axons[ii].spike = bool(self.spike[ii])
+
+    #########################################################
+    ## updateStatus:
+    def updateStatus(self, t):
+        """updateStatus function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        This function updates the status of the whole population.
+        """
+        self.updateG(t)
+        self.updateP()
+
+    #########################################################
+    ## updateDecayFactors:
+    def updateDecayFactors(self):
+        """updateDecayFactors function:
+
+        Recomputes the decay factors of 'g' and 'P' whenever the time
+        step of the clock differs from the one they were computed for.
+        """
+        if self.DeltaT != self.clock.DeltaT:
+            self.DeltaT = self.clock.DeltaT
+            self.decayG = decayArray(self.tau, self.DeltaT).astype(self.dtype)
+            self.decayP = decayArray(self.tauPlus, self.DeltaT).astype(self.dtype)
+
+    #########################################################
+    ## getSpikes:
+    def getSpikes(self, t):
+        """getSpikes function:
+
+        Arguments:
+        ==> t: t the current time step
+
+        Returns a boolean array telling which synapses receive an
+        action potential at time step 't'. As for the class Axon,
+        synapses with a spike map follow it (looked up in 'raster')
+        and the rest spike with probability 'p_spike' (generated in
+        blocks by 'source').
+        """
+        spike = np.zeros(self.n, dtype=bool)
+        for source in self.sources:
+            spike[source.getSpikes(t)] = True
+        return spike
+
+    #########################################################
+    ## updateG:
+    def updateG(self, t, spike=None):
+        """UpdateG function:
+
+        Arguments:
+        ==> t: t the current time step
+        ==> spike: optional boolean array with the synapses which spike. If not given, 'getSpikes' decides.
+
+        Same as 'Axon.updateG' for the whole population: spiking
+        synapses increase 'g' by 'g_boost' (which is also reported to
+        the dendrite in aggregate mode) and excitatory ones get
+        penalized; then 'g' decays exponentially.
+        """
+        if spike is None:
+            spike = self.getSpikes(t)
+        self.spike = spike
+
+        self.g[spike] += self.g_boost[spike]
+        if self.outDendrite is not None and self.outDendrite.aggregate:
+            index = np.flatnonzero(spike)
+            sums = np.bincount(self.classIndex[index], weights=self.g_boost[index],
+                               minlength=len(self.classKeys))
+            for key, g in zip(self.classKeys, sums):
+                if g:
+                    self.outDendrite.addConductance(key[0], key[1], g)
+        penalized = spike & self.excitatory
+        if penalized.any():
+            self.getPenalization(penalized)
+
+        self.updateDecayFactors()
+        self.g *= self.decayG
+
+    #########################################################
+    ## updateP:
+    def updateP(self):
+        """updateP function:
+
+          Same as 'Axon.updateP' for the whole population. When the
+          dendrite has a 'rewardEpsilon', the excitatory synapses
+          which spiked are also added to 'activeBuckets'.
+        """
+        self.updateDecayFactors()
+        self.P = np.where(self.spike, self.P + self.A_plus, self.P*self.decayP)
+
+        if self.outDendrite is not None and self.outDendrite.rewardEpsilon is not None:
+            index = np.flatnonzero(self.spike & self.excitatory)
+            if index.size:
+                self.activeBuckets.append(index)
+                self.activeCount = self.activeCount + index.size
+                if self.activeCount > self.n:
+                    self.getActive()
+
+    #########################################################
+    ## getActive:
+    def getActive(self):
+        """getActive function:
+
+          Returns the indices of the excitatory synapses which spiked
+          since the last call and of those returned by it, keeping
+          only the ones whose 'P' is still at least the
+          'rewardEpsilon' of the dendrite. Since 'P' only decays
+          between spikes, the rest cannot become active again until
+          they spike.
+        """
+        index = np.unique(np.concatenate(self.activeBuckets)) if self.activeBuckets else np.zeros(0, dtype=int)
+        index = index[self.P[index] >= self.outDendrite.rewardEpsilon]
+        self.activeBuckets = [index]
+        self.activeCount = index.size
+        return index
+
+    #########################################################
+    ## getReward:
+    def getReward(self, index=None):
+        """getReward function:
+
+          Same as 'Axon.getReward' for the synapses selected by
+          'index' (a boolean mask or an array of indices). By default
+          all the excitatory synapses are rewarded or, if the dendrite
+          has a 'rewardEpsilon', only the active ones (see getActive).
+        """
+        if index is None:
+            if self.outDendrite is not None and self.outDendrite.rewardEpsilon is not None:
+                index = self.getActive()
+            else:
+                index = self.excitatory
+        g_max = select(self.g_max, index)
+        g_boost = self.g_boost[index] + self.P[index]*g_max
+        self.g_boost[index] = np.minimum(g_boost, g_max)
+
+    #########################################################
+    ## getPenalization:
+    def getPenalization(self, index=None):
+        """getPenalization function:
+
+          Same as 'Axon.getPenalization' for the synapses selected by
+          'index' (a boolean mask or an array of indices). By default
+          all the excitatory synapses are penalized.
+        """
+        if index is None:
+            index = self.excitatory
+        g_boost = self.g_boost[index] + self.outDendrite.M*select(self.g_max, index)
+        self.g_boost[index] = np.maximum(g_boost, select(self.g_min, index))
+
+    #########################################################
+    ## getCurrent:
+    def getCurrent(self, V):
+        """getCurrent function:
+
+          Returns the sum of g*(E-V) over the population, which is
+          the contribution of 'self' to the resting value of the
+          postsynaptic dendrite at voltage 'V'. In compact mode, the
+          conductances of each class of synapses are summed up in
+          float64 first.
+        """
+        if not self.compact:
+            return np.dot(self.g, self.E - V)
+        if len(self.classKeys) == 1:
+            return self.g.sum(dtype=np.float64)*(self.classKeys[0][0] - V)
+        sums = np.bincount(self.classIndex, weights=self.g, minlength=len(self.classKeys))
+        return sum(g*(key[0] - V) for g, key in zip(sums, self.classKeys))
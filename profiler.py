@@ -0,0 +1,228 @@
+"""Per-phase profiling of the neuron model:
+
+A Profiler measures the time spent in each phase of a step (updateG,
+updateP, updateResting_value, updateV, updateM, getReward and
+getPenalization) of a dendrite and its inputs, whatever their class,
+and counts presynaptic and postsynaptic spikes. It works by wrapping
+the methods of the objects it profiles while it is enabled and
+removing the wrappers when it is disabled, so that a disabled
+profiler costs nothing:
+
+    profiler = Profiler(dendrite)
+    profiler.enable()
+    ... run ...
+    profiler.disable()
+    print(profiler.report())
+
+Phases nested in others (getReward is called from updateV, and
+getPenalization from updateG) are counted both in their own total and
+in the total of the phase calling them; the 'self' time of a phase
+leaves the nested ones out.
+"""
+
+import time
+import numpy as np
+from neuron import PooledAxons
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+# Phases profiled by default:
+phases = ['updateG', 'updateP', 'updateResting_value', 'updateV', 'updateM', 'getReward', 'getPenalization']
+
+###############################################################################
+##
+##                 Profiler class.
+##
+class Profiler:
+    """Per-phase profiler:
+
+    Keeps, for each phase (method name), the number of calls, the
+    total time spent in it and its self time (without the profiled
+    phases it calls), summed over all the objects profiled.
+
+    Variables:
+    ==> targets: list of (object, list of method names) pairs to be profiled.
+    ==> calls: dictionary with the number of calls of each phase.
+    ==> total: dictionary with the total time of each phase, in seconds.
+    ==> own: dictionary with the self time of each phase, in seconds.
+    ==> preSpikes: number of presynaptic spikes seen by 'updateG'.
+    ==> postSpikes: number of postsynaptic spikes seen by 'updateV'.
+    ==> enabled: True while the methods of the targets are wrapped.
+    ==> elapsed: wall time during which the profiler was enabled.
+    ==> start: time at which the profiler was last enabled.
+    ==> stack: time spent in the nested phases of each phase being run.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class Profiler.
+    ==> add: adds the methods of an object to be profiled.
+    ==> reset: sets all the counters to zero.
+    ==> wrap: returns the profiled version of a method.
+    ==> enable: starts profiling.
+    ==> disable: stops profiling and removes the wrappers.
+    ==> summary: dictionary with the counters.
+    ==> report: printable table with the counters.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, dendrite=None, names=phases):
+        """__init__ function for the class Profiler:
+
+        Arguments:
+        ==> dendrite: None or a dendrite (of any class) whose phases, and those of its inputs, are profiled.
+        ==> names: list of the methods to be profiled.
+        """
+        self.targets = []
+        self.stack = []
+        self.calls = {}
+        self.total = {}
+        self.own = {}
+        self.enabled = False
+        self.start = None
+        self.reset()
+        if dendrite is not None:
+            self.add(dendrite, names)
+            for axon in dendrite.inAxons:
+                self.add(axon, names)
+
+    #########################################################
+    ## add:
+    def add(self, target, names):
+        """add function:
+
+        Adds the methods of 'target' in the list 'names' which exist
+        to the ones profiled, e.g. add(monitor, ['record']) to profile
+        the recording of a Monitor.
+        """
+        names = [name for name in names if hasattr(target, name)]
+        self.targets.append((target, names))
+        if self.enabled:
+            for name in names:
+                setattr(target, name, self.wrap(target, name))
+
+    #########################################################
+    ## reset:
+    def reset(self):
+        """reset function:
+
+        Sets all the counters to zero.
+        """
+        for name in self.calls:
+            self.calls[name] = 0
+            self.total[name] = 0.
+            self.own[name] = 0.
+        self.preSpikes = 0
+        self.postSpikes = 0
+        self.elapsed = 0.
+        if self.enabled:
+            self.start = timer()
+
+    #########################################################
+    ## wrap:
+    def wrap(self, target, name):
+        """wrap function:
+
+        Returns a function which calls the method 'name' of 'target'
+        and adds its time to the counters. After 'updateG' the spikes
+        of 'target' are counted as presynaptic (for pooled axons, the
+        number of pooled axons which spiked), and after 'updateV' as
+        postsynaptic.
+        """
+        method = getattr(target, name)
+        stack = self.stack
+        calls = self.calls
+        total = self.total
+        own = self.own
+        calls.setdefault(name, 0)
+        total.setdefault(name, 0.)
+        own.setdefault(name, 0.)
+
+        def profiled(*args, **kwargs):
+            stack.append(0.)
+            start = timer()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = timer() - start
+                nested = stack.pop()
+                calls[name] += 1
+                total[name] += elapsed
+                own[name] += elapsed - nested
+                if stack:
+                    stack[-1] += elapsed
+                if name == 'updateG' and isinstance(target, PooledAxons):
+                    self.preSpikes += int(target.spikes)
+                elif name == 'updateG':
+                    self.preSpikes += int(np.count_nonzero(target.spike))
+                elif name == 'updateV':
+                    self.postSpikes += int(np.count_nonzero(target.spike))
+        return profiled
+
+    #########################################################
+    ## enable:
+    def enable(self):
+        """enable function:
+
+        Wraps the methods of the targets so that they are profiled.
+        """
+        if self.enabled:
+            return
+        for target, names in self.targets:
+            for name in names:
+                setattr(target, name, self.wrap(target, name))
+        self.enabled = True
+        self.start = timer()
+
+    #########################################################
+    ## disable:
+    def disable(self):
+        """disable function:
+
+        Removes the wrappers, leaving the targets as they were. The
+        counters are kept.
+        """
+        if not self.enabled:
+            return
+        for target, names in self.targets:
+            for name in names:
+                delattr(target, name)
+        self.enabled = False
+        self.elapsed = self.elapsed + timer() - self.start
+
+    #########################################################
+    ## summary:
+    def summary(self):
+        """summary function:
+
+        Returns a dictionary with the wall time while enabled
+        ('elapsed'), the spike counters and, for each phase, its
+        number of calls and total and self times.
+        """
+        elapsed = self.elapsed
+        if self.enabled:
+            elapsed = elapsed + timer() - self.start
+        return {'elapsed': elapsed,
+                'preSpikes': self.preSpikes,
+                'postSpikes': self.postSpikes,
+                'phases': dict((name, {'calls': self.calls[name], 'total': self.total[name], 'self': self.own[name]})
+                               for name in self.calls)}
+
+    #########################################################
+    ## report:
+    def report(self):
+        """report function:
+
+        Returns a table with the counters, phases sorted by self time.
+        """
+        summary = self.summary()
+        elapsed = summary['elapsed'] or 1.
+        lines = ['%-20s %10s %12s %12s %8s' % ('phase', 'calls', 'total [s]', 'self [s]', 'self %')]
+        for name in sorted(self.calls, key=lambda name: -self.own[name]):
+            lines.append('%-20s %10d %12.4f %12.4f %7.1f%%' %
+                         (name, self.calls[name], self.total[name], self.own[name], 100*self.own[name]/elapsed))
+        lines.append('elapsed: %.4f s, presynaptic spikes: %d, postsynaptic spikes: %d' %
+                     (summary['elapsed'], self.preSpikes, self.postSpikes))
+        return '\n'.join(lines)
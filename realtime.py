@@ -0,0 +1,323 @@
+"""Real-time simulation driven by live streams of spikes:
+
+The class RealTimeRunner of this module drives an object of the class
+PopulationDendrite with spikes read from an asyncio stream (a pipe, a
+TCP or a Unix socket) and writes the spikes of the dendrite back as
+soon as they happen. The input stream is made of lines, each one with
+the space-separated indices of the synapses receiving a spike; indices
+number the synapses of the live populations one after the other. The
+output stream gets one line with the step of each postsynaptic spike.
+
+The runner works in one of two modes:
+
+- Real time ('timeScale' given): step 'k' is simulated once its time
+  window is over, 'timeScale' * (k+1) * DeltaT ms of wall time after
+  the start, with all the spikes which arrived in the meanwhile. Steps
+  finished more than 'deadline' seconds after the end of their window
+  are counted as missed deadlines; the runner then catches up without
+  sleeping.
+- Lockstep ('timeScale' None): each input line is one step, simulated
+  as soon as it arrives (an empty line is a step without spikes).
+
+Live populations may have their own spikes too (p_spike or spike
+maps), which are added to those of the stream, and the rest of inputs
+of the dendrite are updated as usual. From the command line, the
+inputs of an experiment (see the experiment module) are driven from
+stdin, a TCP port or a Unix socket:
+
+    $ python realtime.py experiments/task5.json --live 0 --time-scale 1 --port 5555
+
+Runners report the queueing delay of the input (wall time from the
+arrival of a line to the end of the step which used it) and the
+missed deadlines (see getStats).
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+import numpy as np
+
+###############################################################################
+##
+##                 RealTimeRunner class.
+##
+class RealTimeRunner:
+    """Simulation of a dendrite driven by a live stream of spikes:
+
+    Variables:
+    ==> dendrite: object of the class PopulationDendrite which is simulated.
+    ==> live: list with the populations of the dendrite driven by the stream.
+    ==> offsets: array with the index of the first synapse of each live population in the stream.
+    ==> timeScale: wall seconds per simulated second (None: lockstep with the input lines).
+    ==> deadline: seconds after the end of its window before which a step has to be finished.
+    ==> t: next step to be simulated.
+    ==> queue: asyncio.Queue with the (arrival time, indices) of the received lines.
+    ==> stats: dictionary with the counters of the run (see getStats).
+
+    Methods:
+    ==> __init__: __init__ function for objects of class RealTimeRunner.
+    ==> parseLine: indices of the synapses of an input line.
+    ==> readInput: reads the input stream into the queue.
+    ==> step: simulates one step with the spikes of some lines.
+    ==> emit: writes the spike of the dendrite to the output stream.
+    ==> run: simulates the dendrite until the input stream ends.
+    ==> getStats: summary of the counters of the run.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, dendrite, live=None, timeScale=None, deadline=None, start=0):
+        """__init__ function for the class RealTimeRunner:
+
+        Arguments:
+        ==> dendrite: object of the class PopulationDendrite.
+        ==> live: list with the populations of 'dendrite.inAxons' driven by the stream (all of them if None).
+        ==> timeScale: wall seconds per simulated second, e.g. 1 for real time. None: lockstep with the input lines.
+        ==> deadline: seconds after the end of its window before which a step has to be finished (one time step if None).
+        ==> start: first step to be simulated.
+        """
+        self.dendrite = dendrite
+        self.live = list(dendrite.inAxons) if live is None else list(live)
+        for population in self.live:
+            if population not in dendrite.inAxons or not hasattr(population, 'getSpikes'):
+                raise ValueError('Live inputs must be populations of the dendrite.')
+        self.offsets = np.cumsum([0] + [population.n for population in self.live])
+        self.timeScale = timeScale
+        self.deadline = deadline
+        self.t = start
+        self.queue = None
+        self.stats = {'steps': 0, 'lines': 0, 'events': 0, 'droppedEvents': 0, 'postSpikes': 0,
+                      'missedDeadlines': 0, 'maxLateness': 0.0, 'delaySum': 0.0, 'maxDelay': 0.0}
+
+    #########################################################
+    ## parseLine:
+    def parseLine(self, line):
+        """parseLine function:
+
+        Returns the array of indices of the synapses of an input
+        line. Indices which are not valid are dropped (and counted).
+        """
+        try:
+            indices = np.array(line.split(), dtype=np.int64)
+        except ValueError:
+            self.stats['droppedEvents'] += len(line.split())
+            return np.zeros(0, dtype=np.int64)
+        valid = (indices >= 0) & (indices < self.offsets[-1])
+        self.stats['droppedEvents'] += int(indices.size - valid.sum())
+        return indices[valid]
+
+    #########################################################
+    ## readInput:
+    async def readInput(self, reader):
+        """readInput function:
+
+        Reads the lines of the stream 'reader' into the queue,
+        stamped with their arrival time, and puts None at the end.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            self.queue.put_nowait((loop.time(), self.parseLine(line)))
+        self.queue.put_nowait(None)
+
+    #########################################################
+    ## step:
+    def step(self, lines):
+        """step function:
+
+        Arguments:
+        ==> lines: list with the (arrival time, indices) of the lines whose spikes arrive in this step.
+
+        Simulates step 't' and returns whether the dendrite spiked.
+        """
+        t = self.t
+        indices = np.concatenate([line[1] for line in lines]) if lines else np.zeros(0, dtype=np.int64)
+        position = np.searchsorted(self.offsets, indices, side='right') - 1
+        for axon in self.dendrite.inAxons:
+            if axon in self.live:
+                ii = self.live.index(axon)
+                spike = axon.getSpikes(t)
+                spike[indices[position == ii] - self.offsets[ii]] = True
+                axon.updateG(t, spike=spike)
+                axon.updateP()
+            else:
+                axon.updateStatus(t)
+        self.dendrite.updateStatus()
+        self.t = t + 1
+        self.stats['steps'] += 1
+        self.stats['lines'] += len(lines)
+        self.stats['events'] += len(indices)
+        return self.dendrite.spike
+
+    #########################################################
+    ## emit:
+    async def emit(self, writer, t):
+        """emit function:
+
+        Writes step 't' to the output stream 'writer' (an asyncio
+        StreamWriter or a binary file) and flushes it.
+        """
+        self.stats['postSpikes'] += 1
+        if writer is None:
+            return
+        writer.write(b'%d\n' % t)
+        if hasattr(writer, 'drain'):
+            await writer.drain()
+        else:
+            writer.flush()
+
+    #########################################################
+    ## run:
+    async def run(self, reader, writer=None, steps=None):
+        """run function:
+
+        Arguments:
+        ==> reader: asyncio StreamReader with the input stream.
+        ==> writer: None, or output stream (an asyncio StreamWriter or a binary file).
+        ==> steps: maximum number of steps (None: until the input stream ends).
+
+        Simulates the dendrite with the spikes of 'reader' and writes
+        its spikes to 'writer'. Returns the summary of getStats.
+        """
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        reading = asyncio.ensure_future(self.readInput(reader))
+        window = None if self.timeScale is None else self.timeScale*self.dendrite.clock.DeltaT/1000.
+        deadline = window if self.deadline is None else self.deadline
+        start = loop.time()
+        done = 0
+        ended = False
+        try:
+            while not ended and (steps is None or done < steps):
+                if window is None:
+                    line = await self.queue.get()
+                    if line is None:
+                        break
+                    lines = [line]
+                else:
+                    due = start + (done + 1)*window
+                    if due > loop.time():
+                        await asyncio.sleep(due - loop.time())
+                    lines = []
+                    while not self.queue.empty():
+                        line = self.queue.get_nowait()
+                        if line is None:
+                            ended = True
+                            break
+                        lines.append(line)
+
+                t = self.t
+                if self.step(lines):
+                    await self.emit(writer, t)
+                done = done + 1
+
+                now = loop.time()
+                for line in lines:
+                    delay = now - line[0]
+                    self.stats['delaySum'] += delay
+                    self.stats['maxDelay'] = max(self.stats['maxDelay'], delay)
+                if window is not None:
+                    lateness = now - (due + deadline)
+                    if lateness > 0:
+                        self.stats['missedDeadlines'] += 1
+                        self.stats['maxLateness'] = max(self.stats['maxLateness'], lateness)
+        finally:
+            reading.cancel()
+        return self.getStats()
+
+    #########################################################
+    ## getStats:
+    def getStats(self):
+        """getStats function:
+
+        Returns a dictionary with the number of steps, input lines,
+        input spikes, dropped input spikes and postsynaptic spikes,
+        the mean and maximum queueing delay of the input lines (s),
+        the number of missed deadlines and the largest delay past a
+        deadline (s).
+        """
+        stats = self.stats
+        return {'steps': stats['steps'],
+                'lines': stats['lines'],
+                'events': stats['events'],
+                'droppedEvents': stats['droppedEvents'],
+                'postSpikes': stats['postSpikes'],
+                'meanDelay': stats['delaySum']/stats['lines'] if stats['lines'] else 0.0,
+                'maxDelay': stats['maxDelay'],
+                'missedDeadlines': stats['missedDeadlines'],
+                'maxLateness': stats['maxLateness']}
+
+################################################################################
+##
+##                 serve function.
+##
+async def serve(runner, host=None, port=None, path=None, steps=None):
+    """serve function:
+
+    Runs 'runner' on the first connection to a TCP server on
+    'host':'port', or to a Unix socket server on 'path', or on
+    stdin/stdout if none is given. Returns the summary of the run.
+    """
+    loop = asyncio.get_running_loop()
+    if port is None and path is None:
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        return await runner.run(reader, sys.stdout.buffer, steps)
+
+    finished = loop.create_future()
+    async def handle(reader, writer):
+        if finished.done():
+            writer.close()
+            return
+        try:
+            finished.set_result(await runner.run(reader, writer, steps))
+        except Exception as error:
+            finished.set_exception(error)
+        finally:
+            writer.close()
+    if path is not None:
+        server = await asyncio.start_unix_server(handle, path=path)
+    else:
+        server = await asyncio.start_server(handle, host, port)
+    try:
+        return await finished
+    finally:
+        server.close()
+
+################################################################################
+##
+##                 main function.
+##
+def main(argv=None):
+    """main function:
+
+    Command line entry point (see the module docstring). The summary
+    of the run is written to stderr as JSON.
+    """
+    parser = argparse.ArgumentParser(description='Drives the inputs of an experiment with live spikes.')
+    parser.add_argument('config', help='JSON file describing the experiment (see experiment.py).')
+    parser.add_argument('--live', type=int, nargs='+', default=[0], help='positions of the live inputs.')
+    parser.add_argument('--time-scale', type=float, default=None,
+                        help='wall seconds per simulated second (lockstep with the input lines if not given).')
+    parser.add_argument('--deadline', type=float, default=None, help='deadline of each step (s).')
+    parser.add_argument('--steps', type=int, default=None, help='maximum number of steps.')
+    parser.add_argument('--set', action='append', default=[], metavar='PATH=VALUE',
+                        help='overrides a value of the configuration.')
+    parser.add_argument('--host', default='127.0.0.1', help='address of the TCP server.')
+    parser.add_argument('--port', type=int, default=None, help='port of the TCP server.')
+    parser.add_argument('--socket', default=None, help='path of the Unix socket server.')
+    args = parser.parse_args(argv)
+
+    from experiment import loadConfig, buildExperiment
+    config = loadConfig(args.config, args.set + ['engine="population"'])
+    dendrite, inputs, latencies = buildExperiment(config)
+    runner = RealTimeRunner(dendrite, [inputs[ii] for ii in args.live], args.time_scale, args.deadline)
+    stats = asyncio.run(serve(runner, args.host, args.port, args.socket, args.steps))
+    json.dump(stats, sys.stderr, sort_keys=True)
+    sys.stderr.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,515 @@
+"""Spike sources for the vectorized neuron model:
+
+This module provides the objects which tell a population of synapses
+which of them receive an action potential at each time step. All of
+them return, for a given step, the array of indices of the spiking
+synapses, and the first step at which some synapse spikes. Spike
+trains can also be saved to binary spike files, which are read back
+through a memory map (see SpikeFile).
+"""
+
+import os
+import numpy as np
+import numpy.random as rand
+from helper import *
+
+###############################################################################
+##
+##                 SpikeRaster class.
+##
+class SpikeRaster:
+    """Spike raster of a population of synapses:
+
+    The spikes of all the synapses are stored in compressed sparse row
+    format over the time steps: 'steps' holds, in increasing order,
+    the steps at which some synapse spikes and the indices of the
+    synapses spiking at steps[k] are indices[offsets[k]:offsets[k+1]].
+    A read cursor remembers the position of the last step asked for,
+    so that going through the simulation step by step costs O(1)
+    amortized per step, whatever the number of spikes or synapses.
+
+    Variables:
+    ==> n: number of synapses.
+    ==> steps: sorted array with the steps at which some synapse spikes.
+    ==> offsets: array with the position in 'indices' of the first spike of each entry of 'steps' (plus the total number of spikes).
+    ==> indices: array with the indices of the spiking synapses.
+    ==> cursor: position in 'steps' of the first step not before the last one asked for.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class SpikeRaster.
+    ==> fromSpikeMap: builds a raster out of one spike map per synapse.
+    ==> fromEvents: builds a raster out of arrays of (step, synapse) events.
+    ==> seek: moves the cursor to a given step.
+    ==> getSpikes: indices of the synapses spiking at a given step.
+    ==> nextStep: first step at or after a given one with some spike.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, n, steps, offsets, indices):
+        """__init__ function for the class SpikeRaster:
+
+        Arguments:
+        ==> n: number of synapses.
+        ==> steps, offsets, indices: arrays of the raster in compressed sparse row format (see class docstring).
+        """
+        self.n = n
+        self.steps = steps
+        self.offsets = offsets
+        self.indices = indices
+        self.cursor = 0
+
+    #########################################################
+    ## fromSpikeMap:
+    @staticmethod
+    def fromSpikeMap(spike_map, n=None):
+        """fromSpikeMap function:
+
+        Returns an object of the class SpikeRaster with the spikes of
+        'spike_map', a list with the spike map (a sequence of steps,
+        or None for no spikes) of each synapse.
+        """
+        if n is None:
+            n = len(spike_map)
+        eventSteps = []
+        eventIndices = []
+        for ii in range(len(spike_map)):
+            if spike_map[ii] is not None:
+                steps = compileSpikeMap(spike_map[ii])
+                eventSteps.extend(steps)
+                eventIndices.extend([ii]*len(steps))
+        return SpikeRaster.fromEvents(n, eventSteps, eventIndices)
+
+    #########################################################
+    ## fromEvents:
+    @staticmethod
+    def fromEvents(n, eventSteps, eventIndices, isSorted=False):
+        """fromEvents function:
+
+        Returns an object of the class SpikeRaster with one spike of
+        synapse eventIndices[k] at step eventSteps[k] for each k. If
+        'isSorted' is True, events are taken to be already sorted by
+        step.
+        """
+        eventSteps = np.asarray(eventSteps, dtype=np.int64)
+        eventIndices = np.asarray(eventIndices, dtype=np.int64)
+        if not isSorted:
+            order = np.argsort(eventSteps, kind='mergesort')
+            eventSteps = eventSteps[order]
+            eventIndices = eventIndices[order]
+        steps, counts = np.unique(eventSteps, return_counts=True)
+        offsets = np.zeros(len(steps) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        return SpikeRaster(n, steps, offsets, eventIndices)
+
+    #########################################################
+    ## seek:
+    def seek(self, t):
+        """seek function:
+
+        Moves the cursor to the first entry of 'steps' which is not
+        before 't'. Moving forward is done entry by entry, so that
+        consecutive steps cost O(1) amortized; moving backward (e.g.
+        when a trial is repeated) is done by bisection.
+        """
+        cursor = self.cursor
+        if cursor > 0 and self.steps[cursor-1] >= t:
+            cursor = int(np.searchsorted(self.steps, t))
+        while cursor < len(self.steps) and self.steps[cursor] < t:
+            cursor = cursor + 1
+        self.cursor = cursor
+
+    #########################################################
+    ## getSpikes:
+    def getSpikes(self, t):
+        """getSpikes function:
+
+        Returns the array of indices of the synapses spiking at step
+        't'.
+        """
+        self.seek(t)
+        cursor = self.cursor
+        if cursor < len(self.steps) and self.steps[cursor] == t:
+            return self.indices[self.offsets[cursor]:self.offsets[cursor+1]]
+        return self.indices[:0]
+
+    #########################################################
+    ## nextStep:
+    def nextStep(self, t):
+        """nextStep function:
+
+        Returns the first step at or after 't' in which some synapse
+        spikes, or None if there is none.
+        """
+        self.seek(t)
+        if self.cursor < len(self.steps):
+            return int(self.steps[self.cursor])
+        return None
+
+###############################################################################
+##
+##                 PoissonSource class.
+##
+class PoissonSource:
+    """Poisson spike trains of a population of synapses:
+
+    Synapse 'i' spikes at each step with probability p_spike[i],
+    independently of the other steps and synapses, exactly as an
+    object of the class Axon without spike map does. Instead of one
+    random number per synapse and step, spikes are generated for the
+    whole population in blocks of 'blockSize' steps, stored as a
+    SpikeRaster and then read step by step:
+
+    - at low rates, each synapse jumps from one spike to the next by
+      drawing the inter-spike interval from a geometric distribution,
+      so that the cost is proportional to the number of spikes;
+    - when the mean probability is above 'denseThreshold', it is
+      cheaper to draw one uniform number per synapse and step for the
+      whole block at once.
+
+    Both ways give the same statistics as drawing numpy.random.random()
+    < p_spike at each step. Since the process has no memory, jumping
+    backwards or more than a block forward just restarts the trains
+    at the step asked for.
+
+    Variables:
+    ==> n: number of synapses.
+    ==> p_spike: array with the probability of spiking per step of each synapse.
+    ==> active: indices of the synapses with p_spike > 0.
+    ==> blockSize: number of steps generated at once.
+    ==> dense: boolean: True ==> blocks are drawn step by step instead of by inter-spike intervals.
+    ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+    ==> blockStart, blockEnd: steps covered by the current block.
+    ==> nextSpike: step of the next spike of each active synapse after the current block (geometric mode).
+    ==> raster: object of the class SpikeRaster with the spikes of the current block.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class PoissonSource.
+    ==> reset: restarts the spike trains at a given step.
+    ==> fillBlock: generates the spikes of the next block.
+    ==> getSpikes: indices of the synapses spiking at a given step.
+    ==> nextStep: first step at or after a given one with some spike.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, p_spike, blockSize=1000, rng=rand, denseThreshold=0.05):
+        """__init__ function for the class PoissonSource:
+
+        Arguments:
+        ==> p_spike: array with the probability of spiking per step of each synapse.
+        ==> blockSize: number of steps generated at once.
+        ==> rng: source of random numbers (numpy.random or a numpy.random.RandomState).
+        ==> denseThreshold: mean probability above which blocks are drawn step by step.
+        """
+        self.p_spike = np.array(p_spike, dtype=float)
+        self.n = len(self.p_spike)
+        self.active = np.flatnonzero(self.p_spike > 0)
+        self.blockSize = blockSize
+        self.rng = rng
+        self.dense = self.active.size > 0 and self.p_spike[self.active].mean() > denseThreshold
+        self.blockStart = None
+        self.blockEnd = None
+        self.nextSpike = None
+        self.raster = None
+
+    #########################################################
+    ## reset:
+    def reset(self, t):
+        """reset function:
+
+        Restarts the spike trains at step 't': the next block starts
+        at 't' and, in geometric mode, the first spike of each
+        synapse is drawn anew.
+        """
+        self.blockStart = t
+        self.blockEnd = t
+        self.raster = SpikeRaster(self.n, np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                                  np.zeros(0, dtype=np.int64))
+        if not self.dense:
+            self.nextSpike = t - 1 + self.rng.geometric(self.p_spike[self.active])
+
+    #########################################################
+    ## fillBlock:
+    def fillBlock(self):
+        """fillBlock function:
+
+        Generates the spikes of the 'blockSize' steps following the
+        current block and makes them the current block.
+        """
+        start = self.blockEnd
+        end = start + self.blockSize
+        p_spike = self.p_spike[self.active]
+        if self.dense:
+            block = self.rng.random_sample((self.blockSize, self.active.size)) < p_spike
+            steps, synapses = np.nonzero(block)
+            self.raster = SpikeRaster.fromEvents(self.n, steps + start, self.active[synapses], isSorted=True)
+        else:
+            eventSteps = []
+            eventIndices = []
+            selected = np.flatnonzero(self.nextSpike < end)
+            while selected.size:
+                eventSteps.append(self.nextSpike[selected])
+                eventIndices.append(self.active[selected])
+                self.nextSpike[selected] += self.rng.geometric(p_spike[selected])
+                selected = selected[self.nextSpike[selected] < end]
+            if eventSteps:
+                eventSteps = np.concatenate(eventSteps)
+                eventIndices = np.concatenate(eventIndices)
+            self.raster = SpikeRaster.fromEvents(self.n, eventSteps, eventIndices)
+        self.blockStart = start
+        self.blockEnd = end
+
+    #########################################################
+    ## getSpikes:
+    def getSpikes(self, t):
+        """getSpikes function:
+
+        Returns the array of indices of the synapses spiking at step
+        't'.
+        """
+        if self.blockStart is None or t < self.blockStart or t >= self.blockEnd + self.blockSize:
+            self.reset(t)
+        while t >= self.blockEnd:
+            self.fillBlock()
+        return self.raster.getSpikes(t)
+
+    #########################################################
+    ## nextStep:
+    def nextStep(self, t):
+        """nextStep function:
+
+        Returns the first step at or after 't' in which some synapse
+        spikes, or None if no synapse ever spikes.
+        """
+        if self.active.size == 0:
+            return None
+        self.getSpikes(t)
+        step = self.raster.nextStep(t)
+        while step is None:
+            self.fillBlock()
+            step = self.raster.nextStep(self.blockStart)
+        return step
+
+################################################################################
+##
+##                 burstSpikeMap function.
+##
+def burstSpikeMap(n, steps, DeltaT, period=100, onset=30, duration=20, freq=100, latencyStd=15, rng=rand):
+    """burstSpikeMap function:
+
+    Returns (spike_map, latencies): the spike maps of 'n' synapses
+    over 'steps' steps of 'DeltaT' ms, silent except for bursts of
+    Poisson spikes at 'freq' Hz lasting 'duration' ms, one every
+    'period' ms starting at 'onset' ms, and the latency (in ms, a
+    multiple of DeltaT) by which the bursts of each synapse are
+    shifted, drawn from a Gaussian of mean 0 and standard deviation
+    'latencyStd' ms. These are the inputs of task-6.py.
+    """
+    latencies = np.round(rng.normal(0, latencyStd, n)/DeltaT).astype(np.int64)
+    burstSteps = int(round(duration/DeltaT))
+    spikeProb = freq*DeltaT/1000.
+    eventSteps = []
+    eventIndices = []
+    for start in np.arange(0, steps*DeltaT, period):
+        counts = rng.binomial(burstSteps, spikeProb, n)
+        indices = np.repeat(np.arange(n), counts)
+        # Distinct steps within the burst (as one Bernoulli draw per
+        # step): positions taken twice by a synapse are drawn again.
+        positions = rng.randint(0, burstSteps, len(indices))
+        while True:
+            repeated = np.ones(len(indices), dtype=bool)
+            repeated[np.unique(indices*burstSteps + positions, return_index=True)[1]] = False
+            if not repeated.any():
+                break
+            positions[repeated] = rng.randint(0, burstSteps, repeated.sum())
+        eventSteps.append(int(round((start + onset)/DeltaT)) + latencies[indices] + positions)
+        eventIndices.append(indices)
+    eventSteps = np.concatenate(eventSteps)
+    eventIndices = np.concatenate(eventIndices)
+    keep = (eventSteps >= 0) & (eventSteps < steps)
+    spike_map = [[] for ii in range(n)]
+    for step, ii in zip(eventSteps[keep].tolist(), eventIndices[keep].tolist()):
+        spike_map[ii].append(step)
+    return spike_map, latencies*DeltaT
+
+################################################################################
+##
+##                 Spike files.
+##
+# Binary spike files hold the spike trains of 'n' synapses twice, so
+# that they can be read both synapse by synapse and step by step
+# without any copy. All numbers are little-endian:
+#
+#   header:      magic 'SPKTRAIN', version (uint32), padding (uint32),
+#                n, number of spikes and number of steps with spikes
+#                (int64 each), padded to 64 bytes.
+#   trainPtr:    int64[n+1]: spikes of synapse 'i' are trains[trainPtr[i]:trainPtr[i+1]].
+#   offsets:     int64[number of steps + 1], as in the class SpikeRaster.
+#   trains:      int32[number of spikes]: sorted steps of each synapse, one synapse after the other.
+#   steps:       int32[number of steps], as in the class SpikeRaster.
+#   indices:     int32[number of spikes], as in the class SpikeRaster (sorted within each step).
+SPIKE_FILE_MAGIC = b'SPKTRAIN'
+SPIKE_FILE_VERSION = 1
+spikeFileHeader = np.dtype([('magic', 'S8'), ('version', '<u4'), ('padding', '<u4'), ('n', '<i8'),
+                            ('spikes', '<i8'), ('steps', '<i8'), ('reserved', 'V24')])
+
+################################################################################
+##
+##                 saveSpikeEvents function.
+##
+def saveSpikeEvents(path, n, eventSteps, eventIndices):
+    """saveSpikeEvents function:
+
+    Writes to the spike file 'path' the spike trains of 'n' synapses
+    with one spike of synapse eventIndices[k] at step eventSteps[k]
+    for each k (repeated events are written once). The file is
+    written to 'path.tmp' and then renamed, so that runs reading
+    'path' never see it half written.
+    """
+    if n < 1:
+        raise ValueError('A spike file needs at least one synapse.')
+    eventSteps = np.asarray(eventSteps, dtype=np.int64).ravel()
+    eventIndices = np.asarray(eventIndices, dtype=np.int64).ravel()
+    if eventIndices.size and (eventIndices.min() < 0 or eventIndices.max() >= n):
+        raise ValueError('Spike of a synapse out of range.')
+    if eventSteps.size and (eventSteps.min() < 0 or eventSteps.max() > np.iinfo(np.int32).max):
+        raise ValueError('Spike steps must fit in int32.')
+
+    # Step-major order, without repeated events:
+    events = np.unique(eventSteps*n + eventIndices)
+    stepEvents = events//n
+    steps, counts = np.unique(stepEvents, return_counts=True)
+    offsets = np.zeros(len(steps) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    indices = events - stepEvents*n
+
+    # Synapse-major order:
+    order = np.argsort(indices, kind='mergesort')
+    trainPtr = np.zeros(n + 1, dtype=np.int64)
+    trainPtr[1:] = np.cumsum(np.bincount(indices, minlength=n))
+    trains = stepEvents[order]
+
+    header = np.zeros(1, dtype=spikeFileHeader)
+    header['magic'] = SPIKE_FILE_MAGIC
+    header['version'] = SPIKE_FILE_VERSION
+    header['n'] = n
+    header['spikes'] = len(events)
+    header['steps'] = len(steps)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as fp:
+        fp.write(header.tobytes())
+        for array, dtype in ((trainPtr, '<i8'), (offsets, '<i8'), (trains, '<i4'), (steps, '<i4'),
+                             (indices, '<i4')):
+            fp.write(array.astype(dtype).tobytes())
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.rename(temporary, path)
+
+################################################################################
+##
+##                 saveSpikeFile function.
+##
+def saveSpikeFile(path, spike_map, n=None):
+    """saveSpikeFile function:
+
+    Writes to the spike file 'path' the spike trains of 'spike_map', a
+    list with the spike map (a sequence of steps, or None for no
+    spikes) of each synapse, as taken by the class AxonPopulation.
+    """
+    raster = SpikeRaster.fromSpikeMap(spike_map, n)
+    eventSteps = np.repeat(raster.steps, np.diff(raster.offsets))
+    saveSpikeEvents(path, raster.n, eventSteps, raster.indices)
+
+###############################################################################
+##
+##                 SpikeFile class.
+##
+class SpikeFile:
+    """Spike trains memory-mapped from a spike file:
+
+    The arrays of the file are read through a memory map, so that
+    opening a file costs nothing whatever its size, only the pages
+    which are used are read, and processes replaying the same file
+    (e.g. the runs of a sweep) share them through the page cache.
+
+    Variables:
+    ==> path: path of the file.
+    ==> n: number of synapses.
+    ==> trainPtr, trains: spike trains synapse by synapse (see 'Spike files' above).
+    ==> steps, offsets, indices: spikes step by step, as in the class SpikeRaster.
+
+    Methods:
+    ==> __init__: __init__ function for objects of class SpikeFile.
+    ==> __len__: number of synapses.
+    ==> getTrain: sorted steps at which a synapse spikes.
+    ==> getSpikeMap: list with the spike train of each synapse.
+    ==> getRaster: object of the class SpikeRaster over the arrays of the file.
+    """
+
+    #########################################################
+    ## __init__:
+    def __init__(self, path):
+        """__init__ function for the class SpikeFile:
+
+        Arguments:
+        ==> path: path of the spike file.
+        """
+        self.path = path
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        header = data[:spikeFileHeader.itemsize].view(spikeFileHeader)[0]
+        if header['magic'] != SPIKE_FILE_MAGIC or header['version'] != SPIKE_FILE_VERSION:
+            raise ValueError('%s is not a spike file.' % path)
+        self.n = int(header['n'])
+        spikes = int(header['spikes'])
+        steps = int(header['steps'])
+
+        arrays = []
+        position = spikeFileHeader.itemsize
+        for size, dtype in ((self.n + 1, '<i8'), (steps + 1, '<i8'), (spikes, '<i4'), (steps, '<i4'),
+                            (spikes, '<i4')):
+            end = position + size*np.dtype(dtype).itemsize
+            arrays.append(data[position:end].view(dtype))
+            position = end
+        self.trainPtr, self.offsets, self.trains, self.steps, self.indices = arrays
+
+    #########################################################
+    ## __len__:
+    def __len__(self):
+        """__len__ function:
+
+        Returns the number of synapses.
+        """
+        return self.n
+
+    #########################################################
+    ## getTrain:
+    def getTrain(self, ii):
+        """getTrain function:
+
+        Returns the sorted int32 array (a view of the file) with the
+        steps at which synapse 'ii' spikes. It can be given as the
+        spike map of an object of the class Axon.
+        """
+        return self.trains[self.trainPtr[ii]:self.trainPtr[ii+1]]
+
+    #########################################################
+    ## getSpikeMap:
+    def getSpikeMap(self):
+        """getSpikeMap function:
+
+        Returns the list with the spike train of each synapse (see
+        getTrain).
+        """
+        return [self.getTrain(ii) for ii in range(self.n)]
+
+    #########################################################
+    ## getRaster:
+    def getRaster(self):
+        """getRaster function:
+
+        Returns a new object of the class SpikeRaster (with its own
+        cursor) over the arrays of the file. It can be given as the
+        spike map of an object of the class AxonPopulation or Network.
+        """
+        return SpikeRaster(self.n, self.steps, self.offsets, self.indices)
@@ -0,0 +1,164 @@
+"""Parameter sweeps over the vectorized neuron model:
+
+A sweep runs one simulation per point of a parameter grid and spreads
+the runs over a pool of processes. Every run gets its own random
+stream, derived from the seed of the sweep and the position of the
+run in the grid, so that results do not depend on the number of
+processes nor on which process runs what.
+
+A run is described by a dictionary with the keys of 'defaults'. Keys
+starting with 'exc_', 'inh_' and 'dendrite_' are passed, without the
+prefix, as arguments to the excitatory population, to the inhibitory
+population and to the dendrite. For instance:
+
+    result = runSweep({'fExc': [0.01, 0.02, 0.04], 'exc_g_max': [0.015, 0.03]})
+"""
+
+import itertools
+import multiprocessing
+import numpy as np
+from population import *
+
+# Default parameters of a run (rates in kHz, times in ms):
+defaults = {
+    'nExc': 1000,
+    'nInh': 200,
+    'fExc': 0.01,
+    'fInh': 0.01,
+    'deltaT': 0.1,
+    'duration': 1000,
+    'exc_g_boost': 0.015,
+    'exc_g_max': 0.015,
+    'inh_g_boost': 0.05,
+}
+
+################################################################################
+##
+##                 parameterGrid function.
+##
+def parameterGrid(grid, base=None):
+    """parameterGrid function:
+
+    Returns the list of run configurations of the cartesian product of
+    'grid', a dictionary from parameter names to lists of values.
+    Parameters not in 'grid' are taken from 'base' or, failing that,
+    from 'defaults'.
+    """
+    names = sorted(grid.keys())
+    configs = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        config = dict(defaults)
+        if base is not None:
+            config.update(base)
+        config.update(zip(names, values))
+        configs.append(config)
+    return configs
+
+################################################################################
+##
+##                 buildNeuron function.
+##
+def buildNeuron(config, rng=rand):
+    """buildNeuron function:
+
+    Returns (dendrite, exc, inh): an object of the class
+    PopulationDendrite attached to the excitatory and inhibitory
+    objects of the class AxonPopulation described by 'config'.
+    Prefixed keys override the arguments derived from the rest (e.g.
+    'exc_p_spike' overrides 'fExc' and 'inh_E' the inversion potential
+    of -70).
+    """
+    arguments = {'exc': {'p_spike': config['fExc']*config['deltaT'], 'E': 0, 'rng': rng},
+                 'inh': {'p_spike': config['fInh']*config['deltaT'], 'E': -70, 'rng': rng},
+                 'dendrite': {'clock': Clock(config['deltaT'])}}
+    for key in config:
+        prefix = key.split('_', 1)[0]
+        if prefix in arguments:
+            arguments[prefix][key[len(prefix)+1:]] = config[key]
+
+    exc = AxonPopulation(config['nExc'], **arguments['exc'])
+    inh = AxonPopulation(config['nInh'], **arguments['inh'])
+    dendrite = PopulationDendrite([exc, inh], **arguments['dendrite'])
+    return dendrite, exc, inh
+
+################################################################################
+##
+##                 runSingle function.
+##
+def runSingle(config, seed=None):
+    """runSingle function:
+
+    Simulates the neuron described by 'config' for 'duration' ms and
+    returns a dictionary with its firing rate ('rate', in kHz) and the
+    final g_boost/g_max of its excitatory synapses ('weights', as
+    float32). 'seed' is anything numpy.random.RandomState accepts, or
+    a numpy.random.SeedSequence.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        rng = np.random.RandomState(np.random.MT19937(seed))
+    else:
+        rng = np.random.RandomState(seed)
+    dendrite, exc, inh = buildNeuron(config, rng)
+
+    steps = int(round(config['duration']/config['deltaT']))
+    spikeCount = 0
+    for t in range(steps):
+        for population in dendrite.inAxons:
+            population.updateStatus(t)
+        dendrite.updateStatus()
+        if dendrite.spike:
+            spikeCount = spikeCount + 1
+
+    return {'rate': spikeCount/float(config['duration']),
+            'weights': (exc.g_boost/exc.g_max).astype(np.float32)}
+
+################################################################################
+##
+##                 runTask function.
+##
+def runTask(task):
+    """runTask function:
+
+    Unpacks a (config, seed) pair for 'runSingle', so that it can be
+    given to a pool of processes.
+    """
+    return runSingle(task[0], task[1])
+
+################################################################################
+##
+##                 runSweep function.
+##
+def runSweep(grid, seed=0, processes=None, base=None):
+    """runSweep function:
+
+    Runs one simulation per configuration of 'parameterGrid(grid,
+    base)' on a pool of 'processes' processes (all the cores if None,
+    no pool at all if 1). Run 'k' is seeded with the k-th child of
+    numpy.random.SeedSequence(seed), so that the results are
+    reproducible whatever the number of processes.
+
+    Returns a dictionary with:
+        ==> configs: list with the configuration of each run.
+        ==> rate: array with the firing rate of each run.
+        ==> weights: list with the array of final g_boost/g_max of each run (a 2D array if all runs have the same number of excitatory synapses).
+    """
+    configs = parameterGrid(grid, base)
+    seeds = np.random.SeedSequence(seed).spawn(len(configs))
+    tasks = list(zip(configs, seeds))
+
+    if processes == 1:
+        results = [runTask(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(runTask, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    weights = [result['weights'] for result in results]
+    if len(set(len(w) for w in weights)) == 1:
+        weights = np.vstack(weights)
+    return {'configs': configs,
+            'rate': np.array([result['rate'] for result in results]),
+            'weights': weights}
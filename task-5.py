@@ -3,7 +3,8 @@
 import numpy as np
 import random as rand
 import pylab as plt
-from neuron import *
+from batch import *
+from monitor import *
 
 # Preparing some parameters of the experiment: 
 # 	==> nExc: number of excitatory connections. 
@@ -28,20 +29,22 @@ pExc = [elem*deltaT for elem in rangeExc]
 						# Eiji pExc = fExc*deltaT
 gg = 0.015
 
-listInh = [Axon(p_spike=pInh, E=-70, g_boost=0.05) for ii in range(nInh)]
-listsExc = [[Axon(p, E=0, g_boost=gg, g_max=gg) for ii in range(nExc)] for p in pExc]
+# One dendrite per excitatory rate, all of them advanced at once. Each
+# dendrite has its own row of inhibitory and excitatory synapses:
+nDendrites = len(pExc)
+batchInh = BatchPopulation(nDendrites, nInh, p_spike=pInh, E=-70, g_boost=0.05)
+batchExc = BatchPopulation(nDendrites, nExc, p_spike=np.array(pExc)[:,np.newaxis], E=0, g_boost=gg, g_max=gg)
 						# Eiji listExc = [Axon(p_spike=pExc, E=0, g_boost=gg, g_max=gg) for ii in range(nExc)]
-dendrite = [Dendrite(listInh+axonList) for axonList in listsExc]
+clock = Clock(deltaT)
+dendrite = BatchDendrite([batchInh, batchExc], clock=clock)
 						# Eiji dendrite = Dendrite(listInh+listExc)	
 
 
 # Variables to plot: 
 t = 0
 n = 0
-time = []
-V = [[] for ii in range(len(dendrite))]
-bufferG = bufferG = [[0 for axon in axonList] for axonList in listsExc]
-spikeCount = [0 for dd in dendrite]
+VMonitor = Monitor(dendrite, ['V'], int(100/deltaT) + 1)
+spikeCount = np.zeros(nDendrites)
 
 # Run the loop: 
 flagEnd = False
@@ -49,18 +52,11 @@ while True:
     print t
     t = t + 1
     n = n + 1
-    time = time + [t*deltaT]
-    for axon in listInh:
-        axon.updateStatus(deltaT)
-
-    for ii in range(len(dendrite)):        
-        for jj in range(len(listsExc[ii])):
-            listsExc[ii][jj].updateStatus(deltaT)
-        dendrite[ii].updateStatus()
-        if dendrite[ii].spike:
-            spikeCount[ii] = spikeCount[ii] + 1
-    
-        V[ii] = V[ii] + [dendrite[ii].V]
+    batchInh.updateStatus(t)
+    batchExc.updateStatus(t)
+    dendrite.updateStatus()
+    spikeCount = spikeCount + dendrite.spike
+    VMonitor.record()
      
 #    if n is 100: 
 #        n=0
@@ -79,20 +75,15 @@ while True:
         break
 
 # Calculating 'a posteriori' variables to be plotted: 
-fr = [0 for den in dendrite]
-for ii in range(len(dendrite)):
-    fr[ii] = spikeCount[ii]/(t*deltaT)
+fr = spikeCount/(t*deltaT)
     
 plt.figure()
 plt.plot(rangeExc,fr,'*-')
 plt.show()
 
-g = [[] for axonList in listsExc]
 						# Eiji for axon in listExc:
 						# Eiji    g = g + [axon.g_boost/axon.g_max]
-for ii in range(len(listsExc)):
-    for axon in listsExc[ii]:
-        g[ii] = g[ii] + [axon.g_boost/gg]
+g = batchExc.g_boost/gg
 
 
 # Some histograms: 
@@ -13,11 +13,15 @@ import numpy.random as rand
 import pylab as plt
 
 from neuron import *
+from monitor import *
+from analysis import *
+from plots import *
 
 # simulation parameters
 SIM_DURATION           = 80    # ms
 DELTA_T                = 0.01   # ms
 STEADY_STATE_THRESHOLD = 0.01
+MAX_CYCLES             = 6
 
 # pre-synaptic events occur every EVENT_PERIOD
 EVENT_PERIOD   = 100   # ms
@@ -31,29 +35,6 @@ BURST_FREQ     = 100   # Hz
 EXC_NUM        = 1000
 INH_NUM        = 200
 
-def plot_g_over_latencies(axons, latencies):
-    """Plots g_peak/g_max over the axon's latencies."""
-    plt.figure()
-    plt.xlabel('Relative latency [ms]')
-    plt.ylabel('g_peak/g_max')
-    r_ = range(min(latencies), max(latencies) + 1)
-    r  = []
-    v  = []
-    for i in range(len(r_)):
-        num = 0
-        g_peak_sum = 0.
-        g_max_sum = 0.
-        for j in range(len(axons)):
-            if latencies[j] == r_[i]:
-                num += 1
-                g_peak_sum += axons[j].g_boost
-                g_max_sum += axons[j].g_max
-        if num != 0:
-            g_peak_over_g_max = (g_peak_sum / num) / (g_max_sum / num)
-            r.append(r_[i])
-            v.append(g_peak_over_g_max)
-    plt.plot(r, v, '.')
-
 # assign latency to synapses (gaussian: mean 0, std. derivation 15ms)
 total_axons = EXC_NUM + INH_NUM
 	# Eiji a_latencies = [int(i) for i in rand.normal(0, 15, total_axons)]
@@ -80,24 +61,25 @@ exc = [Axon(0.1, 0, g_boost=0.004, g_max=0.02, spike_map=a_spike_map.pop()) \
 # inhibitory
 	# Eiji inh = [Axon(0.1, -70, g_boost=0.004, g_max=0.02, spike_map=a_spike_map.pop()) \
     # Eiji      for i in range(INH_NUM)]
-inh = [Axon(DELTA_T*0.01, -70, g_boost=0.05) for i in range(INH_NUM)]
-a = exc + inh
-dendrite = Dendrite(a)
+# inhibitory synapses are not plastic: pooled into a single input
+inh = PooledAxons(INH_NUM, DELTA_T*0.01, -70, g_boost=0.05)
+a = exc + [inh]
+dendrite = Dendrite(a, clock=Clock(DELTA_T))
 
 # plot g over latencies before simulation
 	# Eiji plot_g_over_latencies(a, a_latencies)
-plot_g_over_latencies(exc, exc_latencies)
+plotLatencyCurve(*latencyCurve(exc, exc_latencies))
 
 # Run the simulation
 g       = [[] for axon in a]
 time    = []
 V_first = []
 V       = []
-spikes  = []
+spikes  = SpikeRecorder(a, steps)
 
-steady_state = False
 	# Eiji g_peak_over_g_max_prev = [axon.g_boost / axon.g_max for axon in a]
-g_peak_over_g_max_prev = [axon.g_boost / axon.g_max for axon in exc]
+convergence = ConvergenceMonitor(exc, every=1, driftTolerance=STEADY_STATE_THRESHOLD)
+convergence.check()
 j = 0
 while True:
     # set decaying values to 0 (equals waiting for long time without
@@ -120,44 +102,28 @@ while True:
         if j == 0:
             V_first.append(dendrite.V)
             time.append(tt * DELTA_T)
-            spiking = 0
-            for axon in a:
-                if axon.spike:
-                    spiking = 1
-                    break
-            spikes.append(spiking)
+            spikes.record()
             V = V_first
         else:
             V.append(dendrite.V)
-###Eiji 
-###Eiji     # check if steady state reached
-###Eiji     one_changed = False
-###Eiji 	# Eiji    for i in range(len(a)):
-###Eiji     for i in range(len(exc)):
-###Eiji         if abs(exc[i].g_boost / exc[i].g_max - g_peak_over_g_max_prev[i]) > STEADY_STATE_THRESHOLD:
-###Eiji             one_changed = True
-###Eiji             break
-###Eiji     if one_changed == False:
-###Eiji         break
 
+    # check if steady state reached (or give up after MAX_CYCLES)
     print j
-    if j > 5:
+    if convergence.check() or j >= MAX_CYCLES:
         break
-	# Eiji    g_peak_over_g_max_prev = [axon.g_boost / axon.g_max for axon in a]
-    g_peak_over_g_max_prev = [axon.g_boost / axon.g_max for axon in exc]
     j += 1
 
 print "cycles: ", j
 
 # plot g over latencies after simulation
 	# Eiji    plot_g_over_latencies(a, a_latencies)
-plot_g_over_latencies(exc, exc_latencies)
+plotLatencyCurve(*latencyCurve(exc, exc_latencies))
 
 # plot axon's voltage over time
 plt.figure()
 plt.xlabel('Time [ms]')
 plt.ylabel('Voltage [mV]')
-plt.plot(time, spikes, 'r.')
+plt.plot(time, spikes.getTotals() > 0, 'r.')
 plt.plot(time, V_first, label='Voltage of postsynaptic dendrite (first run)')
 plt.plot(time, V, label='Voltage of postsynaptic dendrite (last run)')
 plt.legend()